@@ -0,0 +1,251 @@
+"""Adaptive subdivision of displaced grid lines.
+
+Uniform sampling spends as many vertices on straight lines far from every
+object as on lines bending sharply past a heavy one. :func:`subdivide_lines`
+starts each line with a few segments and repeatedly splits only those
+whose displaced midpoint lies further than a tolerance from the segment's
+chord, until every segment is flat enough or its line runs out of vertex
+budget. All lines are refined together, so each round displaces every
+candidate midpoint with one vectorized call. Several layers displaced by
+different forces can be refined together on shared sample points, see
+:func:`subdivide_lines`.
+
+A line passing close to an object bends within a stretch about as wide as
+its distance to the object, which midpoint tests between coarse samples
+can miss entirely. Lines therefore also start with a vertex where they
+pass closest to each nearby object (the ``seeds``).
+
+Lines may also start from samples shared between them, such as the
+crossings of the 3D lattice (see :func:`shared_lattice.lattice_samples`);
+each shared vertex is then displaced once for all lines through it.
+"""
+
+import numpy as np
+
+# Segments every line starts with before refinement; enough that a mass
+# between two samples still bends some initial segment
+INITIAL_SEGMENTS = 8
+# Segments shorter than this (in line parameter) are never split
+MIN_SEGMENT = 1e-6
+# Upper bound on line/seed pairs measured per chunk
+MAX_PAIRS_PER_CHUNK = 1 << 18
+
+
+def chord_deviation(first, middle, last):
+    """Return the distance of each ``middle`` point from the chord ``first → last``.
+
+    All arguments are ``(..., 3)`` arrays of points; degenerate chords
+    measure the distance to ``first``.
+    """
+    chord = last - first
+    offset = middle - first
+    length = np.linalg.norm(chord, axis=-1)
+    across = np.linalg.norm(np.cross(chord, offset), axis=-1)
+    return np.where(
+        length > 0,
+        across / np.where(length > 0, length, 1.0),
+        np.linalg.norm(offset, axis=-1),
+    )
+
+
+def subdivide_lines(
+    starts,
+    ends,
+    displace,
+    tolerance,
+    max_vertices,
+    seeds=None,
+    initial_segments=INITIAL_SEGMENTS,
+    samples=None,
+    displaced=None,
+):
+    """Sample and displace lines ``starts → ends`` adaptively.
+
+    ``displace`` maps an ``(N, 3)`` array of points to displaced positions,
+    or to an ``(L, N, 3)`` array of ``L`` layers displaced differently. A
+    segment is split at its midpoint while the displaced midpoint lies
+    more than ``tolerance`` from the chord between the displaced ends, in
+    any layer.
+    Each line gets at most ``max_vertices`` vertices; when a round wants
+    more splits than that allows, the most deviating segments win.
+
+    ``seeds`` is an optional ``(M, 3)`` array of points (object positions);
+    a line passing within one initial segment length of a seed starts with
+    an extra vertex at its closest approach, nearest seeds first.
+
+    ``samples`` replaces the ``initial_segments`` uniform starting samples
+    with ``(points, line, t, vertex)``: ``(V, 3)`` undisplaced vertices that
+    several lines may share and, per sample along the lines (sorted by
+    line, then ``t``), its line, line parameter and index into ``points``.
+    Seeds and refinement add vertices that belong to one line each.
+    ``displaced`` holds ``points`` already displaced, in the form
+    ``displace`` returns, when the caller has computed them.
+
+    Returns ``(vertices, indices)``: ``indices`` joins neighbours along
+    each line as ``GL_LINES`` pairs into ``vertices`` (along the second
+    axis for layers, which share the sample points). Without ``samples``
+    the vertices of each line are consecutive; with them ``vertices``
+    starts with ``points``, displaced.
+    """
+    starts = np.asarray(starts, dtype=float).reshape(-1, 3)
+    ends = np.asarray(ends, dtype=float).reshape(-1, 3)
+    count = len(starts)
+    initial = max(1, min(initial_segments, max_vertices - 1))
+    if not count:
+        if displaced is not None:
+            return displaced, np.zeros(0, dtype=np.uint32)
+        return displace(np.zeros((0, 3))), np.zeros(0, dtype=np.uint32)
+    if samples is None:
+        shared = np.zeros((0, 3))
+        line = np.repeat(np.arange(count), initial + 1)
+        t = np.tile(np.linspace(0.0, 1.0, initial + 1), count)
+        vertex = np.full(len(t), -1, dtype=np.int64)
+    else:
+        shared, line, t, vertex = samples
+        shared = np.asarray(shared, dtype=float).reshape(-1, 3)
+        line = np.asarray(line, dtype=np.int64)
+        t = np.asarray(t, dtype=float)
+        vertex = np.array(vertex, dtype=np.int64)
+    if seeds is not None and len(seeds):
+        longest = np.bincount(line, minlength=count).max()
+        seed_line, seed_t = _closest_approaches(
+            starts, ends, seeds, initial, max_vertices - longest
+        )
+        line = np.concatenate([line, seed_line])
+        t = np.concatenate([t, seed_t])
+        vertex = np.concatenate([vertex, np.full(len(seed_t), -1, dtype=np.int64)])
+        order = np.lexsort((t, line))
+        line, t, vertex = line[order], t[order], vertex[order]
+        unique = np.ones(len(t), dtype=bool)
+        unique[1:] = (line[1:] != line[:-1]) | (t[1:] != t[:-1])
+        line, t, vertex = line[unique], t[unique], vertex[unique]
+    # Samples of no shared vertex get their own, after the shared ones
+    own = vertex < 0
+    vertex[own] = len(shared) + np.arange(int(own.sum()))
+    unshared = _sample(starts, ends, line[own], t[own])
+    if displaced is None:
+        points = displace(np.concatenate([shared, unshared]))
+    else:
+        points = np.concatenate([displaced, displace(unshared)], axis=-2)
+    layered = points.ndim == 3
+    if not layered:
+        points = points[None]
+    # Whether the segment starting at each sample is known to be flat enough
+    settled = np.ones(len(t), dtype=bool)
+    settled[:-1] = line[1:] != line[:-1]
+    if samples is not None:
+        settled[:-1] |= _straight_segments(points, line, t, vertex, tolerance)
+    sizes = np.bincount(line, minlength=count)
+    while True:
+        left = np.flatnonzero(~settled)
+        if not len(left):
+            break
+        right = left + 1
+        middle_t = 0.5 * (t[left] + t[right])
+        middles = displace(_sample(starts, ends, line[left], middle_t))
+        if not layered:
+            middles = middles[None]
+        deviation = chord_deviation(
+            points[:, vertex[left]], middles, points[:, vertex[right]]
+        ).max(axis=0)
+        split = (deviation > tolerance) & (t[right] - t[left] > MIN_SEGMENT)
+        split &= _within_budget(line[left], deviation, split, max_vertices - sizes)
+        settled[left[~split]] = True
+        chosen = left[split]
+        if not len(chosen):
+            break
+        sizes += np.bincount(line[chosen], minlength=count)
+        at = chosen + 1
+        t = np.insert(t, at, middle_t[split])
+        line = np.insert(line, at, line[chosen])
+        vertex = np.insert(vertex, at, points.shape[1] + np.arange(len(chosen)))
+        points = np.concatenate([points, middles[:, split]], axis=1)
+        settled = np.insert(settled, at, False)
+    if samples is None:
+        # Store each line's vertices consecutively, in order along it
+        points = points[:, vertex]
+        vertex = np.arange(len(vertex))
+    return (points if layered else points[0]), _line_indices(line, vertex)
+
+
+def _straight_segments(points, line, t, vertex, tolerance):
+    """Return which segments between samples already look flat enough.
+
+    Shared samples can be denser than :data:`INITIAL_SEGMENTS` per line.
+    A sample within ``tolerance`` of the chord between its neighbours, when
+    these are no further apart than the initial segments of unshared
+    lines, vouches for both segments next to it: it passes the midpoint
+    test those lines would have started with. A segment is flat enough
+    when each of its ends is such a sample or ends the line, and it does
+    not span the whole line.
+    """
+    first = np.ones(len(t), dtype=bool)
+    first[1:] = line[1:] != line[:-1]
+    last = np.ones(len(t), dtype=bool)
+    last[:-1] = line[1:] != line[:-1]
+    inner = np.flatnonzero(~first & ~last)
+    straight = first | last
+    deviation = chord_deviation(
+        points[:, vertex[inner - 1]], points[:, vertex[inner]], points[:, vertex[inner + 1]]
+    ).max(axis=0)
+    span = t[inner + 1] - t[inner - 1]
+    straight[inner] = (deviation <= tolerance) & (span <= 1.0 / INITIAL_SEGMENTS)
+    return straight[:-1] & straight[1:] & ~(first[:-1] & last[1:])
+
+
+def _sample(starts, ends, line, t):
+    return starts[line] + (ends[line] - starts[line]) * t[:, None]
+
+
+def _closest_approaches(starts, ends, seeds, initial, limit):
+    """Return ``(line, t)`` where lines pass closest to nearby seeds.
+
+    A seed counts as nearby when it is closer to the line than
+    ``1 / initial`` of the line's length; each line keeps its ``limit``
+    nearest seeds.
+    """
+    seeds = np.asarray(seeds, dtype=float).reshape(-1, 3)
+    direction = ends - starts
+    length2 = np.einsum("lk,lk->l", direction, direction)
+    chunk = max(1, MAX_PAIRS_PER_CHUNK // len(seeds))
+    lines, params, distances = [], [], []
+    for first in range(0, len(starts), chunk):
+        rows = slice(first, first + chunk)
+        offset = seeds[None, :, :] - starts[rows, None, :]
+        along = np.einsum("lmk,lk->lm", offset, direction[rows])
+        t = np.clip(along / np.where(length2[rows] > 0, length2[rows], 1.0)[:, None], 0.0, 1.0)
+        gap = offset - t[:, :, None] * direction[rows, None, :]
+        distance = np.sqrt(np.einsum("lmk,lmk->lm", gap, gap))
+        radius = np.sqrt(length2[rows]) / initial
+        line, seed = np.nonzero(distance < radius[:, None])
+        lines.append(line + first)
+        params.append(t[line, seed])
+        distances.append(distance[line, seed])
+    line = np.concatenate(lines)
+    t = np.concatenate(params)
+    distance = np.concatenate(distances)
+    order = np.lexsort((distance, line))
+    ordered = line[order]
+    rank = np.arange(len(order)) - np.searchsorted(ordered, ordered)
+    keep = order[rank < limit]
+    return line[keep], t[keep]
+
+
+def _within_budget(line, deviation, split, allowed):
+    """Keep, per line, only the ``allowed`` most deviating splits."""
+    keep = np.zeros(len(line), dtype=bool)
+    candidates = np.flatnonzero(split)
+    if not len(candidates):
+        return keep
+    order = candidates[np.lexsort((-deviation[candidates], line[candidates]))]
+    ordered_lines = line[order]
+    rank = np.arange(len(order)) - np.searchsorted(ordered_lines, ordered_lines)
+    keep[order[rank < allowed[ordered_lines]]] = True
+    return keep
+
+
+def _line_indices(line, vertex):
+    """Return ``GL_LINES`` indices joining consecutive samples of each line."""
+    left = np.flatnonzero(line[:-1] == line[1:])
+    return np.stack([vertex[left], vertex[left + 1]], axis=1).reshape(-1).astype(np.uint32)
+
@@ -0,0 +1,351 @@
+"""Reproducible benchmarks for the force, geometry and render hot paths.
+
+Usage::
+
+    python benchmark.py run --output results.json
+    python benchmark.py compare baseline.json results.json --threshold 0.2
+
+``run`` writes machine-readable JSON. ``compare`` prints the change of
+every metric against a saved baseline and exits with status 1 if any got
+worse by more than ``--threshold`` (a fraction, 0.1 = 10%) or is missing
+from the new results.
+
+The GL benchmarks need an offscreen EGL context (Mesa llvmpipe is enough)
+and are recorded as skipped when none is available.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from headless import configure_environment
+
+configure_environment()
+
+import numpy as np  # noqa: E402
+from PyQt5.QtGui import QVector3D  # noqa: E402
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+from catalog import RECORD_DTYPE  # noqa: E402
+from grid_visualizer import GridVisualizer  # noqa: E402
+from space_time_grid import SpaceTimeGrid  # noqa: E402
+
+OBJECT_COUNTS = (1, 10, 100, 1000)
+GRID_DENSITIES = (2, 5, 10, 20, 30, 40, 50)
+
+
+def _best_time(function, repeats):
+    """Return the fastest of ``repeats`` timed calls, in seconds."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _metric(value, unit, higher_is_better=True):
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def _visualizer(object_count, seed=0):
+    visualizer = GridVisualizer(SpaceTimeGrid(1, 1, 1, 1, 1, 1.0))
+    visualizer.update = lambda: None
+    rng = np.random.default_rng(seed)
+    visualizer.add_objects(
+        rng.random((object_count, 3)), 0.02, np.ones((object_count, 4)), 1e-3
+    )
+    return visualizer
+
+
+def bench_formula(results, repeats):
+    visualizer = _visualizer(0)
+    formula = visualizer.force_formulas["gravity"]
+    r = np.random.default_rng(1).random(100_000) + 0.01
+    m = np.ones_like(r)
+    seconds = _best_time(lambda: visualizer._evaluate_formula(formula, r, m), repeats)
+    results["formula.vectorized"] = _metric(len(r) / seconds, "evaluations/s")
+    seconds = _best_time(
+        lambda: [visualizer._evaluate_formula(formula, x, 1.0) for x in r[:2000]],
+        repeats,
+    )
+    results["formula.scalar"] = _metric(2000 / seconds, "evaluations/s")
+    visualizer.set_force_tables(True)
+    table = visualizer._force_profile("gravity")
+    seconds = _best_time(lambda: table(r, m), repeats)
+    results["formula.tabulated"] = _metric(len(r) / seconds, "evaluations/s")
+
+
+def bench_displacement(results, repeats):
+    vertices = np.random.default_rng(2).random((20_000, 3))
+    for count in OBJECT_COUNTS:
+        visualizer = _visualizer(count)
+        seconds = _best_time(lambda: visualizer._displace(vertices), repeats)
+        results[f"displacement.objects_{count}"] = _metric(
+            len(vertices) / seconds, "vertices/s"
+        )
+        # One vertex per call, as the original per-point drawing code did
+        points = [QVector3D(*vertex) for vertex in vertices[:200]]
+        seconds = _best_time(
+            lambda: [visualizer._apply_displacement(p) for p in points], repeats
+        )
+        results[f"apply_displacement.objects_{count}"] = _metric(
+            len(points) / seconds, "vertices/s"
+        )
+
+
+def bench_geometry(results, repeats):
+    visualizer = _visualizer(10)
+    visualizer.set_dimension(3)
+    for density in GRID_DENSITIES:
+        visualizer.set_grid_density(density)
+        seconds = _best_time(visualizer._build_grid_layer, repeats)
+        results[f"geometry.grid_3d.density_{density}"] = _metric(
+            seconds * 1e3, "ms/build", higher_is_better=False
+        )
+        vertices = len(visualizer._build_grid_layer()[0])
+        results[f"geometry.grid_3d_vertices.density_{density}"] = _metric(
+            vertices, "vertices", higher_is_better=False
+        )
+    # Uniform sampling splits the shared lattice evenly between crossings
+    visualizer.set_line_tolerance(0)
+    for density in (10, 30):
+        visualizer.set_grid_density(density)
+        seconds = _best_time(visualizer._build_grid_layer, repeats)
+        results[f"geometry.grid_3d_uniform.density_{density}"] = _metric(
+            seconds * 1e3, "ms/build", higher_is_better=False
+        )
+    visualizer.set_line_tolerance(1e-3)
+    # The 3D force grids are displaced at the crossings of the grid lattice
+    visualizer.set_grid_density(30)
+    names = ["grid"] + [f"force:{name}" for name in visualizer.force_formulas]
+    seconds = _best_time(lambda: visualizer._build_line_layers(names), repeats)
+    results["geometry.grid_3d_all_layers"] = _metric(
+        seconds * 1e3, "ms/build", higher_is_better=False
+    )
+    # The combined grid and every force grid share the 2D lattice
+    visualizer.set_dimension(2)
+    visualizer.set_grid_density(30)
+    names = ["grid"] + [f"force:{name}" for name in visualizer.force_formulas]
+    seconds = _best_time(lambda: visualizer._build_line_layers(names), repeats)
+    results["geometry.grid_2d_all_layers"] = _metric(
+        seconds * 1e3, "ms/build", higher_is_better=False
+    )
+
+
+def bench_space_time_grid(results, repeats):
+    seconds = _best_time(lambda: SpaceTimeGrid(20, 20, 20, 5, 10, 0.1), repeats)
+    results["space_time_grid.construct"] = _metric(
+        seconds * 1e3, "ms", higher_is_better=False
+    )
+    grid = SpaceTimeGrid(20, 20, 20, 5, 10, 0.1)
+    indices = np.random.default_rng(3).integers(0, 5, size=(10_000, 5)).tolist()
+
+    def access():
+        for x, y, z, w, t in indices:
+            grid.set_point(x, y, z, w, t, grid.get_point(x, y, z, w, t) + 1)
+
+    seconds = _best_time(access, repeats)
+    results["space_time_grid.point_access"] = _metric(
+        len(indices) / seconds, "get+set/s"
+    )
+
+
+def bench_catalog(results, repeats):
+    rows = 200_000
+    records = np.zeros(rows, dtype=RECORD_DTYPE)
+    rng = np.random.default_rng(4)
+    for name in ("x", "y", "z"):
+        records[name] = rng.random(rows)
+    handle, path = tempfile.mkstemp(suffix=".bin")
+    os.close(handle)
+    try:
+        records.tofile(path)
+
+        def load():
+            visualizer = _visualizer(0)
+            # Keeps the Barnes–Hut switch notice out of the benchmark output
+            visualizer.exact_object_limit = None
+            visualizer.load_catalog(path)
+
+        seconds = _best_time(load, repeats)
+        results["catalog.load_raw"] = _metric(rows / seconds, "objects/s")
+    finally:
+        os.remove(path)
+
+
+def bench_gl(results, skipped, repeats):
+    from headless import EGLContext
+
+    try:
+        context = EGLContext(640, 480)
+    except Exception as exc:  # no EGL or no usable driver
+        skipped["gl"] = str(exc)
+        return
+    try:
+        from OpenGL.GL import glFinish
+
+        visualizer = _visualizer(100)
+        visualizer.initializeGL()
+        visualizer.resizeGL(640, 480)
+
+        def draw_spheres():
+            visualizer.geometry_cache.invalidate("objects")
+            visualizer._draw_spheres(visualizer.objects)
+            glFinish()
+
+        seconds = _best_time(draw_spheres, repeats)
+        results["render.draw_sphere.objects_100"] = _metric(
+            seconds * 1e3, "ms/frame", higher_is_better=False
+        )
+
+        crowd = _visualizer(10_000)
+        crowd.initializeGL()
+        crowd.resizeGL(640, 480)
+
+        def draw_crowd():
+            crowd._draw_spheres(crowd.objects)
+            glFinish()
+
+        seconds = _best_time(draw_crowd, repeats)
+        results["render.draw_sphere.objects_10000"] = _metric(
+            seconds * 1e3, "ms/frame", higher_is_better=False
+        )
+
+        def frame():
+            visualizer.paintGL()
+            glFinish()
+
+        frame()
+        seconds = _best_time(frame, repeats)
+        results["render.paint_cached"] = _metric(
+            seconds * 1e3, "ms/frame", higher_is_better=False
+        )
+
+        # A sliding grid changes every frame, defeating the geometry cache
+        for mode, gpu in (("cpu", False), ("gpu", True)):
+            visualizer.set_gpu_displacement(gpu)
+            step = iter(range(1_000_000))
+
+            def moving_frame():
+                visualizer.grid_translation = QVector3D(1e-3 * next(step), 0.0, 0.0)
+                frame()
+
+            moving_frame()
+            seconds = _best_time(moving_frame, repeats)
+            results[f"render.paint_moving.{mode}"] = _metric(
+                seconds * 1e3, "ms/frame", higher_is_better=False
+            )
+    finally:
+        context.release()
+
+
+def run(repeats=5):
+    """Run every benchmark and return the JSON-serializable report.
+
+    Each case reports the best of ``repeats`` runs.
+    """
+    # Qt needs an application object to create widgets, even offscreen
+    app = QApplication.instance() or QApplication(sys.argv[:1])  # noqa: F841
+    results, skipped = {}, {}
+    bench_formula(results, repeats)
+    bench_displacement(results, repeats)
+    bench_geometry(results, repeats)
+    bench_space_time_grid(results, repeats)
+    bench_catalog(results, repeats)
+    bench_gl(results, skipped, repeats)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeats": repeats,
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+def _relative_change(before, after, higher_is_better=True):
+    """Return the relative improvement from ``before`` to ``after``.
+
+    A change from zero is infinite (or 0.0 if both are zero), so a
+    lower-is-better metric dropping to zero counts as an improvement.
+    """
+    if not higher_is_better:
+        before, after = after, before
+    if not before:
+        return math.copysign(math.inf, after) if after else 0.0
+    return after / before - 1
+
+
+def compare(baseline, current, threshold=0.2):
+    """Return ``(rows, regressions)`` comparing two reports.
+
+    Each row is ``(name, baseline, current, change)`` where ``change`` is
+    the relative improvement (positive is better). A metric regresses when
+    ``change < -threshold``. Metrics of the baseline missing from the
+    current report get ``current`` and ``change`` None and also regress.
+    """
+    rows, regressions = [], []
+    for name, before in baseline["results"].items():
+        after = current["results"].get(name)
+        if after is None:
+            rows.append((name, before["value"], None, None))
+            regressions.append(name)
+            continue
+        change = _relative_change(
+            before["value"], after["value"], before.get("higher_is_better", True)
+        )
+        rows.append((name, before["value"], after["value"], change))
+        if change < -threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--output", help="write JSON here instead of stdout")
+    run_parser.add_argument(
+        "--repeats", type=int, default=5, help="runs per case; the best is kept"
+    )
+    compare_parser = commands.add_parser("compare", help="compare two reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        report = run(args.repeats)
+        text = json.dumps(report, indent=2, sort_keys=True)
+        if args.output:
+            with open(args.output, "w") as handle:
+                handle.write(text + "\n")
+        else:
+            print(text)
+        return 0
+
+    with open(args.baseline) as handle:
+        baseline = json.load(handle)
+    with open(args.current) as handle:
+        current = json.load(handle)
+    rows, regressions = compare(baseline, current, args.threshold)
+    for name, before, after, change in rows:
+        if after is None:
+            print(f"{name:45} {before:14.4g} -> {'missing':>14}          REGRESSION")
+            continue
+        flag = "  REGRESSION" if name in regressions else ""
+        print(f"{name:45} {before:14.4g} -> {after:14.4g} {change:+7.1%}{flag}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
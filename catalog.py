@@ -0,0 +1,142 @@
+"""Streaming import of object catalogs.
+
+A catalog lists one object per row: position, velocity, mass, radius and
+color. :func:`read_catalog` yields fixed-size chunks of NumPy arrays, so
+catalogs with millions of rows are never held in memory at once. Three
+layouts are read:
+
+* ``.csv`` files whose header row names columns of :data:`COLUMNS`.
+  ``x``, ``y`` and ``z`` are required; missing columns take
+  :data:`DEFAULTS` and unknown ones are ignored.
+* ``.npy`` files holding a structured array with those field names, or a
+  2D float array with the columns in :data:`COLUMNS` order (at least
+  ``x``, ``y``, ``z``), read through a memory map.
+* Any other file is read as raw records of :data:`RECORD_DTYPE`.
+"""
+
+import itertools
+import os
+from collections import namedtuple
+
+import numpy as np
+
+COLUMNS = ("x", "y", "z", "vx", "vy", "vz", "mass", "radius", "r", "g", "b", "a")
+DEFAULTS = {
+    "vx": 0.0,
+    "vy": 0.0,
+    "vz": 0.0,
+    "mass": 1.0,
+    "radius": 0.01,
+    "r": 1.0,
+    "g": 1.0,
+    "b": 1.0,
+    "a": 1.0,
+}
+# Little-endian float32 record of the raw binary layout
+RECORD_DTYPE = np.dtype([(name, "<f4") for name in COLUMNS])
+# Rows per chunk
+CHUNK_SIZE = 1 << 16
+
+# Arrays of one chunk, in the shapes ObjectStore.add_many takes
+CatalogChunk = namedtuple("CatalogChunk", "positions velocities masses radii colors")
+
+
+class CatalogError(ValueError):
+    """Raised when a catalog file cannot be read."""
+
+
+def read_catalog(path, chunk_size=CHUNK_SIZE):
+    """Yield :class:`CatalogChunk` tuples of up to ``chunk_size`` rows.
+
+    Raises :class:`CatalogError` for malformed files; rows of chunks
+    already yielded stay valid.
+    """
+    path = os.fspath(path)
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        chunks = _csv_columns(path, chunk_size)
+    elif extension == ".npy":
+        chunks = _npy_columns(path, chunk_size)
+    else:
+        chunks = _raw_columns(path, chunk_size)
+    for columns in chunks:
+        yield _chunk(columns)
+
+
+def _chunk(columns):
+    """Build a :class:`CatalogChunk` from ``{column: array}``."""
+    count = len(columns["x"])
+
+    def stack(names):
+        out = np.empty((count, len(names)))
+        for k, name in enumerate(names):
+            out[:, k] = columns.get(name, DEFAULTS.get(name))
+        return out
+
+    return CatalogChunk(
+        positions=stack(("x", "y", "z")),
+        velocities=stack(("vx", "vy", "vz")),
+        masses=stack(("mass",))[:, 0],
+        radii=stack(("radius",))[:, 0],
+        colors=stack(("r", "g", "b", "a")),
+    )
+
+
+def _require_position(path, names):
+    missing = [name for name in ("x", "y", "z") if name not in names]
+    if missing:
+        raise CatalogError(f"{path}: missing columns {', '.join(missing)}")
+
+
+def _csv_columns(path, chunk_size):
+    with open(path, newline="") as handle:
+        header = [name.strip().lower() for name in handle.readline().split(",")]
+        _require_position(path, header)
+        used = [k for k, name in enumerate(header) if name in COLUMNS]
+        while True:
+            lines = list(itertools.islice(handle, chunk_size))
+            if not lines:
+                return
+            try:
+                data = np.loadtxt(lines, delimiter=",", usecols=used, ndmin=2)
+            except ValueError as exc:
+                raise CatalogError(f"{path}: {exc}") from None
+            if len(data):
+                yield {header[k]: data[:, column] for column, k in enumerate(used)}
+
+
+def _npy_columns(path, chunk_size):
+    try:
+        data = np.load(path, mmap_mode="r")
+    except (OSError, ValueError) as exc:
+        raise CatalogError(f"{path}: {exc}") from None
+    if data.dtype.names is not None:
+        names = [name.lower() for name in data.dtype.names]
+        _require_position(path, names)
+        fields = [
+            (field, name) for field, name in zip(data.dtype.names, names) if name in COLUMNS
+        ]
+        for start in range(0, len(data), chunk_size):
+            rows = data[start : start + chunk_size]
+            yield {name: np.asarray(rows[field], dtype=float) for field, name in fields}
+    elif data.ndim == 2 and data.shape[1] >= 3:
+        names = COLUMNS[: data.shape[1]]
+        for start in range(0, len(data), chunk_size):
+            rows = np.asarray(data[start : start + chunk_size], dtype=float)
+            yield {name: rows[:, k] for k, name in enumerate(names)}
+    else:
+        raise CatalogError(f"{path}: expected a structured or (N, >=3) array")
+
+
+def _raw_columns(path, chunk_size):
+    size = os.path.getsize(path)
+    if size % RECORD_DTYPE.itemsize:
+        raise CatalogError(
+            f"{path}: size is not a multiple of the {RECORD_DTYPE.itemsize}-byte record"
+        )
+    if not size:
+        return
+    data = np.memmap(path, dtype=RECORD_DTYPE, mode="r")
+    for start in range(0, len(data), chunk_size):
+        rows = data[start : start + chunk_size]
+        yield {name: np.asarray(rows[name], dtype=float) for name in COLUMNS}
@@ -0,0 +1,142 @@
+"""Uniform cell list for short-range forces.
+
+The unit box is divided into cubic cells at least as large as the smallest
+force cutoff. Each object is hashed to the cell containing it (objects
+outside the box go to the nearest edge cell), so a vertex only needs to
+visit objects in the surrounding cells instead of every object.
+
+Cell membership is kept in a dictionary and updated incrementally: syncing
+with the current objects only touches those that were added, removed or
+moved to another cell.
+"""
+
+import itertools
+import math
+
+import numpy as np
+
+from displacement import accumulate_pairs
+
+# Keeps the dense per-cell arrays small for very short cutoffs
+MAX_CELLS_PER_AXIS = 64
+
+
+def cells_for(cell_size):
+    """Return the number of cells per axis used for ``cell_size``."""
+    return min(MAX_CELLS_PER_AXIS, max(1, math.ceil(1.0 / cell_size)))
+
+
+class CellList:
+    """Spatial hash of object keys over the unit box."""
+
+    def __init__(self, cell_size):
+        self.cells_per_axis = cells_for(cell_size)
+        self.cell_size = 1.0 / self.cells_per_axis
+        # Flat cell index of every object key
+        self._cell_of = {}
+        self._keys = []
+        self._arrays = None
+        # Number of insert/remove/move operations applied, for diagnostics
+        self.updates = 0
+
+    def __len__(self):
+        return len(self._cell_of)
+
+    def cell_coords(self, positions):
+        """Return the integer ``(N, 3)`` cell coordinates of positions."""
+        coords = np.floor(np.asarray(positions, dtype=float) / self.cell_size)
+        return np.clip(coords, 0, self.cells_per_axis - 1).astype(int)
+
+    def _flat(self, coords):
+        n = self.cells_per_axis
+        return (coords[..., 0] * n + coords[..., 1]) * n + coords[..., 2]
+
+    def insert(self, key, position):
+        """Add ``key`` at ``position``."""
+        cell = int(self._flat(self.cell_coords([position]))[0])
+        self._cell_of[key] = cell
+        self._arrays = None
+        self.updates += 1
+
+    def remove(self, key):
+        """Remove ``key`` if present."""
+        if self._cell_of.pop(key, None) is None:
+            return
+        self._arrays = None
+        self.updates += 1
+
+    def move(self, key, position):
+        """Update the cell of ``key``; a no-op if it stays in its cell."""
+        cell = int(self._flat(self.cell_coords([position]))[0])
+        if self._cell_of.get(key) == cell:
+            return
+        self.remove(key)
+        self.insert(key, position)
+
+    def sync(self, keys, positions):
+        """Bring the hash in line with ``keys`` at ``positions``.
+
+        Rows of ``positions`` passed to :meth:`displacement` must follow the
+        order of ``keys`` given here. Only changed objects are rehashed.
+        """
+        keys = list(keys)
+        cells = self._flat(self.cell_coords(np.reshape(positions, (-1, 3)))).tolist()
+        current = set(keys)
+        for key in [k for k in self._cell_of if k not in current]:
+            self.remove(key)
+        for key, cell, position in zip(keys, cells, np.reshape(positions, (-1, 3))):
+            if self._cell_of.get(key) != cell:
+                self.move(key, position)
+        if keys != self._keys:
+            self._keys = keys
+            self._arrays = None
+
+    def _cell_arrays(self):
+        """Return ``(start, count, rows)`` listing the rows in every cell."""
+        if self._arrays is None:
+            n_cells = self.cells_per_axis**3
+            cells = np.array([self._cell_of[key] for key in self._keys], dtype=int)
+            rows = np.argsort(cells, kind="stable")
+            count = np.bincount(cells, minlength=n_cells)
+            start = np.cumsum(count) - count
+            self._arrays = (start, count, rows)
+        return self._arrays
+
+    def neighbour_pairs(self, vertices, radius):
+        """Return ``(vertex, row)`` index arrays of candidate pairs.
+
+        Every object within ``radius`` of a vertex is included; some further
+        away may be too and are filtered by the caller.
+        """
+        start, count, rows = self._cell_arrays()
+        coords = self.cell_coords(vertices)
+        reach = max(1, math.ceil(radius / self.cell_size))
+        vertex_ids = np.arange(len(coords))
+        pair_vertex, pair_row = [], []
+        for offset in itertools.product(range(-reach, reach + 1), repeat=3):
+            cell = coords + offset
+            inside = ((cell >= 0) & (cell < self.cells_per_axis)).all(axis=1)
+            flat = self._flat(cell[inside])
+            counts = count[flat]
+            if not counts.any():
+                continue
+            pair_vertex.append(np.repeat(vertex_ids[inside], counts))
+            within = np.arange(counts.sum()) - np.repeat(
+                np.cumsum(counts) - counts, counts
+            )
+            pair_row.append(rows[np.repeat(start[flat], counts) + within])
+        if not pair_vertex:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        return np.concatenate(pair_vertex), np.concatenate(pair_row)
+
+    def displacement(self, vertices, positions, masses, evaluate, scaling, cutoff):
+        """Return the summed ``value * scaling * r_unit`` within ``cutoff``."""
+        vertices = np.asarray(vertices, dtype=float).reshape(-1, 3)
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        masses = np.asarray(masses, dtype=float).reshape(-1)
+        total = np.zeros_like(vertices)
+        vertex, row = self.neighbour_pairs(vertices, cutoff)
+        r_vec = vertices[vertex] - positions[row]
+        r = np.sqrt(np.einsum("nk,nk->n", r_vec, r_vec))
+        accumulate_pairs(total, vertex, r_vec, r, masses[row], evaluate, scaling, cutoff)
+        return total
@@ -0,0 +1,207 @@
+"""Vectorized force displacement for batches of grid vertices.
+
+The functions here mirror ``GridVisualizer._apply_displacement``,
+``_apply_force`` and ``_clamp_to_box`` but operate on whole ``(N, 3)``
+vertex arrays at once instead of one ``QVector3D`` at a time.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from formula_compiler import is_linear_in_mass
+
+# Upper bound on vertex/object pairs evaluated per chunk. Keeps the
+# temporary (3, n, m) arrays to a few tens of megabytes.
+MAX_PAIRS_PER_CHUNK = 1 << 18
+
+# One force term: ``evaluate(r, m)``, its scaling factor and an optional
+# cutoff radius beyond which objects are ignored.
+Force = namedtuple("Force", "evaluate scaling cutoff", defaults=(None,))
+
+
+def clamp_to_box(points):
+    """Clamp an ``(N, 3)`` array of points into the unit bounding box."""
+    return np.clip(points, 0.0, 1.0, out=points)
+
+
+def pair_geometry(vertices, positions):
+    """Return ``(deltas, r, valid)`` for every vertex/object pair.
+
+    ``deltas`` has shape ``(3, n, m)`` and holds the x, y and z components
+    of ``vertex - object`` as separate contiguous planes; ``r`` and
+    ``valid`` have shape ``(n, m)``. Pairs where the vertex sits exactly on
+    the object are marked invalid and skipped, like the scalar
+    implementation.
+    """
+    deltas = vertices.T[:, :, None] - positions.T[:, None, :]
+    r = np.sqrt(np.einsum("knm,knm->nm", deltas, deltas))
+    return deltas, r, r != 0
+
+
+def force_magnitudes(evaluate, r, masses, valid):
+    """Evaluate a force over all pairs, zeroing skipped or failed entries.
+
+    ``masses`` must broadcast against ``r``.
+    """
+    with np.errstate(all="ignore"):
+        value = evaluate(r, masses)
+        value = np.broadcast_to(np.asarray(value, dtype=float), r.shape)
+    return np.where(valid & np.isfinite(value), value, 0.0)
+
+
+def accumulate_pairs(total, vertex, r_vec, r, masses, evaluate, scaling, cutoff=None):
+    """Add ``value * scaling * r_unit`` of explicit vertex/object pairs.
+
+    ``vertex`` holds the row of ``total`` each pair belongs to; ``r_vec``,
+    ``r`` and ``masses`` describe the pairs. Pairs at ``r == 0`` or beyond
+    ``cutoff`` contribute nothing.
+    """
+    if not len(vertex):
+        return
+    valid = r != 0
+    if cutoff is not None:
+        valid &= r < cutoff
+    value = force_magnitudes(evaluate, r, masses, valid)
+    weight = value * scaling / np.where(valid, r, 1.0)
+    for axis in range(3):
+        total[:, axis] += np.bincount(
+            vertex, weights=r_vec[:, axis] * weight, minlength=len(total)
+        )
+
+
+def displace_vertices(
+    vertices,
+    positions,
+    masses,
+    forces,
+    clamp=True,
+    tree=None,
+    theta=0.5,
+    cells=None,
+):
+    """Displace ``vertices`` by the summed contribution of ``forces``.
+
+    ``vertices`` is an ``(N, 3)`` array, ``positions`` an ``(M, 3)`` array
+    of object positions and ``masses`` an ``(M,)`` array. ``forces`` is a
+    sequence of :class:`Force` tuples (or plain ``(evaluate, scaling)``
+    pairs) where ``evaluate(r, m)`` accepts broadcastable arrays of
+    distances and masses. Each object pulls vertices toward itself by
+    ``value * scaling`` along the joining line, ignoring objects at or
+    beyond the force's ``cutoff``. Forces with zero scaling, or whose
+    ``evaluate`` exposes a ``constant`` of 0, are skipped.
+
+    If ``tree`` is an :class:`octree.Octree` built over the same objects,
+    forces linear in ``m`` without a cutoff are approximated with
+    Barnes–Hut using opening angle ``theta``. If ``cells`` is a
+    :class:`cell_list.CellList` synced to the same objects, forces with a
+    cutoff only visit objects in nearby cells. Everything else is summed
+    exactly.
+    """
+    forces = list(forces)
+    return displace_layers(
+        vertices,
+        positions,
+        masses,
+        forces,
+        [range(len(forces))],
+        clamp=clamp,
+        tree=tree,
+        theta=theta,
+        cells=cells,
+    )[0]
+
+
+def displace_layers(
+    vertices,
+    positions,
+    masses,
+    forces,
+    layers,
+    clamp=True,
+    tree=None,
+    theta=0.5,
+    cells=None,
+):
+    """Displace ``vertices`` once per layer in a single fused pass.
+
+    ``layers`` is a sequence of index lists into ``forces``; each layer is
+    displaced by the sum of its forces exactly like
+    :func:`displace_vertices`. The pair geometry of every vertex/object
+    pair is computed once, and every force is evaluated once however many
+    layers use it. Returns an ``(L, N, 3)`` array for ``L`` layers.
+    """
+    vertices = np.asarray(vertices, dtype=float).reshape(-1, 3)
+    layers = [set(layer) for layer in layers]
+    result = np.repeat(vertices[None], len(layers), axis=0)
+    forces = [Force(*f) for f in forces]
+    used = set().union(*layers)
+    active = [
+        index
+        for index, force in enumerate(forces)
+        if index in used
+        and force.scaling
+        and getattr(force.evaluate, "constant", None) != 0
+    ]
+    exact = []
+    for index in active:
+        force = forces[index]
+        if not len(positions):
+            break
+        if force.cutoff is not None and cells is not None:
+            offset = cells.displacement(
+                vertices, positions, masses, force.evaluate, force.scaling, force.cutoff
+            )
+        elif force.cutoff is None and tree is not None and _linear_in_mass(force):
+            offset = tree.displacement(vertices, force.evaluate, force.scaling, theta)
+        else:
+            exact.append(index)
+            continue
+        for layer, members in zip(result, layers):
+            if index in members:
+                layer -= offset
+    if len(positions) and exact:
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        masses = np.asarray(masses, dtype=float).reshape(-1)
+        chunk = max(1, MAX_PAIRS_PER_CHUNK // len(positions))
+        for start in range(0, len(vertices), chunk):
+            stop = start + chunk
+            deltas, r, valid = pair_geometry(vertices[start:stop], positions)
+            values = {}
+            for index in exact:
+                force = forces[index]
+                in_range = valid if force.cutoff is None else valid & (r < force.cutoff)
+                value = force_magnitudes(force.evaluate, r, masses[None, :], in_range)
+                values[index] = value * force.scaling
+            safe_r = np.where(valid, r, 1.0)
+            for layer, members in zip(result, layers):
+                terms = [values[index] for index in exact if index in members]
+                if not terms:
+                    continue
+                total = np.zeros(r.shape)
+                for term in terms:
+                    total += term
+                # value / r along the unnormalized deltas is value along r_unit
+                weight = total / safe_r
+                layer[start:stop] -= np.einsum("nm,knm->nk", weight, deltas)
+    if clamp:
+        clamp_to_box(result)
+    return result
+
+
+def _linear_in_mass(force):
+    linear = getattr(force.evaluate, "linear_in_mass", None)
+    if linear is None:
+        linear = is_linear_in_mass(force.evaluate)
+    return linear
+
+
+def line_vertices(starts, ends, segments):
+    """Sample ``segments + 1`` evenly spaced points along each line.
+
+    Returns an array of shape ``(L, segments + 1, 3)`` for ``L`` lines.
+    """
+    starts = np.asarray(starts, dtype=float).reshape(-1, 1, 3)
+    ends = np.asarray(ends, dtype=float).reshape(-1, 1, 3)
+    t = np.linspace(0.0, 1.0, segments + 1)[None, :, None]
+    return starts + (ends - starts) * t
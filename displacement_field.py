@@ -0,0 +1,149 @@
+"""Precomputed displacement field sampled by trilinear interpolation.
+
+Evaluating every force for every vertex is only needed when objects or
+formulas change. While the grid merely slides through the box (as it does
+when objects have velocity) the displacement at any point can instead be
+interpolated from a field computed once on a fixed lattice over the unit
+box.
+
+Contributions of objects add up, so after a few objects are added,
+removed or edited the field is updated by subtracting their old
+contributions and adding the new ones instead of summing every object
+again. A full rebuild every :data:`FULL_REBUILD_INTERVAL` updates keeps
+rounding errors from accumulating.
+"""
+
+import numpy as np
+
+from displacement import clamp_to_box, displace_vertices
+
+# Offsets of the eight corners of a lattice cell
+_CORNERS = [(dx, dy, dz) for dx in (0, 1) for dy in (0, 1) for dz in (0, 1)]
+
+# Incremental updates allowed before the field is rebuilt from scratch
+FULL_REBUILD_INTERVAL = 64
+
+
+class DisplacementField:
+    """Displacement vectors on a ``resolution³`` lattice spanning [0, 1]³."""
+
+    def __init__(self, resolution=33):
+        if resolution < 2:
+            raise ValueError("field resolution must be at least 2")
+        self.resolution = resolution
+        self.values = np.zeros((resolution, resolution, resolution, 3))
+        # IDs and (x, y, z, mass) of the objects summed into ``values``;
+        # None when the field cannot be updated incrementally
+        self._ids = None
+        self._state = None
+        # Incremental updates since the last full build
+        self.updates = 0
+
+    def lattice_points(self):
+        """Return the ``(resolution³, 3)`` lattice coordinates."""
+        axis = np.linspace(0.0, 1.0, self.resolution)
+        x, y, z = np.meshgrid(axis, axis, axis, indexing="ij")
+        return np.stack([x, y, z], axis=-1).reshape(-1, 3)
+
+    def build(self, positions, masses, forces, ids=None, **options):
+        """Evaluate the unclamped displacement of ``forces`` on the lattice.
+
+        Arguments are the same as for :func:`displacement.displace_vertices`.
+        Passing the objects' stable ``ids`` allows later calls to
+        :meth:`update`. Fields built with a Barnes–Hut ``tree`` are
+        approximate, so exact per-object deltas would not cancel; they are
+        always rebuilt in full.
+        """
+        points = self.lattice_points()
+        displaced = displace_vertices(
+            points, positions, masses, forces, clamp=False, **options
+        )
+        self.values = (displaced - points).reshape(self.values.shape)
+        self._ids = self._state = None
+        if ids is not None and options.get("tree") is None:
+            self._ids = np.array(ids, dtype=np.int64).reshape(-1)
+            self._state = _object_state(positions, masses)
+        self.updates = 0
+        return self
+
+    def update(self, ids, positions, masses, forces, **options):
+        """Bring the field up to date with the objects ``ids``.
+
+        Only objects that were added, removed or moved (or changed mass)
+        since the last build or update are evaluated: the contribution of
+        their previous state is subtracted and the new one added.
+        ``forces`` must be those the field was built with. Falls back to
+        :meth:`build` (with ``options``) when the field was not built with
+        IDs, when a rebuild is as cheap, or every
+        :data:`FULL_REBUILD_INTERVAL` updates.
+        """
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        state = _object_state(positions, masses)
+        if self._ids is None or self.updates >= FULL_REBUILD_INTERVAL:
+            return self.build(positions, masses, forces, ids=ids, **options)
+        _, old_rows, new_rows = np.intersect1d(self._ids, ids, return_indices=True)
+        same = np.all(self._state[old_rows] == state[new_rows], axis=1)
+        old = np.ones(len(self._ids), dtype=bool)
+        old[old_rows[same]] = False
+        new = np.ones(len(ids), dtype=bool)
+        new[new_rows[same]] = False
+        if old.sum() + new.sum() >= len(ids):
+            return self.build(positions, masses, forces, ids=ids, **options)
+        shape = self.values.shape
+        self.values -= self._contribution(self._state[old], forces).reshape(shape)
+        self.values += self._contribution(state[new], forces).reshape(shape)
+        self._ids, self._state = ids, state
+        self.updates += 1
+        return self
+
+    def _contribution(self, state, forces):
+        """Return the lattice displacement caused by objects in ``state`` alone."""
+        points = self.lattice_points()
+        if not len(state):
+            return np.zeros_like(points)
+        displaced = displace_vertices(
+            points, state[:, :3], state[:, 3], forces, clamp=False
+        )
+        return displaced - points
+
+    def displacement_at(self, points):
+        """Trilinearly interpolate the displacement at ``(N, 3)`` points."""
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        cells = self.resolution - 1
+        scaled = np.clip(points, 0.0, 1.0) * cells
+        base = np.minimum(scaled.astype(int), cells - 1)
+        frac = scaled - base
+        result = np.zeros_like(points)
+        for dx, dy, dz in _CORNERS:
+            weight = (
+                (frac[:, 0] if dx else 1 - frac[:, 0])
+                * (frac[:, 1] if dy else 1 - frac[:, 1])
+                * (frac[:, 2] if dz else 1 - frac[:, 2])
+            )
+            corner = self.values[base[:, 0] + dx, base[:, 1] + dy, base[:, 2] + dz]
+            result += weight[:, None] * corner
+        return result
+
+    def sample(self, points):
+        """Return ``points`` displaced by the field and clamped to the box."""
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        return clamp_to_box(points + self.displacement_at(points))
+
+
+def _object_state(positions, masses):
+    return np.column_stack(
+        [np.asarray(positions, dtype=float).reshape(-1, 3), np.asarray(masses, dtype=float)]
+    )
+
+
+def interpolation_error(field, exact, points):
+    """Compare a field against exact displaced positions.
+
+    ``exact`` is the ``(N, 3)`` result of exact evaluation at ``points``.
+    Returns a dict with the maximum and mean Euclidean distance between the
+    interpolated and exact positions.
+    """
+    error = np.linalg.norm(field.sample(points) - exact, axis=1)
+    if not len(error):
+        return {"max": 0.0, "mean": 0.0}
+    return {"max": float(error.max()), "mean": float(error.mean())}
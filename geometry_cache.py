@@ -0,0 +1,51 @@
+"""Dirty tracking for per-layer geometry.
+
+Each drawn layer is associated with a key built from every input that
+affects its vertices (objects, formulas, scaling, density, translation,
+...). A frame only rebuilds the layers whose key changed; camera-only
+changes leave every key intact so cached vertex buffers are redrawn as-is.
+"""
+
+
+class GeometryCache:
+    """Remembers the input key each layer was last built from."""
+
+    def __init__(self):
+        self._keys = {}
+        self.hits = 0
+        self.misses = 0
+
+    def is_current(self, name, key):
+        """Return True if layer ``name`` was built from ``key``.
+
+        Every call counts as a hit or a miss.
+        """
+        if name in self._keys and self._keys[name] == key:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def store(self, name, key):
+        """Record that layer ``name`` now reflects ``key``."""
+        self._keys[name] = key
+
+    def invalidate(self, name=None):
+        """Force a rebuild of one layer, or of all layers if ``name`` is None."""
+        if name is None:
+            self._keys.clear()
+        else:
+            self._keys.pop(name, None)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """Return hit/miss counters and the hit rate as a dict."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,163 @@
+"""Vertex buffer helpers for drawing whole layers with one GL call.
+
+Each :class:`BufferLayer` owns a vertex buffer and optional color and index
+buffers. A layer is uploaded from NumPy arrays and drawn with a single
+``glDrawArrays`` or ``glDrawElements`` call, replacing per-vertex
+``glVertex3f`` submission.
+"""
+
+import functools
+import math
+
+import numpy as np
+from OpenGL.GL import *
+
+
+def strip_indices(line_count, points_per_line):
+    """Return ``GL_LINES`` indices joining consecutive points of each line.
+
+    Vertices are expected as ``line_count`` runs of ``points_per_line``
+    points, the layout produced by reshaping an ``(L, S, 3)`` array.
+    """
+    base = np.arange(line_count, dtype=np.uint32)[:, None] * points_per_line
+    k = np.arange(points_per_line - 1, dtype=np.uint32)
+    pairs = np.stack([k, k + 1], axis=1).reshape(-1)
+    return (base + pairs[None, :]).reshape(-1)
+
+
+@functools.lru_cache(maxsize=None)
+def sphere_mesh(slices=16, stacks=16):
+    """Return ``(vertices, indices)`` of a unit sphere as ``GL_TRIANGLES``.
+
+    Matches the latitude/longitude tessellation previously drawn with
+    ``GL_QUAD_STRIP``. The arrays are cached and must not be modified.
+    """
+    lat = math.pi * (-0.5 + np.arange(stacks + 1) / stacks)
+    lng = 2 * math.pi * np.arange(slices + 1) / slices
+    z = np.sin(lat)[:, None]
+    zr = np.cos(lat)[:, None]
+    vertices = np.stack(
+        np.broadcast_arrays(np.cos(lng)[None, :] * zr, np.sin(lng)[None, :] * zr, z),
+        axis=-1,
+    ).reshape(-1, 3)
+    row = slices + 1
+    i, j = np.meshgrid(np.arange(stacks), np.arange(slices), indexing="ij")
+    a = i * row + j
+    b = a + row
+    quads = np.stack([a, b, a + 1, a + 1, b, b + 1], axis=-1)
+    vertices.flags.writeable = False
+    indices = quads.reshape(-1).astype(np.uint32)
+    indices.flags.writeable = False
+    return vertices, indices
+
+
+def sphere_batch(positions, radii, colors, slices=16, stacks=16):
+    """Build one vertex/color/index set containing a sphere per object."""
+    unit, unit_indices = sphere_mesh(slices, stacks)
+    count = len(positions)
+    vertices = unit[None, :, :] * np.asarray(radii, dtype=float)[:, None, None]
+    vertices = vertices + np.asarray(positions, dtype=float)[:, None, :]
+    vertex_colors = np.repeat(np.asarray(colors, dtype=np.float32), len(unit), axis=0)
+    offsets = np.arange(count, dtype=np.uint32)[:, None] * len(unit)
+    indices = (unit_indices[None, :] + offsets).reshape(-1)
+    return vertices.reshape(-1, 3), vertex_colors, indices
+
+
+class BufferLayer:
+    """GPU buffers holding one layer of geometry."""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.vertex_buffer = None
+        self.color_buffer = None
+        self.texcoord_buffer = None
+        self.index_buffer = None
+        self.vertex_count = 0
+        self.index_count = 0
+        self.has_colors = False
+        self.has_texcoords = False
+        self.indexed = False
+
+    def _upload(self, buffer, target, data):
+        if buffer is None:
+            buffer = glGenBuffers(1)
+        glBindBuffer(target, buffer)
+        glBufferData(target, data.nbytes, data, GL_DYNAMIC_DRAW)
+        glBindBuffer(target, 0)
+        return buffer
+
+    def upload(self, vertices, indices=None, colors=None, texcoords=None):
+        """Replace the layer contents.
+
+        ``vertices`` is an ``(N, 3)`` array, ``indices`` an optional flat
+        index array, ``colors`` optional ``(N, 4)`` RGBA per vertex and
+        ``texcoords`` optional ``(N, 3)`` texture coordinates (extra
+        per-vertex data for shaders).
+        """
+        vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, 3)
+        self.vertex_buffer = self._upload(self.vertex_buffer, GL_ARRAY_BUFFER, vertices)
+        self.vertex_count = len(vertices)
+        self.has_colors = colors is not None
+        if colors is not None:
+            colors = np.ascontiguousarray(colors, dtype=np.float32).reshape(-1, 4)
+            self.color_buffer = self._upload(self.color_buffer, GL_ARRAY_BUFFER, colors)
+        self.has_texcoords = texcoords is not None
+        if texcoords is not None:
+            texcoords = np.ascontiguousarray(texcoords, dtype=np.float32).reshape(-1, 3)
+            self.texcoord_buffer = self._upload(
+                self.texcoord_buffer, GL_ARRAY_BUFFER, texcoords
+            )
+        self.index_count = 0
+        if indices is not None:
+            indices = np.ascontiguousarray(indices, dtype=np.uint32)
+            self.index_buffer = self._upload(
+                self.index_buffer, GL_ELEMENT_ARRAY_BUFFER, indices
+            )
+            self.index_count = len(indices)
+        self.indexed = indices is not None
+
+    def draw(self):
+        """Draw the layer with the current color unless it has its own."""
+        count = self.index_count if self.indexed else self.vertex_count
+        if self.vertex_buffer is None or not count:
+            return
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffer)
+        glVertexPointer(3, GL_FLOAT, 0, None)
+        if self.has_colors:
+            glEnableClientState(GL_COLOR_ARRAY)
+            glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+            glColorPointer(4, GL_FLOAT, 0, None)
+        if self.has_texcoords:
+            glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+            glBindBuffer(GL_ARRAY_BUFFER, self.texcoord_buffer)
+            glTexCoordPointer(3, GL_FLOAT, 0, None)
+        if self.indexed:
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_buffer)
+            glDrawElements(self.mode, count, GL_UNSIGNED_INT, None)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        else:
+            glDrawArrays(self.mode, 0, count)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        if self.has_colors:
+            glDisableClientState(GL_COLOR_ARRAY)
+        if self.has_texcoords:
+            glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+    def delete(self):
+        """Release the GL buffers; requires the owning context be current."""
+        buffers = [
+            b
+            for b in (
+                self.vertex_buffer,
+                self.color_buffer,
+                self.texcoord_buffer,
+                self.index_buffer,
+            )
+            if b is not None
+        ]
+        if buffers:
+            glDeleteBuffers(len(buffers), buffers)
+        self.vertex_buffer = self.color_buffer = self.index_buffer = None
+        self.texcoord_buffer = None
@@ -0,0 +1,340 @@
+"""Grid displacement in a GLSL vertex shader.
+
+The untranslated grid lattice is uploaded once as a static vertex buffer.
+Object positions and masses go into a float texture that is only
+re-uploaded when objects change. A vertex shader wraps each vertex by the
+grid translation, sums the pull of every object and clamps the result to
+the unit box. Drawing a frame then costs the CPU a few uniform updates, no
+matter how many vertices the grid has.
+
+Only a whitelisted subset of formula syntax is translated to GLSL by
+:func:`formula_to_glsl`: arithmetic, ``r``, ``m``, numeric constants and
+the common ``math`` functions. Layers whose formulas use anything else
+(conditionals, comparisons, ...) stay on the CPU path. The shader works in
+single precision, so vertices can differ from the CPU path by float32
+rounding.
+"""
+
+import ast
+import math
+import sys
+
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.GL import shaders
+
+from formula_compiler import FormulaError, compile_formula
+
+# Integer powers up to this exponent are expanded into multiplications,
+# which unlike GLSL's pow() are defined for negative bases
+MAX_EXPANDED_POWER = 4
+
+# GLSL spellings of the supported ``math`` functions
+_MATH_FUNCTIONS = {
+    "sqrt": lambda x: f"sqrt({x})",
+    "exp": lambda x: f"exp({x})",
+    "expm1": lambda x: f"(exp({x}) - 1.0)",
+    "log": lambda x, base=None: f"log({x})" if base is None else f"(log({x}) / log({base}))",
+    "log1p": lambda x: f"log(1.0 + {x})",
+    "log2": lambda x: f"log2({x})",
+    "log10": lambda x: f"(log({x}) * {_literal(1 / math.log(10))})",
+    "fabs": lambda x: f"abs({x})",
+    "hypot": lambda x, y: f"length(vec2({x}, {y}))",
+    "floor": lambda x: f"floor({x})",
+    "ceil": lambda x: f"ceil({x})",
+    "trunc": lambda x: f"trunc({x})",
+    "sin": lambda x: f"sin({x})",
+    "cos": lambda x: f"cos({x})",
+    "tan": lambda x: f"tan({x})",
+    "asin": lambda x: f"asin({x})",
+    "acos": lambda x: f"acos({x})",
+    "atan": lambda x: f"atan({x})",
+    "atan2": lambda y, x: f"atan({y}, {x})",
+    "sinh": lambda x: f"sinh({x})",
+    "cosh": lambda x: f"cosh({x})",
+    "tanh": lambda x: f"tanh({x})",
+    "asinh": lambda x: f"asinh({x})",
+    "acosh": lambda x: f"acosh({x})",
+    "atanh": lambda x: f"atanh({x})",
+    "degrees": lambda x: f"degrees({x})",
+    "radians": lambda x: f"radians({x})",
+}
+
+_MATH_CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau}
+
+_OPERATORS = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/"}
+
+_VERTEX_SHADER = """
+#version 130
+
+uniform sampler1D objects;  // xyz position, w mass
+uniform int object_count;
+uniform vec3 translation;
+
+{functions}
+
+void main() {{
+    // Texture coordinates flag the coordinates that follow the translation
+    vec3 vertex = mix(gl_Vertex.xyz, mod(gl_Vertex.xyz + translation, 1.0),
+                      gl_MultiTexCoord0.xyz);
+    vec3 result = vertex;
+    for (int i = 0; i < object_count; ++i) {{
+        vec4 object = texelFetch(objects, i, 0);
+        vec3 delta = vertex - object.xyz;
+        float r = length(delta);
+        if (r == 0.0) {{
+            continue;
+        }}
+        float total = 0.0;
+        float value;
+{terms}
+        result -= (total / r) * delta;
+    }}
+    gl_Position = gl_ModelViewProjectionMatrix * vec4(clamp(result, 0.0, 1.0), 1.0);
+    gl_FrontColor = gl_Color;
+}}
+"""
+
+_FRAGMENT_SHADER = """
+#version 130
+
+void main() {
+    gl_FragColor = gl_Color;
+}
+"""
+
+
+def _literal(value):
+    """Return ``value`` as a GLSL float literal."""
+    if isinstance(value, complex) or not math.isfinite(value):
+        raise FormulaError(f"constant {value!r} has no GLSL equivalent")
+    text = repr(float(value))
+    return f"({text})" if value < 0 else text
+
+
+def _integer(node):
+    """Return the value of an integer-valued constant node, or None."""
+    sign = 1
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        sign = -1 if isinstance(node.op, ast.USub) else 1
+        node = node.operand
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        if float(node.value).is_integer():
+            return sign * int(node.value)
+    return None
+
+
+class _Translator:
+    """Emit GLSL for the whitelisted subset of a validated formula tree."""
+
+    def __init__(self, formula, constants):
+        self.formula = formula
+        self.constants = constants
+
+    def reject(self, node):
+        raise FormulaError(
+            f"{type(node).__name__} in {self.formula!r} is not supported on the GPU"
+        )
+
+    def emit(self, node):
+        if isinstance(node, ast.Expression):
+            return self.emit(node.body)
+        if isinstance(node, ast.Constant):
+            return _literal(node.value)
+        if isinstance(node, ast.Name):
+            if node.id in ("r", "m"):
+                return node.id
+            if node.id in self.constants:
+                return _literal(self.constants[node.id])
+            self.reject(node)
+        if isinstance(node, ast.Attribute):
+            if node.attr in _MATH_CONSTANTS:
+                return _literal(_MATH_CONSTANTS[node.attr])
+            self.reject(node)
+        if isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, ast.USub):
+                return f"(-{self.emit(node.operand)})"
+            if isinstance(node.op, ast.UAdd):
+                return self.emit(node.operand)
+            self.reject(node)
+        if isinstance(node, ast.BinOp):
+            left, right = self.emit(node.left), self.emit(node.right)
+            if type(node.op) in _OPERATORS:
+                return f"({left} {_OPERATORS[type(node.op)]} {right})"
+            if isinstance(node.op, ast.Pow):
+                return self.power(left, node.right, right)
+            if isinstance(node.op, ast.Mod):
+                # GLSL mod() takes the sign of the divisor, like Python's %
+                return f"mod({left}, {right})"
+            if isinstance(node.op, ast.FloorDiv):
+                return f"floor({left} / {right})"
+            self.reject(node)
+        if isinstance(node, ast.Call):
+            return self.call(node)
+        self.reject(node)
+
+    def power(self, base, exponent_node, exponent):
+        n = _integer(exponent_node)
+        if n is None or abs(n) > MAX_EXPANDED_POWER:
+            return f"pow({base}, {exponent})"
+        if n == 0:
+            return "1.0"
+        product = " * ".join([base] * abs(n))
+        return f"({product})" if n > 0 else f"(1.0 / ({product}))"
+
+    def call(self, node):
+        args = [self.emit(arg) for arg in node.args]
+        func = node.func
+        if isinstance(func, ast.Attribute) and func.attr in _MATH_FUNCTIONS:
+            emit = _MATH_FUNCTIONS[func.attr]
+        elif getattr(func, "attr", getattr(func, "id", None)) == "pow":
+            if len(args) != 2:
+                self.reject(node)
+            return self.power(args[0], node.args[1], args[1])
+        elif isinstance(func, ast.Name) and func.id == "abs":
+            emit = lambda x: f"abs({x})"
+        elif isinstance(func, ast.Name) and func.id in ("min", "max") and len(args) >= 2:
+            name = func.id
+            result = args[0]
+            for arg in args[1:]:
+                result = f"{name}({result}, {arg})"
+            return result
+        else:
+            self.reject(node)
+        try:
+            return emit(*args)
+        except TypeError:
+            self.reject(node)
+
+
+def formula_to_glsl(formula, constants=None):
+    """Translate a force formula into a GLSL float expression in ``r`` and ``m``.
+
+    User constants are inlined as literals. Raises :class:`FormulaError`
+    for invalid formulas and for syntax outside the GPU whitelist.
+    """
+    constants = dict(constants or {})
+    compile_formula(formula, constants)
+    tree = ast.parse(formula.strip() or "0", mode="eval")
+    return _Translator(formula, constants).emit(tree)
+
+
+def shader_source(forces):
+    """Return the vertex shader summing ``forces``.
+
+    ``forces`` is a sequence of ``(expression, scaling, cutoff)`` with
+    GLSL expressions from :func:`formula_to_glsl`. Like the CPU engine,
+    pairs at or beyond ``cutoff`` and non-finite values contribute nothing.
+    """
+    functions, terms = [], []
+    for index, (expression, scaling, cutoff) in enumerate(forces):
+        functions.append(f"float force{index}(float r, float m) {{\n    return {expression};\n}}")
+        condition = "!isnan(value) && !isinf(value)"
+        if cutoff is not None:
+            condition += f" && r < {_literal(cutoff)}"
+        terms.append(
+            f"        value = force{index}(r, object.w);\n"
+            f"        if ({condition}) {{\n"
+            f"            total += value * {_literal(scaling)};\n"
+            f"        }}"
+        )
+    return _VERTEX_SHADER.format(functions="\n\n".join(functions), terms="\n".join(terms))
+
+
+class GPUDisplacement:
+    """Shader programs and object data displacing grid layers on the GPU.
+
+    Must be created and used with the drawing GL context current. Programs
+    are cached by source, so each force combination is compiled once.
+    """
+
+    def __init__(self):
+        self._programs = {}
+        # Sources that failed to compile; their layers stay on the CPU
+        self.rejected = set()
+        self.max_objects = int(glGetIntegerv(GL_MAX_TEXTURE_SIZE))
+        self.object_count = 0
+        self._objects_key = None
+        self._texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_1D, self._texture)
+        glTexParameteri(GL_TEXTURE_1D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_1D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glBindTexture(GL_TEXTURE_1D, 0)
+
+    @staticmethod
+    def supported():
+        """Return True if the current context runs GLSL 1.30 shaders."""
+        version = glGetString(GL_SHADING_LANGUAGE_VERSION)
+        if not version:
+            return False
+        try:
+            major, minor = version.decode().split()[0].split(".")[:2]
+            return (int(major), int(minor[:2])) >= (1, 30)
+        except ValueError:
+            return False
+
+    def program(self, forces):
+        """Return the linked program summing ``forces``, or None if it fails."""
+        source = shader_source(forces)
+        if source in self.rejected:
+            return None
+        entry = self._programs.get(source)
+        if entry is None:
+            try:
+                program = shaders.compileProgram(
+                    shaders.compileShader(source, GL_VERTEX_SHADER),
+                    shaders.compileShader(_FRAGMENT_SHADER, GL_FRAGMENT_SHADER),
+                )
+            except RuntimeError as exc:
+                sys.stderr.write(f"GPU displacement unavailable, using the CPU: {exc}\n")
+                self.rejected.add(source)
+                return None
+            locations = {
+                name: glGetUniformLocation(program, name)
+                for name in ("objects", "object_count", "translation")
+            }
+            entry = self._programs[source] = (program, locations)
+        return entry
+
+    def upload_objects(self, key, positions, masses):
+        """Copy object positions and masses to the GPU when ``key`` changed.
+
+        Raises ValueError for more than ``max_objects`` objects, which do
+        not fit in the object texture.
+        """
+        if key == self._objects_key:
+            return
+        if len(masses) > self.max_objects:
+            raise ValueError(
+                f"{len(masses)} objects exceed the GPU limit of {self.max_objects}"
+            )
+        data = np.empty((len(masses), 4), dtype=np.float32)
+        data[:, :3] = positions
+        data[:, 3] = masses
+        if len(data):
+            glBindTexture(GL_TEXTURE_1D, self._texture)
+            glTexImage1D(GL_TEXTURE_1D, 0, GL_RGBA32F, len(data), 0, GL_RGBA, GL_FLOAT, data)
+            glBindTexture(GL_TEXTURE_1D, 0)
+        self.object_count = len(data)
+        self._objects_key = key
+
+    def bind(self, entry, translation):
+        """Use a program from :meth:`program` for the following draw calls."""
+        program, locations = entry
+        glUseProgram(program)
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(GL_TEXTURE_1D, self._texture)
+        glUniform1i(locations["objects"], 0)
+        glUniform1i(locations["object_count"], self.object_count)
+        glUniform3f(locations["translation"], *translation)
+
+    def release(self):
+        glUseProgram(0)
+        glBindTexture(GL_TEXTURE_1D, 0)
+
+    def delete(self):
+        """Free programs and the object texture; requires the context current."""
+        for program, _ in self._programs.values():
+            glDeleteProgram(program)
+        self._programs = {}
+        glDeleteTextures([self._texture])
@@ -22,17 +22,61 @@ from PyQt5.QtWidgets import (
     QDialog,
     QFormLayout,
     QDoubleSpinBox,
+    QSpinBox,
     QCheckBox,
+    QMessageBox,
+    QFileDialog,
 )
 
-from PyQt5.QtCore import Qt, QTimer
-from PyQt5.QtGui import QVector3D
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QColor, QFont, QFontMetrics, QImage, QPainter, QVector3D
 from OpenGL.GL import *
 from OpenGL.GLU import *
+from object_store import ObjectStore
 from space_object import SpaceObject
-import math
+from adaptive_lines import subdivide_lines
+from catalog import CHUNK_SIZE, CatalogError, read_catalog
+from cell_list import CellList, cells_for
+from displacement import Force, displace_layers, line_vertices
+from displacement_field import DisplacementField, interpolation_error
+from force_table import TABLE_SIZE, ForceTable
+from formula_compiler import FormulaError, compile_formula
+from geometry_cache import GeometryCache
+from gl_buffers import BufferLayer, sphere_batch, strip_indices
+from gpu_displacement import GPUDisplacement, formula_to_glsl, shader_source
+from nbody import NBodySystem
+from octree import Octree
+from parallel_geometry import GeometryPool
+from profiler import FrameProfiler, ProfiledFormula
+from shared_lattice import (
+    crossing_segments,
+    lattice_crossings,
+    lattice_lines,
+    lattice_samples,
+    plane_crossings,
+)
+from sphere_instances import SphereInstances
+from simulation_worker import PreparedBuild, SimulationWorker
+import functools
+import os
+import threading
+import time
+import numpy as np
 from PyQt5.QtCore import pyqtSignal
 
+# Seconds between refreshes of the frame-stats overlay text
+HUD_REFRESH_SECONDS = 0.25
+# Objects summed exactly when no Barnes–Hut theta is set; beyond this the
+# exact sums over every vertex/object pair get too slow to draw
+EXACT_OBJECT_LIMIT = 5000
+# Opening angle used once there are more objects than the exact limit
+AUTO_THETA = 0.5
+# Bodies summed exactly by N-body motion when no theta is set; every body
+# pulls every other one, so the tree pays off far earlier than for the grid
+NBODY_EXACT_LIMIT = 500
+# Heaviest objects seeding the closest-approach vertices of adaptive lines
+MAX_LINE_SEEDS = 1024
+
 class GridVisualizer(QOpenGLWidget):
     object_selected = pyqtSignal(int)
 
@@ -46,7 +90,8 @@ class GridVisualizer(QOpenGLWidget):
         self.zoom = -1.5
         self.offset = QVector3D(-0.5, -0.5, -0.5)
         self.dimension = 3
-        self.objects = []
+        # Objects in packed arrays; iterating yields SpaceObject views
+        self.objects = ObjectStore()
         # Translation applied to grid to simulate object velocity
         self.grid_translation = QVector3D(0.0, 0.0, 0.0)
         # Default formulas for the four fundamental forces. "r" represents the
@@ -61,6 +106,10 @@ class GridVisualizer(QOpenGLWidget):
         self.force_scaling = {"gravity": 0.05}
         # Constants accessible from formulas
         self.constants = {"G": 1.0}
+        # Compiled formulas keyed by source text, valid for the constants
+        # snapshot they were compiled against.
+        self._formula_cache = {}
+        self._formula_cache_constants = None
 
         self.show_forces = {
             "gravity": True,
@@ -80,7 +129,69 @@ class GridVisualizer(QOpenGLWidget):
         # grid is highly subdivided.
         self.line_segments = 20
         self._update_line_segments()
-
+        # Lines are refined only where their displaced shape strays from a
+        # straight chord by more than line_tolerance (in unit-box lengths),
+        # up to line_vertex_budget vertices per line. A tolerance of 0
+        # samples every line uniformly with line_segments segments.
+        self.line_tolerance = 1e-3
+        self.line_vertex_budget = 256
+
+        # Lattice resolution of the interpolated displacement field; None
+        # evaluates forces exactly at every vertex
+        self.field_resolution = None
+        self._fields = {}
+
+        # Barnes–Hut opening angle; None sums every object exactly, up to
+        # exact_object_limit objects (None for no limit) beyond which
+        # AUTO_THETA is used
+        self.barnes_hut_theta = None
+        self.exact_object_limit = EXACT_OBJECT_LIMIT
+        self._octree = None
+        # Optional per-force cutoff radii served by a cell list
+        self.force_cutoffs = {}
+        self._cell_list = None
+        # (size, log_spaced) of the interpolation tables standing in for
+        # formulas linear in mass; None evaluates every formula exactly
+        self.force_table = None
+        self._force_tables = {}
+
+        # Vertex buffers for each drawn layer, created on first use, and the
+        # inputs each was last built from
+        self._layers = {}
+        self.geometry_cache = GeometryCache()
+        # Key each layer was last built from, and layers built ahead by a
+        # fused pass over their lattice (see _prepare_fused_layer)
+        self._built_layer_keys = {}
+        self._fused_layers = {}
+        # Instanced sphere renderer, created with the context; False when
+        # instancing is unavailable and spheres are batched instead
+        self._sphere_instances = None
+
+        # Objects attract each other and move when enabled (set_nbody)
+        self.nbody = False
+        self.nbody_softening = 0.01
+        self._nbody = None
+        self._nbody_snapshot = None
+
+        # Displace grid layers in a vertex shader (set_gpu_displacement);
+        # layers whose formulas cannot be translated stay on the CPU
+        self.gpu_displacement = False
+        self._gpu = None
+        self._glsl_formulas = {}
+
+        # Threads building grid lines; 1 builds on the calling thread
+        self.geometry_workers = 1
+        self._geometry_pool = None
+
+        # Layers published by a SimulationWorker; None builds them in paintGL
+        self.frame_buffers = None
+        # Held while simulation state is stepped, read or edited across threads
+        self.state_lock = threading.RLock()
+
+        # Per-frame stage timings; disabled until set_profiling is called
+        self.profiler = FrameProfiler()
+        self.show_profiler_hud = False
+        self._hud_image = None
 
     def _update_line_segments(self):
         """Scale line segments with density to keep grid curves smooth."""
@@ -90,6 +201,12 @@ class GridVisualizer(QOpenGLWidget):
 
 
     def initializeGL(self):
+        # Buffers from a previous context are gone; rebuild every layer
+        self._layers = {}
+        self._gpu = None
+        self._sphere_instances = None
+        self.geometry_cache.invalidate()
+        self._built_layer_keys = {}
         glClearColor(0, 0, 0, 1)
         glEnable(GL_DEPTH_TEST)
         glEnable(GL_BLEND)
@@ -107,6 +224,7 @@ class GridVisualizer(QOpenGLWidget):
         gluPerspective(45, aspect, 0.01, 1000.0)
 
     def paintGL(self):
+        self.profiler.begin_frame()
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         glMatrixMode(GL_MODELVIEW)
         glLoadIdentity()
@@ -115,94 +233,84 @@ class GridVisualizer(QOpenGLWidget):
         glRotatef(self.rotation.y(), 0, 1, 0)
         glTranslatef(self.offset.x(), self.offset.y(), self.offset.z())
 
-        if self.grid_density >= 2:
-
-            for name, visible in self.show_forces.items():
-                if visible:
-                    self._draw_grid_for_force(name)
-
-            step = 1.0 / (self.grid_density - 1)
-            glColor4f(1, 1, 1, self.grid_opacity)
-            ox = self.grid_translation.x()
-            oy = self.grid_translation.y()
-            oz = self.grid_translation.z()
-
-            if self.dimension == 1:  # 1D: single line
-                self._draw_bounding_line()
-                for i in range(self.grid_density):
-                    x = (i * step + ox) % 1.0
-                    if i in (0, self.grid_density - 1):
-                        continue
-                    self._draw_displaced_line(
-                        QVector3D(x, 0.49, 0.5),
-                        QVector3D(x, 0.51, 0.5),
-                    )
+        self._draw_gpu_layers()
+        if self.frame_buffers is None:
+            for name, mode, key, build in self._layer_specs():
+                glColor4f(*self._layer_color(name))
+                self._draw_layer(name, mode, key, build)
+        else:
+            self._draw_published_layers()
 
-            elif self.dimension == 2:  # 2D: grid on XY plane
-                self._draw_bounding_square()
-                for i in range(self.grid_density):
-                    x = (i * step + ox) % 1.0
-                    if i not in (0, self.grid_density - 1):
-                        self._draw_displaced_line(
-                            QVector3D(x, 0, 0.5),
-                            QVector3D(x, 1, 0.5),
-                        )
-                    y = (i * step + oy) % 1.0
-                    if i not in (0, self.grid_density - 1):
-                        self._draw_displaced_line(
-                            QVector3D(0, y, 0.5),
-                            QVector3D(1, y, 0.5),
-                        )
+        self._draw_spheres(self.objects)
 
-            else:  # 3D: cube
-                self._draw_bounding_box()
-                for iy in range(self.grid_density):
-                    y = (iy * step + oy) % 1.0
-                    for iz in range(self.grid_density):
-                        z = (iz * step + oz) % 1.0
-                        if iy in (0, self.grid_density - 1) and iz in (
-                            0,
-                            self.grid_density - 1,
-                        ):
-                            continue
-                        self._draw_displaced_line(
-                            QVector3D(0, y, z), QVector3D(1, y, z)
-                        )
-                for ix in range(self.grid_density):
-                    x = (ix * step + ox) % 1.0
-                    for iz in range(self.grid_density):
-                        z = (iz * step + oz) % 1.0
-                        if ix in (0, self.grid_density - 1) and iz in (
-                            0,
-                            self.grid_density - 1,
-                        ):
-                            continue
-                        self._draw_displaced_line(
-                            QVector3D(x, 0, z), QVector3D(x, 1, z)
-                        )
-                for ix in range(self.grid_density):
-                    x = (ix * step + ox) % 1.0
-                    for iy in range(self.grid_density):
-                        y = (iy * step + oy) % 1.0
-                        if ix in (0, self.grid_density - 1) and iy in (
-                            0,
-                            self.grid_density - 1,
-                        ):
-                            continue
-                        self._draw_displaced_line(
-                            QVector3D(x, y, 0), QVector3D(x, y, 1)
-                        )
+        if self.show_profiler_hud and self.profiler.enabled:
+            with self.profiler.stage("hud"):
+                self._draw_hud()
+        self.profiler.end_frame()
 
+    def set_profiling(self, enabled, hud=None):
+        """Turn frame profiling on or off.
+
+        ``hud`` shows or hides the frame-time overlay; it is left unchanged
+        when ``None``. Recorded frames are discarded when profiling is
+        switched on.
+        """
+        if enabled and not self.profiler.enabled:
+            self.profiler.reset()
+            self._hud_image = None
+        self.profiler.enabled = enabled
+        if hud is not None:
+            self.show_profiler_hud = hud
+        self.update()
 
+    def profiling_stats(self):
+        """Return rolling frame statistics, see :meth:`FrameProfiler.stats`."""
+        return self.profiler.stats()
 
-        for obj in self.objects:
-            self.draw_sphere(obj.position, obj.radius, obj.color)
+    def _draw_hud(self):
+        """Overlay the profiler summary in the top-left corner.
+
+        The text is rasterized with QPainter into an image, refreshed a few
+        times per second, and copied with ``glDrawPixels`` so it works in any
+        GL context, including headless EGL rendering.
+        """
+        now = time.perf_counter()
+        if self._hud_image is None or now - self._hud_image[0] > HUD_REFRESH_SECONDS:
+            self._hud_image = (now, *self._render_hud_text(self.profiler.summary_lines()))
+        _, width, height, pixels = self._hud_image
+        viewport = glGetIntegerv(GL_VIEWPORT)
+        glDisable(GL_DEPTH_TEST)
+        glWindowPos2i(int(viewport[0]), int(viewport[1] + viewport[3] - height))
+        glDrawPixels(width, height, GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+        glEnable(GL_DEPTH_TEST)
+
+    def _render_hud_text(self, lines):
+        """Return ``(width, height, pixels)`` of ``lines`` as bottom-up RGBA."""
+        font = QFont("Monospace", 9)
+        font.setStyleHint(QFont.TypeWriter)
+        metrics = QFontMetrics(font)
+        line_height = metrics.height()
+        width = max(metrics.horizontalAdvance(line) for line in lines) + 12
+        image = QImage(width, line_height * len(lines) + 8, QImage.Format_RGBA8888)
+        image.fill(QColor(0, 0, 0, 160))
+        painter = QPainter(image)
+        painter.setFont(font)
+        painter.setPen(QColor(255, 255, 80))
+        for row, line in enumerate(lines):
+            painter.drawText(6, 4 + line_height * row + metrics.ascent(), line)
+        painter.end()
+        height = image.height()
+        pixels = np.frombuffer(image.constBits().asstring(image.sizeInBytes()), np.uint8)
+        pixels = np.ascontiguousarray(
+            pixels.reshape(height, image.bytesPerLine())[::-1, : width * 4]
+        )
+        return width, height, pixels
 
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
-            selected_index = self.select_object(event.x(), event.y())
-            if selected_index is not None:
-                self.object_selected.emit(selected_index)
+            selected_id = self.select_object(event.x(), event.y())
+            if selected_id is not None:
+                self.object_selected.emit(selected_id)
             self.lastPos = event.pos()
         super().mousePressEvent(event)
 
@@ -231,8 +339,9 @@ class GridVisualizer(QOpenGLWidget):
         self.update()
 
     def set_grid_density(self, density):
-        self.grid_density = max(0, min(50, density))  # Allow 0 to hide grid
-        self._update_line_segments()
+        with self.state_lock:
+            self.grid_density = max(0, min(50, density))  # Allow 0 to hide grid
+            self._update_line_segments()
         self.update()
 
     def set_dimension(self, dim):
@@ -249,24 +358,462 @@ class GridVisualizer(QOpenGLWidget):
         self.update()
 
     def update_force_formulas(self, formulas):
-        """Update force formulas from the settings panel."""
-        self.force_formulas.update(formulas)
+        """Update force formulas from the settings panel.
+
+        Every formula is validated and compiled before any is applied, so a
+        bad entry raises :class:`FormulaError` and leaves the current set
+        untouched.
+        """
+        for name, formula in formulas.items():
+            try:
+                self._compiled_formula(formula)
+            except FormulaError as exc:
+                raise FormulaError(f"{name}: {exc}") from None
+        with self.state_lock:
+            self.force_formulas.update(formulas)
+            active = set(self.force_formulas.values())
+            for formula in list(self._formula_cache):
+                if formula not in active:
+                    del self._formula_cache[formula]
+        self.update()
+
+    def set_constants(self, constants):
+        """Update the constants available to formulas."""
+        with self.state_lock:
+            self.constants.update(constants)
         self.update()
 
+    def _compiled_formula(self, formula):
+        """Return the cached compiled form of ``formula``.
+
+        The cache is dropped whenever ``constants`` differs from the values
+        it was compiled against.
+        """
+        if self.constants != self._formula_cache_constants:
+            self._formula_cache = {}
+            self._formula_cache_constants = dict(self.constants)
+        compiled = self._formula_cache.get(formula)
+        if compiled is None:
+            compiled = compile_formula(formula, self.constants)
+            self._formula_cache[formula] = compiled
+        return compiled
+
     def _evaluate_formula(self, formula, r, m):
-        """Safely evaluate a force formula."""
+        """Safely evaluate a force formula.
+
+        ``r`` and ``m`` may be scalars or NumPy arrays. Invalid formulas
+        evaluate to 0.
+        """
         try:
-            return eval(
-                formula,
-                {
-                    "r": r,
-                    "m": m,
-                    "math": math,
-                    **self.constants,
-                },
-            )
-        except Exception:
+            evaluate = self._compiled_formula(formula)
+        except FormulaError:
             return 0
+        return evaluate(r, m)
+
+    def _force_evaluator(self, force_name):
+        """Return the compiled ``evaluate(r, m)`` callable for a force.
+
+        A formula that fails to compile is reported once and then treated
+        as zero until it is replaced.
+        """
+        formula = self.force_formulas.get(force_name, "0")
+        try:
+            return self._compiled_formula(formula)
+        except FormulaError as exc:
+            sys.stderr.write(f"Ignoring {force_name} formula: {exc}\n")
+            self._formula_cache[formula] = compile_formula("0")
+            return self._formula_cache[formula]
+
+    def _object_arrays(self):
+        """Return copies of object positions ``(M, 3)`` and masses ``(M,)``."""
+        return self.objects.positions.copy(), self.objects.masses.copy()
+
+    def _displace(self, vertices, force_names=None, exact=False):
+        """Displace an ``(N, 3)`` vertex array by the named forces.
+
+        All forces in ``force_formulas`` are applied when ``force_names`` is
+        ``None``. The result is clamped to the unit box. When
+        ``field_resolution`` is set the displacement is interpolated from a
+        cached :class:`DisplacementField` unless ``exact`` is True.
+        """
+        with self.profiler.stage("displacement"):
+            return self._displacer(force_names, exact)(vertices)
+
+    def _displacer(self, force_names=None, exact=False):
+        """Return a callable displacing ``(N, 3)`` arrays like :meth:`_displace`.
+
+        Objects, forces and acceleration structures are captured once, so
+        the callable can be shared by several geometry threads.
+        """
+        if force_names is None:
+            force_names = list(self.force_formulas)
+        if self.field_resolution and not exact:
+            return self._displacement_field(force_names).sample
+        displace = self._layers_displacer([force_names], exact)
+        return lambda vertices: displace(vertices)[0]
+
+    def _layers_displacer(self, force_sets, exact=False):
+        """Return a callable displacing ``(N, 3)`` arrays once per force set.
+
+        The callable returns an ``(L, N, 3)`` array, one layer per list of
+        force names in ``force_sets``. Exact displacement computes all
+        layers in one fused :func:`displace_layers` pass; interpolated
+        fields are sampled once per layer.
+        """
+        return self._prepare_displacer(force_sets, exact)()
+
+    def _prepare_displacer(self, force_sets, exact=False):
+        """Snapshot the inputs of :meth:`_layers_displacer`.
+
+        Returns a callable creating the displacer from the snapshot alone,
+        so it can run without ``state_lock`` while objects and settings
+        change. Interpolated fields are built or updated by that call. The
+        displacer also takes a list of positions in ``force_sets`` to
+        compute only those layers.
+        """
+        every = range(len(force_sets))
+        if self.field_resolution and not exact:
+            fields = [self._prepare_field(names) for names in force_sets]
+
+            def displacer():
+                samplers = [build().sample for build in fields]
+                return lambda vertices, which=every: np.stack(
+                    [samplers[layer](vertices) for layer in which]
+                )
+
+            return displacer
+        names = list(dict.fromkeys(name for names in force_sets for name in names))
+        forces = self._forces(names)
+        layers = [[names.index(name) for name in force_names] for force_names in force_sets]
+        positions, masses = self._object_arrays()
+        options = self._engine_options(forces)
+        self.profiler.count("objects_visited", len(self.objects))
+        displace = lambda vertices, which=every: displace_layers(
+            vertices, positions, masses, forces, [layers[layer] for layer in which], **options
+        )
+        return lambda: displace
+
+    def _displaced_lines(self, starts, ends, force_sets):
+        """Return ``(vertices, indices)`` of displaced line strips.
+
+        ``vertices`` holds one ``(N, 3)`` layer per list of force names in
+        ``force_sets``; all layers share their sample points and indices.
+        Lines are subdivided adaptively when ``line_tolerance`` is set and
+        sampled with ``line_segments`` segments otherwise. Either way they
+        are displaced on the geometry thread pool when ``geometry_workers``
+        is above one.
+        """
+        return self._prepare_lines(starts, ends, force_sets)()
+
+    def _prepare_lines(self, starts, ends, force_sets):
+        """Snapshot the inputs of :meth:`_displaced_lines`.
+
+        Returns a callable building the lines from the snapshot alone (see
+        :meth:`_prepare_displacer`).
+        """
+        layers = len(force_sets)
+        pool = self._geometry_pool
+        with self.profiler.stage("displacement"):
+            displacer = self._prepare_displacer(force_sets)
+        if self.line_tolerance:
+            tolerance, budget = self.line_tolerance, self.line_vertex_budget
+            seeds = self._line_seeds()
+
+            def build():
+                with self.profiler.stage("displacement"):
+                    displace = displacer()
+                    if pool is not None:
+                        displace = lambda points, fused=displace: pool.displace(
+                            points, fused, layers
+                        )
+                    return subdivide_lines(
+                        starts, ends, displace, tolerance, budget, seeds=seeds
+                    )
+
+            return build
+        segments = self.line_segments
+
+        def build():
+            indices = strip_indices(len(starts), segments + 1)
+            lines = None
+            if pool is None:
+                lines = line_vertices(starts, ends, segments).reshape(-1, 3)
+            with self.profiler.stage("displacement"):
+                displace = displacer()
+                if lines is not None:
+                    return displace(lines), indices
+                vertices = pool.build_lines(starts, ends, segments, displace, layers=layers)
+            return vertices, indices
+
+        return build
+
+    def _line_seeds(self):
+        """Return the positions seeding closest-approach vertices of lines.
+
+        Only the :data:`MAX_LINE_SEEDS` heaviest objects seed lines, so
+        large catalogs do not measure every line against every object.
+        """
+        positions, masses = self.objects.positions, np.abs(self.objects.masses)
+        if len(masses) > MAX_LINE_SEEDS:
+            heaviest = np.argpartition(masses, -MAX_LINE_SEEDS)[-MAX_LINE_SEEDS:]
+            return positions[np.sort(heaviest)]
+        return positions.copy()
+
+    def set_line_tolerance(self, tolerance, budget=None):
+        """Refine grid lines until they deviate less than ``tolerance``.
+
+        ``budget`` caps the vertices of each line. A tolerance of 0 draws
+        every line with ``line_segments`` uniform segments.
+        """
+        with self.state_lock:
+            self.line_tolerance = max(0.0, tolerance)
+            if budget is not None:
+                self.line_vertex_budget = max(2, int(budget))
+        self.update()
+
+    def set_geometry_workers(self, workers):
+        """Build grid lines on ``workers`` threads; 1 builds them serially."""
+        workers = max(1, int(workers))
+        if workers == self.geometry_workers:
+            return
+        with self.state_lock:
+            # A build in progress may still hold the old pool; its threads
+            # exit once the pool is garbage collected
+            self.geometry_workers = workers
+            self._geometry_pool = GeometryPool(workers) if workers > 1 else None
+
+    def _forces(self, force_names):
+        """Return a :class:`Force` per name for the displacement engine."""
+        forces = [
+            Force(
+                self._force_profile(name),
+                self.force_scaling.get(name, 0.0),
+                self.force_cutoffs.get(name),
+            )
+            for name in force_names
+        ]
+        if self.profiler.enabled:
+            forces = [
+                force._replace(evaluate=ProfiledFormula(force.evaluate, self.profiler))
+                for force in forces
+            ]
+        return forces
+
+    def _force_profile(self, force_name):
+        """Return the evaluator of a force, served from a table if enabled.
+
+        Formulas that cannot be tabulated are evaluated exactly.
+        """
+        evaluate = self._force_evaluator(force_name)
+        if self.force_table is None:
+            return evaluate
+        return self._force_table_entry(evaluate)[0] or evaluate
+
+    def _force_table_entry(self, evaluate):
+        """Return ``(table, reason)`` for a compiled formula.
+
+        ``table`` is a cached :class:`ForceTable`, or None with ``reason``
+        explaining why the formula is evaluated exactly.
+        """
+        key = (evaluate, self.force_table)
+        entry = self._force_tables.get(key)
+        if entry is None:
+            if evaluate.constant is not None:
+                entry = (None, "formula is constant")
+            else:
+                try:
+                    entry = (ForceTable(evaluate, *self.force_table), None)
+                except ValueError as exc:
+                    entry = (None, str(exc))
+            # Drop tables of formulas that are no longer compiled
+            current = set(map(id, self._formula_cache.values()))
+            self._force_tables = {
+                cached: value
+                for cached, value in self._force_tables.items()
+                if id(cached[0]) in current
+            }
+            self._force_tables[key] = entry
+        return entry
+
+    def set_force_tables(self, enabled, size=TABLE_SIZE, log_spaced=True):
+        """Interpolate force formulas from tables of ``size`` distances.
+
+        Each formula linear in mass is sampled once for unit mass, log-spaced
+        in distance unless ``log_spaced`` is False; other formulas are still
+        evaluated exactly. See :meth:`force_table_report` for the error.
+        """
+        with self.state_lock:
+            self.force_table = (int(size), bool(log_spaced)) if enabled else None
+        self.update()
+
+    def force_table_report(self):
+        """Return how each force is evaluated with the current tables.
+
+        Maps force names to ``{"tabulated", "max_error", "reason"}``:
+        ``max_error`` is the table's largest absolute and relative deviation
+        from the formula, ``reason`` why an untabulated force is exact.
+        Tables are built and cached under ``state_lock``, like builds on
+        the simulation worker.
+        """
+        report = {}
+        with self.state_lock:
+            for name in self.force_formulas:
+                if self.force_table is None:
+                    table, reason = None, "force tables are disabled"
+                else:
+                    table, reason = self._force_table_entry(self._force_evaluator(name))
+                report[name] = {
+                    "tabulated": table is not None,
+                    "max_error": None if table is None else table.max_error,
+                    "reason": reason,
+                }
+        return report
+
+    def _engine_options(self, forces):
+        """Return acceleration structures for the displacement engine.
+
+        The Barnes–Hut octree is rebuilt only when object positions or
+        masses change, and the cell list is synced incrementally with the
+        current objects. Options are omitted when not in use.
+        """
+        options = {}
+        if not self.objects:
+            return options
+        theta = self._barnes_hut_theta()
+        if theta is not None:
+            key = self._objects_key()
+            if self._octree is None or self._octree[0] != key:
+                positions, masses = self._object_arrays()
+                self._octree = (key, Octree(positions, masses))
+            options.update(tree=self._octree[1], theta=theta)
+        cutoffs = [force.cutoff for force in forces if force.cutoff is not None]
+        if cutoffs:
+            cells = cells_for(min(cutoffs))
+            if self._cell_list is None or self._cell_list.cells_per_axis != cells:
+                self._cell_list = CellList(min(cutoffs))
+            positions, _ = self._object_arrays()
+            self._cell_list.sync(self.objects.ids.tolist(), positions)
+            options["cells"] = self._cell_list
+        return options
+
+    def set_force_cutoff(self, force_name, radius):
+        """Ignore objects further than ``radius`` for one force.
+
+        Pass ``None`` to remove the cutoff.
+        """
+        with self.state_lock:
+            if radius is None:
+                self.force_cutoffs.pop(force_name, None)
+            else:
+                self.force_cutoffs[force_name] = radius
+            self._fields = {}
+        self.update()
+
+    def set_barnes_hut_theta(self, theta):
+        """Approximate distant object clusters with opening angle ``theta``.
+
+        Pass ``None`` to sum every object exactly, as long as there are no
+        more than ``exact_object_limit`` objects; beyond that
+        :data:`AUTO_THETA` is used.
+        """
+        with self.state_lock:
+            self.barnes_hut_theta = theta
+            self._fields = {}
+        self.update()
+
+    def set_exact_object_limit(self, limit):
+        """Sum up to ``limit`` objects exactly when no theta is set.
+
+        Beyond it forces are approximated with :data:`AUTO_THETA`; pass
+        ``None`` to always sum exactly.
+        """
+        with self.state_lock:
+            self.exact_object_limit = limit
+            self._fields = {}
+        self.update()
+
+    def _barnes_hut_theta(self, limit=None):
+        """Return the opening angle in effect, or None for exact sums.
+
+        ``limit`` overrides ``exact_object_limit`` unless that is None.
+        """
+        if self.barnes_hut_theta is not None:
+            return self.barnes_hut_theta
+        if self.exact_object_limit is None:
+            return None
+        if len(self.objects) > (self.exact_object_limit if limit is None else limit):
+            return AUTO_THETA
+        return None
+
+    def _displacement_field(self, force_names):
+        """Return the field for ``force_names``, updating it if stale.
+
+        While formulas and settings stay the same, object edits are applied
+        incrementally (see :meth:`DisplacementField.update`); any other
+        change rebuilds the field.
+        """
+        return self._prepare_field(force_names)()
+
+    def _prepare_field(self, force_names):
+        """Snapshot the inputs of :meth:`_displacement_field`.
+
+        Returns a callable bringing the field up to date from the snapshot
+        alone; it can run without ``state_lock``.
+        """
+        settings = (
+            self.field_resolution,
+            self._barnes_hut_theta(),
+            self._forces_key(force_names),
+            tuple(sorted(self.constants.items())),
+        )
+        objects = self._objects_key()
+        cached = self._fields.get(tuple(force_names))
+        if cached is not None and cached[0] == (settings, objects):
+            return lambda: cached[1]
+        forces = self._forces(force_names)
+        positions, masses = self._object_arrays()
+        ids = self.objects.ids.copy()
+        options = self._engine_options(forces)
+        resolution = self.field_resolution
+
+        def build():
+            if cached is not None and cached[0][0] == settings:
+                field = cached[1].update(ids, positions, masses, forces, **options)
+            else:
+                field = DisplacementField(resolution).build(
+                    positions, masses, forces, ids=ids, **options
+                )
+            # Entries are checked against their settings and objects, so one
+            # stored after those changed is rebuilt rather than reused
+            self._fields[tuple(force_names)] = ((settings, objects), field)
+            return field
+
+        return build
+
+    def set_field_resolution(self, resolution):
+        """Interpolate displacement from a ``resolution³`` lattice.
+
+        Pass ``None`` to evaluate every vertex exactly.
+        """
+        with self.state_lock:
+            self.field_resolution = resolution
+            self._fields = {}
+        self.update()
+
+    def displacement_field_error(self, force_names=None):
+        """Measure the field's error on the current grid vertices.
+
+        Returns the max and mean distance between interpolated and exactly
+        evaluated positions, or ``None`` when no field is in use.
+        """
+        if not self.field_resolution or self.grid_density < 2:
+            return None
+        if force_names is None:
+            force_names = list(self.force_formulas)
+        starts, ends = self._grid_lines()
+        points = line_vertices(starts, ends, self.line_segments).reshape(-1, 3)
+        exact = self._displace(points, force_names, exact=True)
+        return interpolation_error(self._displacement_field(force_names), exact, points)
 
     def _clamp_to_box(self, position):
         """Ensure a position stays within the unit bounding box."""
@@ -277,48 +824,21 @@ class GridVisualizer(QOpenGLWidget):
         )
 
     def _apply_force(self, position, force_name):
-        displacement = QVector3D(0, 0, 0)
-        formula = self.force_formulas.get(force_name, "0")
-        scaling = self.force_scaling.get(force_name, 0.0)
-        for obj in self.objects:
-            r_vec = QVector3D(
-                position.x() - obj.position.x(),
-                position.y() - obj.position.y(),
-                position.z() - obj.position.z(),
-            )
-
-            r = math.sqrt(r_vec.x() ** 2 + r_vec.y() ** 2 + r_vec.z() ** 2)
-            if r == 0:
-                continue
-            r_unit = QVector3D(r_vec.x() / r, r_vec.y() / r, r_vec.z() / r)
-
-            value = self._evaluate_formula(formula, r, obj.mass)
-            if value != 0 and scaling:
-                displacement -= r_unit * value * scaling
-        return self._clamp_to_box(
-            QVector3D(
-                position.x() + displacement.x(),
-                position.y() + displacement.y(),
-                position.z() + displacement.z(),
+        """Displace a single position by one force."""
+        point = self._displace(
+            [[position.x(), position.y(), position.z()]], [force_name]
+        )[0]
+        return QVector3D(*point)
+
+    def _bounding_segments(self):
+        """Return ``GL_LINES`` endpoints outlining the grid's extent."""
+        if self.dimension == 1:
+            return np.array([(0, 0.5, 0.5), (1, 0.5, 0.5)], dtype=float)
+        if self.dimension == 2:
+            corners = np.array(
+                [(0, 0, 0.5), (1, 0, 0.5), (1, 1, 0.5), (0, 1, 0.5)], dtype=float
             )
-        )
-
-    def _draw_bounding_line(self):
-        glBegin(GL_LINES)
-        glVertex3f(0, 0.5, 0.5)
-        glVertex3f(1, 0.5, 0.5)
-        glEnd()
-
-    def _draw_bounding_square(self):
-        glBegin(GL_LINE_LOOP)
-        glVertex3f(0, 0, 0.5)
-        glVertex3f(1, 0, 0.5)
-        glVertex3f(1, 1, 0.5)
-        glVertex3f(0, 1, 0.5)
-        glEnd()
-
-    def _draw_bounding_box(self):
-        glBegin(GL_LINES)
+            return np.stack([corners, np.roll(corners, -1, axis=0)], axis=1).reshape(-1, 3)
         edges = [
             (0, 0, 0, 1, 0, 0),
             (1, 0, 0, 1, 1, 0),
@@ -333,237 +853,697 @@ class GridVisualizer(QOpenGLWidget):
             (1, 1, 0, 1, 1, 1),
             (0, 1, 0, 0, 1, 1),
         ]
-        for e in edges:
-            glVertex3f(e[0], e[1], e[2])
-            glVertex3f(e[3], e[4], e[5])
-        glEnd()
+        return np.array(edges, dtype=float).reshape(-1, 3)
+
+    def _objects_key(self):
+        """Return a key that changes whenever any object changes."""
+        return self.objects.key()
+
+    def _layer_key(self, force_names):
+        """Return the key of every input that moves a grid layer's vertices."""
+        translation = (
+            self.grid_translation.x(),
+            self.grid_translation.y(),
+            self.grid_translation.z(),
+        )
+        return (
+            self.dimension,
+            self.grid_density,
+            self.line_segments,
+            self.line_tolerance,
+            self.line_vertex_budget,
+            self.field_resolution,
+            self._barnes_hut_theta(),
+            translation,
+            self._objects_key(),
+            self._forces_key(force_names),
+            tuple(sorted(self.constants.items())),
+        )
+
+    def _forces_key(self, force_names):
+        """Return the formula, scaling, cutoff and table of each named force."""
+        return tuple(
+            (
+                name,
+                self.force_formulas.get(name, "0"),
+                self.force_scaling.get(name, 0.0),
+                self.force_cutoffs.get(name),
+                self.force_table,
+            )
+            for name in force_names
+        )
+
+    def _draw_layer(self, name, mode, key, build, stages=("geometry", "draw")):
+        """Draw one named layer, rebuilding its buffers only if ``key`` changed.
+
+        ``build`` returns ``(vertices, indices, colors)`` (indices and colors
+        may be None, and texture coordinates may follow) and is only called
+        on a cache miss. ``stages`` names the
+        profiler stages charged with building and drawing the layer.
+        """
+        layer = self._layers.get(name)
+        if layer is None:
+            layer = self._layers[name] = BufferLayer(mode)
+        if not self.geometry_cache.is_current(name, key):
+            layer.mode = mode
+            with self.profiler.stage(stages[0]):
+                geometry = build()
+            with self.profiler.stage("upload"):
+                layer.upload(*geometry)
+            self.geometry_cache.store(name, key)
+        with self.profiler.stage(stages[1]):
+            layer.draw()
+        self.profiler.count("vertices", layer.vertex_count)
 
     def advance_simulation(self, dt):
         """Translate the grid opposite to object velocity.
 
         The translation is wrapped so that lines leaving one side of the
         bounding box reappear on the opposite side, ensuring the grid always
-        fills the box.
+        fills the box. In N-body mode (see :meth:`set_nbody`) the objects
+        themselves move under their mutual forces instead.
+        """
+        with self.profiler.stage("simulation"):
+            if self.nbody:
+                self._step_bodies(dt)
+                self.profiler.count("objects_visited", len(self.objects))
+                return
+            if len(self.objects):
+                shift = self.objects.velocities.sum(axis=0) * dt
+                self.grid_translation = QVector3D(
+                    (self.grid_translation.x() - shift[0]) % 1.0,
+                    (self.grid_translation.y() - shift[1]) % 1.0,
+                    (self.grid_translation.z() - shift[2]) % 1.0,
+                )
+        self.profiler.count("objects_visited", len(self.objects))
+
+    def set_nbody(self, enabled, softening=None):
+        """Move objects under their mutual forces instead of sliding the grid.
+
+        Accelerations follow ``force_formulas`` and ``force_scaling`` and
+        use the Barnes–Hut and cutoff settings of the grid, except that
+        without a theta more than :data:`NBODY_EXACT_LIMIT` bodies already
+        use :data:`AUTO_THETA`. ``softening`` sets the Plummer softening
+        length.
+        """
+        with self.state_lock:
+            self.nbody = enabled
+            if softening is not None:
+                self.nbody_softening = softening
+            self._nbody = None
+        self.update()
+
+    def nbody_diagnostics(self):
+        """Return energy and momentum drift of the N-body run, or None."""
+        with self.state_lock:
+            return self._nbody.diagnostics() if self._nbody is not None else None
+
+    def _nbody_settings(self):
+        """Return the inputs of the N-body forces; a change restarts the run."""
+        return (
+            self._forces_key(list(self.force_formulas)),
+            tuple(sorted(self.constants.items())),
+            self._barnes_hut_theta(NBODY_EXACT_LIMIT),
+            self.nbody_softening,
+        )
+
+    def _step_bodies(self, dt):
+        """Advance objects one velocity Verlet step.
+
+        The system is kept between steps as long as the objects only
+        changed through its own updates; any edit (new objects, changed
+        mass, formulas, ...) starts a new system.
         """
-        for obj in self.objects:
-            self.grid_translation.setX(
-                (self.grid_translation.x() - obj.velocity.x() * dt) % 1.0
+        settings = self._nbody_settings()
+        if self._nbody is None or self._nbody_snapshot != (self.objects.key(), settings):
+            store = self.objects
+            self._nbody = NBodySystem(
+                store.positions,
+                store.velocities,
+                store.masses,
+                self._forces(list(self.force_formulas)),
+                softening=self.nbody_softening,
+                theta=self._barnes_hut_theta(NBODY_EXACT_LIMIT),
             )
-            self.grid_translation.setY(
-                (self.grid_translation.y() - obj.velocity.y() * dt) % 1.0
+        self._nbody.step(dt)
+        self.objects.update_many(
+            self.objects.ids,
+            positions=self._nbody.positions,
+            velocities=self._nbody.velocities,
+        )
+        self._nbody_snapshot = (self.objects.key(), settings)
+
+    def _apply_displacement(self, position):
+        """Displace a single position by every force."""
+        point = self._displace([[position.x(), position.y(), position.z()]])[0]
+        return QVector3D(*point)
+
+    def _grid_translation(self):
+        return np.array(
+            [self.grid_translation.x(), self.grid_translation.y(), self.grid_translation.z()]
+        )
+
+    def _grid_lines(self):
+        """Return ``(starts, ends)`` arrays for the lines of the main grid.
+
+        Lines lying on the bounding box are skipped since the box itself is
+        drawn separately.
+        """
+        return self._wrap_lines(*self._grid_lattice())
+
+    def _wrap_lines(self, starts, ends, wrap):
+        """Shift the ``wrap`` coordinates of lattice lines by the grid translation.
+
+        Shifted coordinates wrap around the unit box so lines leaving one
+        side reappear on the other.
+        """
+        translation = self._grid_translation()
+        return (
+            np.where(wrap, (starts + translation) % 1.0, starts),
+            np.where(wrap, (ends + translation) % 1.0, ends),
+        )
+
+    def _grid_lattice(self):
+        """Return untranslated ``(starts, ends, wrap)`` of the main grid lines.
+
+        ``wrap`` flags, per line, the coordinates that follow the grid
+        translation (see :meth:`_wrap_lines`).
+        """
+        step = 1.0 / (self.grid_density - 1)
+        inner = np.arange(1, self.grid_density - 1) * step
+        zeros = np.zeros(len(inner))
+        if self.dimension == 1:
+            starts = np.stack([inner, zeros + 0.49, zeros + 0.5], axis=1)
+            ends = np.stack([inner, zeros + 0.51, zeros + 0.5], axis=1)
+            return starts, ends, np.broadcast_to([True, False, False], starts.shape)
+        if self.dimension == 2:
+            starts = np.concatenate(
+                [
+                    np.stack([inner, zeros, zeros + 0.5], axis=1),
+                    np.stack([zeros, inner, zeros + 0.5], axis=1),
+                ]
             )
-            self.grid_translation.setZ(
-                (self.grid_translation.z() - obj.velocity.z() * dt) % 1.0
+            ends = np.concatenate(
+                [
+                    np.stack([inner, zeros + 1, zeros + 0.5], axis=1),
+                    np.stack([zeros + 1, inner, zeros + 0.5], axis=1),
+                ]
             )
+            wrap = np.repeat([[True, False, False], [False, True, False]], len(inner), axis=0)
+            return starts, ends, wrap
 
+        last = self.grid_density - 1
+        a, b = np.meshgrid(
+            np.arange(self.grid_density), np.arange(self.grid_density), indexing="ij"
+        )
+        keep = ~(np.isin(a, (0, last)) & np.isin(b, (0, last)))
+        return self._axis_lattice(a[keep], b[keep], wrap_axis=False)
 
+    def _force_grid_lattice(self):
+        """Return untranslated ``(starts, ends, wrap)`` of the 3D force grid segments."""
+        a, b = np.meshgrid(
+            np.arange(self.grid_density), np.arange(self.grid_density), indexing="ij"
+        )
+        return self._axis_lattice(a.ravel(), b.ravel(), wrap_axis=True)
 
-    def _apply_displacement(self, position):
-        displacement = QVector3D(0, 0, 0)
-        for obj in self.objects:
-            r_vec = QVector3D(
-                position.x() - obj.position.x(),
-                position.y() - obj.position.y(),
-                position.z() - obj.position.z(),
-            )
+    def _axis_lattice(self, a, b, wrap_axis):
+        """Build the x, y and z line families of the 3D grid.
+
+        ``a`` and ``b`` index the two transverse axes of each line (in axis
+        order); lines run from 0 to 1 along their own axis, which only
+        follows the grid translation when ``wrap_axis`` is True.
+        """
+        step = 1.0 / (self.grid_density - 1)
+        starts, ends, wraps = [], [], []
+        for axis in range(3):
+            u, v = [k for k in range(3) if k != axis]
+            start = np.empty((len(a), 3))
+            start[:, u] = a * step
+            start[:, v] = b * step
+            end = start.copy()
+            start[:, axis] = 0.0
+            end[:, axis] = 1.0
+            wrap = np.ones((len(a), 3), dtype=bool)
+            wrap[:, axis] = wrap_axis
+            starts.append(start)
+            ends.append(end)
+            wraps.append(wrap)
+        return np.concatenate(starts), np.concatenate(ends), np.concatenate(wraps)
+
+    def _lattice_kind(self, name):
+        """Return the lattice a grid layer is built on, ``"grid"`` or ``"force"``.
+
+        Layers on the same lattice share their sample points and are built
+        together in one fused pass (see :meth:`_prepare_fused_layer`). The
+        3D force grid marks the crossings of the grid lattice.
+        """
+        if name == "grid" or self.dimension > 1:
+            return "grid"
+        return "force"
 
+    def _layer_lattice(self, name):
+        """Return untranslated ``(starts, ends, wrap, segments)`` of a grid layer.
 
-            r = math.sqrt(r_vec.x() ** 2 + r_vec.y() ** 2 + r_vec.z() ** 2)
-            if r == 0:
-                continue
-            r_unit = QVector3D(r_vec.x() / r, r_vec.y() / r, r_vec.z() / r)
-
-            for name, formula in self.force_formulas.items():
-                scaling = self.force_scaling.get(name, 0.0)
-                value = self._evaluate_formula(formula, r, obj.mass)
-                if value != 0 and scaling:
-                    displacement -= r_unit * value * scaling
-        return self._clamp_to_box(
-            QVector3D(
-                position.x() + displacement.x(),
-                position.y() + displacement.y(),
-                position.z() + displacement.z(),
+        ``name`` is ``"grid"`` or ``"force:<name>"``; each line is drawn
+        with ``segments`` segments.
+        """
+        if self.dimension == 3 and name != "grid":
+            return (*self._force_grid_lattice(), 1)
+        if self._lattice_kind(name) == "grid":
+            return (*self._grid_lattice(), self.line_segments)
+        starts, ends, wrap = self._grid_lattice()
+        starts = np.concatenate([[[0, 0.5, 0.5]], starts])
+        ends = np.concatenate([[[1, 0.5, 0.5]], ends])
+        wrap = np.concatenate([[[False, False, False]], wrap])
+        return starts, ends, wrap, self.line_segments
+
+    def _layer_forces(self, name):
+        """Return the names of the forces displacing a grid layer."""
+        if name == "grid":
+            return list(self.force_formulas)
+        return [name[len("force:"):]]
+
+    def _build_grid_layer(self):
+        return self._build_line_layers(["grid"])["grid"]
+
+    def _build_line_layers(self, names):
+        """Build grid layers on the same lattice in a single fused pass.
+
+        Returns ``{name: (vertices, indices, colors)}``; every vertex/object
+        pair is measured once for all layers.
+        """
+        return self._prepare_line_layers(names)()
+
+    def _prepare_line_layers(self, names):
+        """Snapshot the inputs of :meth:`_build_line_layers`.
+
+        Returns a callable building the layers from the snapshot alone.
+        """
+        if self.dimension == 3 and self._lattice_kind(names[0]) == "grid":
+            return self._prepare_shared_lattice(names)
+        starts, ends, wrap, segments = self._layer_lattice(names[0])
+        starts, ends = self._wrap_lines(starts, ends, wrap)
+        force_sets = [self._layer_forces(name) for name in names]
+        if segments == 1:
+            points = np.stack([starts, ends], axis=1).reshape(-1, 3)
+            with self.profiler.stage("displacement"):
+                displacer = self._prepare_displacer(force_sets)
+
+            def build():
+                with self.profiler.stage("displacement"):
+                    vertices = displacer()(points)
+                return {name: (layer, None, None) for name, layer in zip(names, vertices)}
+
+            return build
+        lines = self._prepare_lines(starts, ends, force_sets)
+
+        def build():
+            vertices, indices = lines()
+            return {name: (layer, indices, None) for name, layer in zip(names, vertices)}
+
+        return build
+
+    def _prepare_shared_lattice(self, names):
+        """Snapshot 3D grid layers on a shared-vertex lattice.
+
+        Crossings are displaced once for the three lines through them (see
+        :mod:`shared_lattice`). Adaptive lines start from the crossings and
+        are refined between them; uniform lines keep about
+        ``line_segments`` segments, split evenly between crossings. Force
+        layers mark the crossings on the lattice planes through index 0;
+        these are displaced for every layer together, the rest of the
+        lattice for the grid alone, so no vertex/object pair is measured
+        twice. Returns a callable building the layers from the snapshot
+        alone.
+        """
+        density = self.grid_density
+        translation = self._grid_translation()
+        force_sets = [self._layer_forces(name) for name in names]
+        layers = len(force_sets)
+        grid = names.index("grid") if "grid" in names else None
+        planes = plane_crossings(density)
+        segments = crossing_segments(density)
+        tolerance, budget = self.line_tolerance, self.line_vertex_budget
+        pieces = 1 if tolerance else max(1, round(self.line_segments / (density - 1)))
+        seeds = self._line_seeds() if tolerance else None
+        pool = self._geometry_pool
+        with self.profiler.stage("displacement"):
+            displacer = self._prepare_displacer(force_sets)
+
+        def build():
+            with self.profiler.stage("displacement"):
+                fused = displacer()
+
+                def displace(points, which=range(layers)):
+                    select = functools.partial(fused, which=which)
+                    if pool is None:
+                        return select(points)
+                    return pool.displace(points, select, len(which))
+
+                marked = displace(lattice_crossings(density, translation)[:planes])
+                if grid is None:
+                    vertices, indices = marked, None
+                else:
+                    if tolerance:
+                        points, starts, ends, line, t, vertex = lattice_samples(
+                            density, translation
+                        )
+                    else:
+                        points, indices = lattice_lines(density, translation, pieces)
+                    # The marked crossings come first and are already displaced
+                    shared = np.concatenate(
+                        [marked[grid : grid + 1], displace(points[planes:], [grid])], axis=1
+                    )
+                    if tolerance:
+                        lines, indices = subdivide_lines(
+                            starts,
+                            ends,
+                            lambda points: displace(points, [grid]),
+                            tolerance,
+                            budget,
+                            seeds=seeds,
+                            initial_segments=density - 1,
+                            samples=(points, line, t, vertex),
+                            displaced=shared,
+                        )
+                    else:
+                        lines = shared
+                    vertices = list(marked)
+                    vertices[grid] = lines[0]
+            return {
+                name: (layer, indices, None)
+                if name == "grid"
+                else (layer, segments, None)
+                for name, layer in zip(names, vertices)
+            }
+
+        return build
+
+    def _prepare_fused_layer(self, name, keys):
+        """Return a callable building one layer of a group sharing a lattice.
+
+        ``keys`` maps every layer of the group to its current key. The first
+        layer of a group prepared also prepares the other layers whose key
+        changed since they were last built, in one fused build that runs
+        once and is kept until their own preparation; draw loops prepare
+        and build dirty layers one after another.
+        """
+        pending = self._fused_layers.pop((name, keys[name]), None)
+        if pending is None:
+            names = [
+                other
+                for other, key in keys.items()
+                if other == name or self._built_layer_keys.get(other) != key
+            ]
+            pending = functools.cache(self._prepare_line_layers(names))
+            self._fused_layers = {
+                (other, keys[other]): pending for other in names if other != name
+            }
+            for other in names:
+                self._built_layer_keys[other] = keys[other]
+        return lambda: pending()[name]
+
+    def _layer_specs(self):
+        """Return ``(name, mode, key, build)`` of every grid layer in draw order.
+
+        ``key`` captures the inputs of the layer's geometry and ``build``
+        returns its ``(vertices, indices, colors)``. Builds of grid lines
+        are :class:`PreparedBuild` objects, which the simulation worker
+        splits to build without holding ``state_lock``.
+        """
+        if self.grid_density < 2:
+            return []
+        gpu = {name for name, _ in self._gpu_layers()}
+        names = [
+            f"force:{name}"
+            for name, visible in self.show_forces.items()
+            if visible and f"force:{name}" not in gpu
+        ]
+        if "grid" not in gpu:
+            names.append("grid")
+        keys = {name: self._layer_key(self._layer_forces(name)) for name in names}
+        groups = {}
+        for name in names:
+            groups.setdefault(self._lattice_kind(name), []).append(name)
+
+        def build(name):
+            group = {other: keys[other] for other in groups[self._lattice_kind(name)]}
+            return PreparedBuild(lambda: self._prepare_fused_layer(name, group))
+
+        specs = [(name, GL_LINES, keys[name], build(name)) for name in names if name != "grid"]
+        specs.append(
+            (
+                "bounds",
+                GL_LINES,
+                self.dimension,
+                lambda: (self._bounding_segments(), None, None),
             )
         )
+        if "grid" in keys:
+            specs.append(("grid", GL_LINES, keys["grid"], build("grid")))
+        return specs
+
+    def set_gpu_displacement(self, enabled):
+        """Displace grid layers in a vertex shader instead of on the CPU.
+
+        Layers whose formulas use syntax outside the GPU whitelist (see
+        :func:`gpu_displacement.formula_to_glsl`) keep using the CPU path.
+        The shader sums every object exactly, ignoring the Barnes–Hut and
+        displacement field approximations, and samples lines uniformly
+        with ``line_segments`` rather than adaptively, without sharing
+        crossings between 3D lines.
+        """
+        with self.state_lock:
+            self.gpu_displacement = enabled
+        self.update()
+
+    def _glsl_formula(self, formula):
+        """Return the GLSL translation of ``formula``, or None if unsupported."""
+        key = (formula, tuple(sorted(self.constants.items())))
+        if key not in self._glsl_formulas:
+            try:
+                self._glsl_formulas[key] = formula_to_glsl(formula, self.constants)
+            except FormulaError as exc:
+                sys.stderr.write(f"Displacing on the CPU: {exc}\n")
+                self._glsl_formulas[key] = None
+        return self._glsl_formulas[key]
+
+    def _gpu_forces(self, force_names):
+        """Return ``(expression, scaling, cutoff)`` of each active force.
+
+        Returns None if any active force cannot be translated to GLSL.
+        """
+        forces = []
+        for name in force_names:
+            scaling = self.force_scaling.get(name, 0.0)
+            if not scaling or self._force_evaluator(name).constant == 0:
+                continue
+            expression = self._glsl_formula(self.force_formulas.get(name, "0"))
+            if expression is None:
+                return None
+            forces.append((expression, scaling, self.force_cutoffs.get(name)))
+        return forces
+
+    def _gpu_layers(self):
+        """Return ``(name, forces)`` of the grid layers displaced on the GPU.
+
+        Empty unless GPU displacement is on and shaders work, and while
+        there are more objects than the object texture holds.
+        """
+        gpu = self._gpu
+        if not self.gpu_displacement or gpu is None or self.grid_density < 2:
+            return []
+        if len(self.objects) > gpu.max_objects:
+            return []
+        candidates = [
+            (f"force:{name}", [name])
+            for name, visible in self.show_forces.items()
+            if visible
+        ]
+        candidates.append(("grid", list(self.force_formulas)))
+        layers = []
+        for name, force_names in candidates:
+            forces = self._gpu_forces(force_names)
+            if forces is not None and shader_source(forces) not in gpu.rejected:
+                layers.append((name, forces))
+        return layers
+
+    def _build_lattice_layer(self, name):
+        """Return the undisplaced lattice of a grid layer for the shader.
+
+        The wrap flags of each vertex are passed as texture coordinates.
+        """
+        starts, ends, wrap, segments = self._layer_lattice(name)
+        vertices = line_vertices(starts, ends, segments).reshape(-1, 3)
+        indices = strip_indices(len(starts), segments + 1) if segments > 1 else None
+        return vertices, indices, None, np.repeat(wrap, segments + 1, axis=0)
+
+    def _draw_gpu_layers(self):
+        """Draw the grid layers displaced by the vertex shader.
 
-    def _draw_displaced_line(self, start, end):
-        """Draw a line segment warped by forces and wrapped to the box."""
-        glBegin(GL_LINE_STRIP)
-        for k in range(self.line_segments + 1):
-            t = k / self.line_segments
-            pos = QVector3D(
-                start.x() + (end.x() - start.x()) * t,
-                start.y() + (end.y() - start.y()) * t,
-                start.z() + (end.z() - start.z()) * t,
+        Their buffers hold the untranslated lattice and are only rebuilt
+        when the grid's shape changes. A frame sets a few uniforms, and
+        object data is uploaded when objects change.
+        """
+        if not self.gpu_displacement:
+            return
+        if self._gpu is None:
+            if not GPUDisplacement.supported():
+                sys.stderr.write("GLSL 1.30 is not available; displacing on the CPU\n")
+                self.gpu_displacement = False
+                return
+            self._gpu = GPUDisplacement()
+        with self.state_lock:
+            layers = self._gpu_layers()
+            if not layers:
+                return
+            translation = self._grid_translation()
+            self._gpu.upload_objects(
+                self._objects_key(), self.objects.positions, self.objects.masses
             )
-            # Apply any displacement caused by forces
-            pos = self._apply_displacement(pos)
-            glVertex3f(pos.x(), pos.y(), pos.z())
-        glEnd()
-
-    def _draw_force_line(self, start, end, force_name):
-        """Draw a line warped by a specific force field."""
-        glBegin(GL_LINE_STRIP)
-        for k in range(self.line_segments + 1):
-            t = k / self.line_segments
-            pos = QVector3D(
-                start.x() + (end.x() - start.x()) * t,
-                start.y() + (end.y() - start.y()) * t,
-                start.z() + (end.z() - start.z()) * t,
+        key = (self.dimension, self.grid_density, self.line_segments)
+        for name, forces in layers:
+            program = self._gpu.program(forces)
+            if program is None:
+                # Draw the layer on the CPU from the next frame on
+                self.update()
+                continue
+            self._gpu.bind(program, translation)
+            glColor4f(*self._layer_color(name))
+            self._draw_layer(
+                f"gpu:{name}",
+                GL_LINES,
+                key,
+                lambda name=name: self._build_lattice_layer(name),
             )
-            pos = self._apply_force(pos, force_name)
-            glVertex3f(pos.x(), pos.y(), pos.z())
-        glEnd()
+        self._gpu.release()
 
-    def _draw_grid_for_force(self, force_name):
-        glColor4f(*self.force_colors[force_name], self.grid_opacity)
-        step = 1.0 / (self.grid_density - 1)
-        ox = self.grid_translation.x()
-        oy = self.grid_translation.y()
-        oz = self.grid_translation.z()
-        if self.dimension == 1:
-            self._draw_force_line(
-                QVector3D(0, 0.5, 0.5), QVector3D(1, 0.5, 0.5), force_name
-            )
-            for i in range(self.grid_density):
-                x = (i * step + ox) % 1.0
-                if i in (0, self.grid_density - 1):
-                    continue
-                self._draw_force_line(
-                    QVector3D(x, 0.49, 0.5),
-                    QVector3D(x, 0.51, 0.5),
-                    force_name,
-                )
-        elif self.dimension == 2:
-            for i in range(self.grid_density):
-                x = (i * step + ox) % 1.0
-                if i not in (0, self.grid_density - 1):
-                    self._draw_force_line(
-                        QVector3D(x, 0, 0.5),
-                        QVector3D(x, 1, 0.5),
-                        force_name,
-                    )
-                y = (i * step + oy) % 1.0
-                if i not in (0, self.grid_density - 1):
-                    self._draw_force_line(
-                        QVector3D(0, y, 0.5),
-                        QVector3D(1, y, 0.5),
-                        force_name,
-                    )
-        else:
+    def _layer_color(self, name):
+        if name.startswith("force:"):
+            return (*self.force_colors[name[len("force:"):]], self.grid_opacity)
+        return (1, 1, 1, self.grid_opacity)
 
-            offset = self.grid_translation
-
-            glBegin(GL_LINES)
-            for i in range(self.grid_density):
-                for j in range(self.grid_density):
-                    p1 = self._apply_force(
-                        QVector3D(
-                            (0 + offset.x()) % 1.0,
-                            (i * step + offset.y()) % 1.0,
-                            (j * step + offset.z()) % 1.0,
-                        ),
-                        force_name,
-                    )
-                    p2 = self._apply_force(
-                        QVector3D(
-                            (1 + offset.x()) % 1.0,
-                            (i * step + offset.y()) % 1.0,
-                            (j * step + offset.z()) % 1.0,
-                        ),
-                        force_name,
-                    )
-                    glVertex3f(p1.x(), p1.y(), p1.z())
-                    glVertex3f(p2.x(), p2.y(), p2.z())
-                    p3 = self._apply_force(
-                        QVector3D(
-                            (i * step + offset.x()) % 1.0,
-                            (0 + offset.y()) % 1.0,
-                            (j * step + offset.z()) % 1.0,
-                        ),
-                        force_name,
-                    )
-                    p4 = self._apply_force(
-                        QVector3D(
-                            (i * step + offset.x()) % 1.0,
-                            (1 + offset.y()) % 1.0,
-                            (j * step + offset.z()) % 1.0,
-                        ),
-                        force_name,
-                    )
-                    glVertex3f(p3.x(), p3.y(), p3.z())
-                    glVertex3f(p4.x(), p4.y(), p4.z())
-                    p5 = self._apply_force(
-                        QVector3D(
-                            (i * step + offset.x()) % 1.0,
-                            (j * step + offset.y()) % 1.0,
-                            (0 + offset.z()) % 1.0,
-                        ),
-                        force_name,
-                    )
-                    p6 = self._apply_force(
-                        QVector3D(
-                            (i * step + offset.x()) % 1.0,
-                            (j * step + offset.y()) % 1.0,
-                            (1 + offset.z()) % 1.0,
-                        ),
-                        force_name,
-                    )
-                    glVertex3f(p5.x(), p5.y(), p5.z())
-                    glVertex3f(p6.x(), p6.y(), p6.z())
-            glEnd()
+    def _draw_published_layers(self):
+        """Draw the layers most recently published by the simulation worker.
 
+        Buffers are only re-uploaded when the worker published a new version
+        of a layer.
+        """
+        with self.frame_buffers.reading() as layers:
+            for name, layer in layers.items():
+                glColor4f(*self._layer_color(name))
+                self._draw_layer(
+                    name,
+                    layer.mode,
+                    ("published", layer.version),
+                    lambda layer=layer: (layer.vertices, layer.indices, layer.colors),
+                )
 
+    def _draw_spheres(self, objects, layer="objects"):
+        """Draw a sphere for each object of an :class:`ObjectStore`.
 
+        Spheres are instanced from cached unit meshes, one draw call per
+        level of detail, when the context supports it; otherwise every
+        sphere is expanded into one vertex batch.
+        """
+        if not len(objects):
+            return
+        if self._sphere_instances is None:
+            self._sphere_instances = SphereInstances() if SphereInstances.supported() else False
+        if self._sphere_instances:
+            with self.profiler.stage("spheres"):
+                self._sphere_instances.draw(
+                    layer, objects.key(), objects.positions, objects.radii, objects.colors
+                )
+            self.profiler.count("objects_visited", len(objects))
+            return
+        self._draw_layer(
+            layer,
+            GL_TRIANGLES,
+            objects.key(),
+            lambda: self._build_sphere_layer(
+                objects.positions, objects.radii, objects.colors
+            ),
+            stages=("spheres", "spheres"),
+        )
+        self.profiler.count("objects_visited", len(objects))
 
+    def _build_sphere_layer(self, positions, radii, colors):
+        vertices, vertex_colors, indices = sphere_batch(positions, radii, colors)
+        return vertices, indices, vertex_colors
 
     def draw_sphere(self, position, radius, color):
-        glPushMatrix()
-        glTranslatef(position.x(), position.y(), position.z())
-        glColor4f(*color)
-        
-        slices = 16
-        stacks = 16
-        
-        for i in range(stacks):
-            lat0 = math.pi * (-0.5 + float(i) / stacks)
-            z0 = math.sin(lat0)
-            zr0 = math.cos(lat0)
-            
-            lat1 = math.pi * (-0.5 + float(i+1) / stacks)
-            z1 = math.sin(lat1)
-            zr1 = math.cos(lat1)
-            
-            glBegin(GL_QUAD_STRIP)
-            for j in range(slices + 1):
-                lng = 2 * math.pi * float(j) / slices
-                x = math.cos(lng)
-                y = math.sin(lng)
-                
-                glNormal3f(x * zr0, y * zr0, z0)
-                glVertex3f(x * zr0 * radius, y * zr0 * radius, z0 * radius)
-                glNormal3f(x * zr1, y * zr1, z1)
-                glVertex3f(x * zr1 * radius, y * zr1 * radius, z1 * radius)
-            glEnd()
-        
-        glPopMatrix()
+        self._draw_spheres(SpaceObject(position, radius, color).store, layer="sphere")
 
     def add_object(self, position, radius, color, mass, velocity=None):
-        print(
-            f"GridVisualizer: Adding object with position={position}, radius={radius}, "
-            f"color={color}, mass={mass}, velocity={velocity}"
+        """Add one object and return its ID."""
+        if velocity is None:
+            velocity = QVector3D(0.0, 0.0, 0.0)
+        return int(
+            self.add_objects(
+                [(position.x(), position.y(), position.z())],
+                [radius],
+                [color],
+                [mass],
+                [(velocity.x(), velocity.y(), velocity.z())],
+            )[0]
         )
+
+    def add_objects(self, positions, radii, colors, masses, velocities=None):
+        """Add many objects from arrays at once and return their IDs.
+
+        See :meth:`ObjectStore.add_many`; caches are invalidated and the
+        view repainted once for the whole batch.
+        """
+        with self.state_lock:
+            ids = self.objects.add_many(positions, radii, colors, masses, velocities)
+        self.update()
+        return ids
+
+    def load_catalog(self, path, chunk_size=CHUNK_SIZE):
+        """Stream a catalog file into the objects and return the new IDs.
+
+        Rows are read and added ``chunk_size`` at a time (see
+        :func:`catalog.read_catalog`), so the file is never loaded whole.
+        Raises :class:`catalog.CatalogError` for malformed files, keeping
+        the chunks added before the error. Reports when the catalog takes
+        the objects past ``exact_object_limit``.
+        """
+        ids = []
         try:
-            if velocity is None:
-                velocity = QVector3D(0.0, 0.0, 0.0)
-            new_object = SpaceObject(position, radius, color, mass, velocity)
-            print("SpaceObject created successfully")
-            self.objects.append(new_object)
+            for chunk in read_catalog(path, chunk_size):
+                with self.state_lock:
+                    ids.append(
+                        self.objects.add_many(
+                            chunk.positions,
+                            chunk.radii,
+                            chunk.colors,
+                            chunk.masses,
+                            chunk.velocities,
+                        )
+                    )
+        finally:
+            with self.state_lock:
+                if self.barnes_hut_theta is None and self._barnes_hut_theta() is not None:
+                    sys.stderr.write(
+                        f"{len(self.objects)} objects: approximating forces with "
+                        f"Barnes–Hut (theta {AUTO_THETA})\n"
+                    )
             self.update()
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-    
+        return np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+
+    def remove_objects(self, ids):
+        """Remove the objects with the given IDs."""
+        with self.state_lock:
+            self.objects.remove_many(ids)
+        self.update()
+
+    def update_objects(self, ids, **properties):
+        """Change properties of objects by ID, see :meth:`ObjectStore.update_many`."""
+        with self.state_lock:
+            self.objects.update_many(ids, **properties)
+        self.update()
+
     def select_object(self, x, y):
         self.makeCurrent()
         viewport = glGetIntegerv(GL_VIEWPORT)
@@ -572,18 +1552,24 @@ class GridVisualizer(QOpenGLWidget):
         
         winX = float(x)
         winY = float(viewport[3] - y)
-        
-        for i, obj in enumerate(self.objects):
-            objX, objY, objZ = gluProject(obj.position.x(), obj.position.y(), obj.position.z(), modelview, projection, viewport)
-            distance = math.sqrt((winX - objX)**2 + (winY - objY)**2)
-            if distance < 10:  # 10 pixels tolerance
-                return i
-        return None
 
-    def remove_object(self, index):
-        if 0 <= index < len(self.objects):
-            del self.objects[index]
-            self.update()
+        # Project every object at once, like gluProject
+        positions = self.objects.positions
+        clip = np.hstack([positions, np.ones((len(positions), 1))]) @ modelview @ projection
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ndc = clip[:, :2] / clip[:, 3:]
+        objX = viewport[0] + viewport[2] * (ndc[:, 0] + 1) / 2
+        objY = viewport[1] + viewport[3] * (ndc[:, 1] + 1) / 2
+        distance = np.hypot(winX - objX, winY - objY)
+        hits = np.flatnonzero(distance < 10)  # 10 pixels tolerance
+        if not len(hits):
+            return None
+        return int(self.objects.ids[hits[0]])
+
+    def remove_object(self, object_id):
+        """Remove the object ``object_id`` if it exists (see :meth:`remove_objects`)."""
+        if object_id in self.objects:
+            self.remove_objects([object_id])
 
 
 class ForceFormulasDialog(QDialog):
@@ -696,6 +1682,47 @@ class SettingsPanel(QWidget):
         force_group.setLayout(force_layout)
         layout.addWidget(force_group)
 
+        nbody_check = QCheckBox("N-body Motion")
+        nbody_check.stateChanged.connect(
+            lambda state: self.visualizer.set_nbody(state == Qt.Checked)
+        )
+        layout.addWidget(nbody_check)
+
+        gpu_check = QCheckBox("GPU Displacement")
+        gpu_check.stateChanged.connect(
+            lambda state: self.visualizer.set_gpu_displacement(state == Qt.Checked)
+        )
+        layout.addWidget(gpu_check)
+
+        self.table_check = QCheckBox("Tabulated Forces")
+        self.table_check.stateChanged.connect(self.toggle_force_tables)
+        layout.addWidget(self.table_check)
+
+        # Threads building grid geometry
+        workers_group = QGroupBox("Geometry Threads")
+        workers_layout = QHBoxLayout()
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, os.cpu_count() or 1)
+        self.workers_spin.setValue(self.visualizer.geometry_workers)
+        self.workers_spin.valueChanged.connect(self.visualizer.set_geometry_workers)
+        workers_layout.addWidget(self.workers_spin)
+        workers_group.setLayout(workers_layout)
+        layout.addWidget(workers_group)
+
+        # Largest deviation of drawn lines from their exact bent shape
+        tolerance_group = QGroupBox("Line Tolerance")
+        tolerance_layout = QHBoxLayout()
+        self.tolerance_spin = QDoubleSpinBox()
+        self.tolerance_spin.setDecimals(4)
+        self.tolerance_spin.setRange(0.0, 0.05)
+        self.tolerance_spin.setSingleStep(0.0005)
+        self.tolerance_spin.setSpecialValueText("Uniform")
+        self.tolerance_spin.setValue(self.visualizer.line_tolerance)
+        self.tolerance_spin.valueChanged.connect(self.visualizer.set_line_tolerance)
+        tolerance_layout.addWidget(self.tolerance_spin)
+        tolerance_group.setLayout(tolerance_layout)
+        layout.addWidget(tolerance_group)
+
         self.setLayout(layout)
 
     def set_dimension(self, dim):
@@ -717,27 +1744,40 @@ class SettingsPanel(QWidget):
         self.visualizer.show_forces[name] = state == Qt.Checked
         self.visualizer.update()
 
+    def toggle_force_tables(self, state):
+        self.visualizer.set_force_tables(state == Qt.Checked)
+        lines = []
+        for name, entry in self.visualizer.force_table_report().items():
+            if entry["tabulated"]:
+                lines.append(f"{name}: max relative error {entry['max_error']['relative']:.2g}")
+            else:
+                lines.append(f"{name}: exact ({entry['reason']})")
+        self.table_check.setToolTip("\n".join(lines))
+
 class MainWindow(QMainWindow):
     def __init__(self, space_time_grid):
         super().__init__()
         self.space_time_grid = space_time_grid
+        # ID of the object shown in the selected objects list
+        self.selected_object_id = None
         self.initUI()
-        
-        # Add a timer to trigger updates
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_simulation)
-        self.timer.start(16)  # Update roughly 60 times per second
 
-    def update_simulation(self):
-        self.visualizer.advance_simulation(0.016)
-        self.visualizer.update()
+        # Simulation and grid geometry run on a fixed 60 Hz timestep in the
+        # background; the visualizer repaints whenever a new frame is ready
+        self.worker = SimulationWorker(self.visualizer)
+        self.worker.frame_ready.connect(self.visualizer.update)
+        self.worker.start()
+
+    def closeEvent(self, event):
+        self.worker.stop()
+        super().closeEvent(event)
 
     def toggle_velocity(self):
-        if self.timer.isActive():
-            self.timer.stop()
+        if not self.worker.paused:
+            self.worker.paused = True
             self.toggle_velocity_button.setText("Start")
         else:
-            self.timer.start(16)
+            self.worker.paused = False
             self.toggle_velocity_button.setText("Stop")
 
     def setup_object_lists(self):
@@ -838,6 +1878,17 @@ class MainWindow(QMainWindow):
         formula_action = QAction('Force Formulas', self)
         formula_action.triggered.connect(self.open_force_formula_dialog)
         settings_menu.addAction(formula_action)
+        file_menu = menubar.addMenu('File')
+        catalog_action = QAction('Load Catalog...', self)
+        catalog_action.triggered.connect(self.open_catalog)
+        file_menu.addAction(catalog_action)
+        view_menu = menubar.addMenu('View')
+        stats_action = QAction('Frame Stats', self)
+        stats_action.setCheckable(True)
+        stats_action.toggled.connect(
+            lambda checked: self.visualizer.set_profiling(checked, hud=checked)
+        )
+        view_menu.addAction(stats_action)
 
         # Central widget
         central_widget = QWidget()
@@ -907,35 +1958,60 @@ class MainWindow(QMainWindow):
         # Connect the object_selected signal
         self.visualizer.object_selected.connect(self.on_object_selected)
 
-    def on_object_selected(self, index):
+    def on_object_selected(self, object_id):
+        self.selected_object_id = object_id
         self.selected_objects_list.clear()
-        obj = self.visualizer.objects[index]
+        obj = self.visualizer.objects.get(object_id)
         self.selected_objects_list.addItem(
-            f"Object {index}: pos={obj.position}, vel={obj.velocity}, mass={obj.mass}, radius={obj.radius}")
+            f"Object {object_id}: pos={obj.position}, vel={obj.velocity}, mass={obj.mass}, radius={obj.radius}")
+
+    def _selected_object(self):
+        """Return the ID of the selected object if it still exists."""
+        object_id = self.selected_object_id
+        if object_id is None or object_id not in self.visualizer.objects:
+            return None
+        return object_id
 
     def remove_selected_object(self):
-        if self.selected_objects_list.count() > 0:
-            index = int(self.selected_objects_list.item(0).text().split(':')[0].split(' ')[1])
-            self.visualizer.remove_object(index)
+        object_id = self._selected_object()
+        if object_id is not None:
+            self.visualizer.remove_objects([object_id])
+            self.selected_object_id = None
             self.selected_objects_list.clear()
 
     def edit_selected_object(self):
-        if self.selected_objects_list.count() > 0:
-            index = int(self.selected_objects_list.item(0).text().split(':')[0].split(' ')[1])
-            obj = self.visualizer.objects[index]
+        object_id = self._selected_object()
+        if object_id is not None:
+            obj = self.visualizer.objects.get(object_id)
             dlg = ObjectSettingsDialog(obj, self)
             if dlg.exec_():
-                obj.mass = dlg.mass_spin.value()
-                obj.radius = dlg.radius_spin.value()
-                obj.velocity = QVector3D(dlg.vx_spin.value(), dlg.vy_spin.value(), dlg.vz_spin.value())
-                self.visualizer.update()
-                self.on_object_selected(index)
+                self.visualizer.update_objects(
+                    [object_id],
+                    masses=dlg.mass_spin.value(),
+                    radii=dlg.radius_spin.value(),
+                    velocities=(dlg.vx_spin.value(), dlg.vy_spin.value(), dlg.vz_spin.value()),
+                )
+                self.on_object_selected(object_id)
+
+    def open_catalog(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Load Catalog", "", "Catalogs (*.csv *.npy *.bin);;All files (*)"
+        )
+        if not path:
+            return
+        try:
+            self.visualizer.load_catalog(path)
+        except (OSError, CatalogError) as exc:
+            QMessageBox.warning(self, "Load Catalog", str(exc))
 
     def open_force_formula_dialog(self):
         dlg = ForceFormulasDialog(self.visualizer.force_formulas, self)
         if dlg.exec_():
             formulas = {name: edit.text() for name, edit in dlg.inputs.items()}
-            self.visualizer.update_force_formulas(formulas)
+            try:
+                self.visualizer.update_force_formulas(formulas)
+            except FormulaError as exc:
+                QMessageBox.warning(self, "Force Formulas", str(exc))
 
 
 def visualize_grid(space_time_grid):
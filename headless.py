@@ -0,0 +1,155 @@
+"""Headless rendering of the grid scene to image files.
+
+Renders ``GridVisualizer`` without a window or display server: Qt runs on
+its ``offscreen`` platform just to host the widget, and drawing happens in
+an EGL pbuffer context, which Mesa provides in software (llvmpipe) on
+machines without a GPU. Call :func:`configure_environment` before anything
+imports ``OpenGL.GL`` so PyOpenGL binds to EGL.
+"""
+
+import os
+import sys
+import time
+
+
+def configure_environment():
+    """Select the Qt offscreen platform and EGL-backed PyOpenGL.
+
+    Existing settings are left alone so callers can override them.
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+    # Mesa: render without any display connection
+    os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+
+
+class EGLContext:
+    """Desktop GL context rendering into an EGL pbuffer surface."""
+
+    def __init__(self, width, height):
+        import ctypes
+        from OpenGL import EGL
+
+        self._egl = EGL
+        self.display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        if not EGL.eglInitialize(self.display, None, None):
+            raise RuntimeError("could not initialize an EGL display")
+        attributes = [
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_RED_SIZE, 8,
+            EGL.EGL_GREEN_SIZE, 8,
+            EGL.EGL_BLUE_SIZE, 8,
+            EGL.EGL_ALPHA_SIZE, 8,
+            EGL.EGL_DEPTH_SIZE, 24,
+            EGL.EGL_NONE,
+        ]
+        config = EGL.EGLConfig()
+        count = EGL.EGLint()
+        ok = EGL.eglChooseConfig(
+            self.display,
+            (EGL.EGLint * len(attributes))(*attributes),
+            ctypes.pointer(config),
+            1,
+            ctypes.pointer(count),
+        )
+        if not ok or not count.value:
+            raise RuntimeError("no EGL config supports offscreen OpenGL")
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        size = [EGL.EGL_WIDTH, width, EGL.EGL_HEIGHT, height, EGL.EGL_NONE]
+        self.surface = EGL.eglCreatePbufferSurface(
+            self.display, config, (EGL.EGLint * len(size))(*size)
+        )
+        self.context = EGL.eglCreateContext(
+            self.display, config, EGL.EGL_NO_CONTEXT, None
+        )
+        if not EGL.eglMakeCurrent(self.display, self.surface, self.surface, self.context):
+            raise RuntimeError("could not make the EGL context current")
+
+    def release(self):
+        EGL = self._egl
+        EGL.eglMakeCurrent(
+            self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT
+        )
+        EGL.eglDestroySurface(self.display, self.surface)
+        EGL.eglDestroyContext(self.display, self.context)
+        EGL.eglTerminate(self.display)
+
+
+def _read_frame(width, height):
+    """Return the current framebuffer as top-down RGBA bytes."""
+    import numpy as np
+    from OpenGL.GL import GL_RGBA, GL_UNSIGNED_BYTE, glFinish, glReadPixels
+
+    glFinish()
+    pixels = glReadPixels(0, 0, width, height, GL_RGBA, GL_UNSIGNED_BYTE)
+    image = np.frombuffer(pixels, dtype=np.uint8).reshape(height, width, 4)
+    return image[::-1].tobytes()
+
+
+def _write_frame(path, data, width, height, fmt):
+    if fmt == "raw":
+        with open(path, "wb") as handle:
+            handle.write(data)
+        return
+    from PyQt5.QtGui import QImage
+
+    image = QImage(data, width, height, width * 4, QImage.Format_RGBA8888)
+    if not image.save(path, "PNG"):
+        raise OSError(f"could not write {path}")
+
+
+def render_frames(
+    space_time_grid,
+    steps,
+    output_dir,
+    width=800,
+    height=600,
+    fmt="png",
+    dt=0.016,
+    setup=None,
+):
+    """Render ``steps`` simulation steps to ``output_dir``.
+
+    Each step advances the simulation by ``dt`` and writes
+    ``frame_00000.png`` (or ``.rgba`` raw RGBA bytes when ``fmt`` is
+    ``"raw"``). ``setup(visualizer)`` may add objects or change settings
+    before the first frame. Returns a dict with the frame count, elapsed
+    seconds and frames per second.
+    """
+    if fmt not in ("png", "raw"):
+        raise ValueError(f"unknown frame format {fmt!r}")
+    configure_environment()
+    from PyQt5.QtWidgets import QApplication
+
+    from grid_visualizer import GridVisualizer
+
+    # Qt needs an application object to create widgets, even offscreen
+    app = QApplication.instance() or QApplication(sys.argv[:1])  # noqa: F841
+    context = EGLContext(width, height)
+    try:
+        visualizer = GridVisualizer(space_time_grid)
+        visualizer.resize(width, height)
+        if setup is not None:
+            setup(visualizer)
+        visualizer.initializeGL()
+        visualizer.resizeGL(width, height)
+        os.makedirs(output_dir, exist_ok=True)
+        extension = "rgba" if fmt == "raw" else "png"
+        start = time.perf_counter()
+        for frame in range(steps):
+            visualizer.advance_simulation(dt)
+            visualizer.paintGL()
+            data = _read_frame(width, height)
+            path = os.path.join(output_dir, f"frame_{frame:05d}.{extension}")
+            _write_frame(path, data, width, height, fmt)
+        elapsed = time.perf_counter() - start
+    finally:
+        context.release()
+    return {
+        "frames": steps,
+        "seconds": elapsed,
+        "fps": steps / elapsed if elapsed else 0.0,
+        "width": width,
+        "height": height,
+    }
@@ -1,8 +1,30 @@
+import argparse
+
 from space_time_grid import SpaceTimeGrid
-from grid_visualizer import visualize_grid
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Unified relativity visualizer")
+    parser.add_argument(
+        "--headless",
+        type=int,
+        metavar="STEPS",
+        help="render STEPS simulation steps offscreen instead of opening a window",
+    )
+    parser.add_argument(
+        "--output", default="frames", help="directory for headless frames"
+    )
+    parser.add_argument(
+        "--format", choices=["png", "raw"], default="png", help="headless frame format"
+    )
+    parser.add_argument(
+        "--size", default="800x600", help="headless frame size as WIDTHxHEIGHT"
+    )
+    return parser.parse_args()
 
 
 def main():
+    args = parse_args()
     print("Starting main")
     grid = SpaceTimeGrid(
         x_size=20,
@@ -12,6 +34,22 @@ def main():
         t_size=10,
         resolution=0.1,
     )
+    if args.headless is not None:
+        # Imported late so the EGL/offscreen setup happens before OpenGL loads
+        from headless import render_frames
+
+        width, height = (int(v) for v in args.size.lower().split("x"))
+        stats = render_frames(
+            grid, args.headless, args.output, width, height, fmt=args.format
+        )
+        print(
+            f"Rendered {stats['frames']} frames to {args.output} in "
+            f"{stats['seconds']:.2f}s ({stats['fps']:.1f} fps)"
+        )
+        return
+
+    from grid_visualizer import visualize_grid
+
     print("Grid created, calling visualize_grid")
     visualize_grid(grid)
     print("visualize_grid finished")
@@ -0,0 +1,224 @@
+"""Struct-of-arrays storage for space objects.
+
+Positions, velocities, masses, radii and colors of all objects live in
+contiguous NumPy arrays so force, simulation and drawing code can work on
+whole columns instead of unboxing one object at a time. Every object gets
+a stable integer ID that survives other objects being removed; removal
+moves the last row into the freed slot, so rows are always packed.
+
+``version`` increases once per mutation (or per bulk call), which is what
+geometry caches key on.
+"""
+
+import itertools
+
+import numpy as np
+
+# Distinguishes stores in cache keys, so two stores never share a key
+_serials = itertools.count()
+
+
+class ObjectStore:
+    """Packed arrays of object properties addressed by stable IDs.
+
+    The public ``positions``, ``velocities``, ``masses``, ``radii``,
+    ``colors`` and ``ids`` arrays are views of the live rows and must be
+    treated as read-only; change objects through :meth:`update_many` (or
+    :class:`space_object.SpaceObject` views) so ``version`` is bumped.
+
+    For compatibility with code written against a list of objects,
+    iterating, indexing and ``len`` work on rows and yield
+    :class:`space_object.SpaceObject` views.
+    """
+
+    def __init__(self, capacity=16):
+        capacity = max(1, capacity)
+        self._positions = np.zeros((capacity, 3))
+        self._velocities = np.zeros((capacity, 3))
+        self._masses = np.zeros(capacity)
+        self._radii = np.zeros(capacity)
+        self._colors = np.zeros((capacity, 4))
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._rows = {}
+        self._count = 0
+        self._next_id = 0
+        self.serial = next(_serials)
+        self.version = 0
+
+    # Live views of the packed rows
+
+    @property
+    def positions(self):
+        return self._positions[: self._count]
+
+    @property
+    def velocities(self):
+        return self._velocities[: self._count]
+
+    @property
+    def masses(self):
+        return self._masses[: self._count]
+
+    @property
+    def radii(self):
+        return self._radii[: self._count]
+
+    @property
+    def colors(self):
+        return self._colors[: self._count]
+
+    @property
+    def ids(self):
+        return self._ids[: self._count]
+
+    def key(self):
+        """Return a hashable key that changes whenever any object changes."""
+        return self.serial, self.version
+
+    def _reserve(self, count):
+        capacity = len(self._masses)
+        if count <= capacity:
+            return
+        capacity = max(count, 2 * capacity)
+        for name in ("_positions", "_velocities", "_masses", "_radii", "_colors", "_ids"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[: self._count] = old[: self._count]
+            setattr(self, name, new)
+
+    def row(self, object_id):
+        """Return the current row of ``object_id``; raises KeyError if gone."""
+        try:
+            return self._rows[object_id]
+        except KeyError:
+            raise KeyError(f"no object with id {object_id}") from None
+
+    def _rows_of(self, ids):
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        if len(ids) == self._count and np.array_equal(ids, self.ids):
+            return np.arange(self._count)
+        return np.array([self.row(int(i)) for i in ids], dtype=np.int64)
+
+    def add(self, position, radius, color, mass=1.0, velocity=(0.0, 0.0, 0.0)):
+        """Add one object and return its ID."""
+        return int(self.add_many([position], [radius], [color], [mass], [velocity])[0])
+
+    def add_many(self, positions, radii, colors, masses, velocities=None):
+        """Add ``N`` objects from array-likes and return their IDs.
+
+        ``positions`` and ``velocities`` are ``(N, 3)``, ``colors`` is
+        ``(N, 4)`` (RGB rows get an alpha of 1). Missing velocities are zero.
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        n = len(positions)
+        if not n:
+            return np.zeros(0, dtype=np.int64)
+        colors = np.asarray(colors, dtype=float).reshape(n, -1)
+        if colors.shape[1] == 3:
+            colors = np.hstack([colors, np.ones((n, 1))])
+        start = self._count
+        self._reserve(start + n)
+        rows = slice(start, start + n)
+        self._positions[rows] = positions
+        self._velocities[rows] = 0.0 if velocities is None else np.reshape(velocities, (n, 3))
+        self._masses[rows] = np.broadcast_to(np.asarray(masses, dtype=float), (n,))
+        self._radii[rows] = np.broadcast_to(np.asarray(radii, dtype=float), (n,))
+        self._colors[rows] = colors
+        ids = np.arange(self._next_id, self._next_id + n, dtype=np.int64)
+        self._ids[rows] = ids
+        self._rows.update(zip(ids.tolist(), range(start, start + n)))
+        self._next_id += n
+        self._count += n
+        self.version += 1
+        return ids
+
+    def remove(self, object_id):
+        self.remove_many([object_id])
+
+    def remove_many(self, ids):
+        """Remove objects by ID, filling each hole with the last row.
+
+        Unknown IDs raise KeyError before anything is removed.
+        """
+        ids = [int(i) for i in np.atleast_1d(ids)]
+        self._rows_of(ids)
+        for object_id in dict.fromkeys(ids):
+            row = self._rows.pop(object_id)
+            last = self._count - 1
+            if row != last:
+                for array in (
+                    self._positions,
+                    self._velocities,
+                    self._masses,
+                    self._radii,
+                    self._colors,
+                    self._ids,
+                ):
+                    array[row] = array[last]
+                self._rows[int(self._ids[row])] = row
+            self._count = last
+        if ids:
+            self.version += 1
+
+    def update_many(
+        self, ids, positions=None, velocities=None, masses=None, radii=None, colors=None
+    ):
+        """Overwrite properties of the objects ``ids``; others are untouched.
+
+        Each given array must broadcast to one row per ID.
+        """
+        rows = self._rows_of(ids)
+        n = len(rows)
+        if positions is not None:
+            self._positions[rows] = np.broadcast_to(np.asarray(positions, dtype=float), (n, 3))
+        if velocities is not None:
+            self._velocities[rows] = np.broadcast_to(np.asarray(velocities, dtype=float), (n, 3))
+        if masses is not None:
+            self._masses[rows] = np.broadcast_to(np.asarray(masses, dtype=float), (n,))
+        if radii is not None:
+            self._radii[rows] = np.broadcast_to(np.asarray(radii, dtype=float), (n,))
+        if colors is not None:
+            colors = np.asarray(colors, dtype=float)
+            if colors.shape[-1] == 3:
+                colors = np.concatenate([colors, np.ones(colors.shape[:-1] + (1,))], axis=-1)
+            self._colors[rows] = np.broadcast_to(colors, (n, 4))
+        self.version += 1
+
+    def clear(self):
+        self._rows.clear()
+        self._count = 0
+        self.version += 1
+
+    def get(self, object_id):
+        """Return a :class:`space_object.SpaceObject` view of ``object_id``."""
+        from space_object import SpaceObject
+
+        self.row(object_id)
+        return SpaceObject.view(self, object_id)
+
+    def __contains__(self, object_id):
+        return object_id in self._rows
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return (self.get(int(i)) for i in self.ids.tolist())
+
+    def __getitem__(self, row):
+        """Return a view of the object in ``row`` (list-style indexing)."""
+        if row < 0:
+            row += self._count
+        if not 0 <= row < self._count:
+            raise IndexError("object row out of range")
+        return self.get(int(self._ids[row]))
+
+    def __delitem__(self, row):
+        self.remove(self[row].id)
+
+    def append(self, obj):
+        """Copy a :class:`space_object.SpaceObject` in; returns its new ID."""
+        p, v = obj.position, obj.velocity
+        return self.add(
+            (p.x(), p.y(), p.z()), obj.radius, obj.color, obj.mass, (v.x(), v.y(), v.z())
+        )
@@ -0,0 +1,226 @@
+"""Barnes–Hut octree for approximating forces from many objects.
+
+Objects are sorted into an octree whose nodes store their total mass and
+centre of mass. When displacing a vertex, a node whose edge length ``s``
+seen from distance ``d`` satisfies ``s / d < theta`` is treated as a single
+object at its centre of mass; otherwise its children are visited. This is
+exact for formulas linear in ``m`` when clusters are far away and reduces
+the cost per vertex from O(objects) to roughly O(log objects).
+
+Run ``python octree.py`` for a small benchmark against exact summation.
+"""
+
+import time
+
+import numpy as np
+
+from displacement import accumulate_pairs
+
+# Subdivision stops here even if a node still holds several objects
+MAX_DEPTH = 20
+# Vertices traversed together; bounds the size of the pair frontier
+VERTEX_CHUNK = 4096
+
+_OCTANTS = np.array(
+    [(dx, dy, dz) for dz in (0, 1) for dy in (0, 1) for dx in (0, 1)], dtype=float
+)
+
+
+class Octree:
+    """Octree over object positions with per-node mass and centre of mass."""
+
+    def __init__(self, positions, masses, leaf_size=1):
+        self.positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        self.masses = np.asarray(masses, dtype=float).reshape(-1)
+        self.leaf_size = leaf_size
+        self._centers = []
+        self._mass = []
+        self._size = []
+        self._children = []
+        self._start = []
+        self._count = []
+        self._order = []
+        if len(self.positions):
+            lo = self.positions.min(axis=0)
+            hi = self.positions.max(axis=0)
+            size = max(float((hi - lo).max()), 1e-12)
+            self._build(np.arange(len(self.positions)), lo, size, 0)
+        self.center_of_mass = np.array(self._centers).reshape(-1, 3)
+        self.node_mass = np.array(self._mass, dtype=float)
+        self.node_size = np.array(self._size, dtype=float)
+        self.children = np.array(self._children, dtype=int).reshape(-1, 8)
+        self.body_start = np.array(self._start, dtype=int)
+        self.body_count = np.array(self._count, dtype=int)
+        self.order = np.array(self._order, dtype=int)
+        self.is_leaf = (self.children < 0).all(axis=1)
+
+    def refit(self, positions):
+        """Move the bodies to ``positions``, keeping the tree's nodes.
+
+        Node masses and centres of mass are recomputed from the bodies each
+        node held when built; node sizes are not. Bodies that drift further
+        than a small fraction of their leaf size make the opening test less
+        accurate, so the caller rebuilds the tree once they have.
+        """
+        self.positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        if not len(self.node_mass):
+            return
+        # Each node's bodies are a contiguous run of ``order``, so their sums
+        # are differences of prefix sums
+        bodies = self.positions[self.order]
+        masses = self.masses[self.order]
+        prefix = np.zeros((len(bodies) + 1, 6))
+        np.cumsum(np.hstack([bodies * masses[:, None], bodies]), axis=0, out=prefix[1:])
+        ends = self.body_start + self.body_count
+        sums = prefix[ends] - prefix[self.body_start]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            centers = sums[:, :3] / self.node_mass[:, None]
+            means = sums[:, 3:] / self.body_count[:, None]
+        self.center_of_mass = np.where(self.node_mass[:, None] != 0, centers, means)
+
+    def __len__(self):
+        """Number of nodes in the tree."""
+        return len(self.node_mass)
+
+    def _build(self, bodies, corner, size, depth):
+        node = len(self._mass)
+        self._centers.append(None)
+        self._mass.append(0.0)
+        self._size.append(size)
+        self._children.append([-1] * 8)
+        self._start.append(len(self._order))
+        self._count.append(0)
+        if len(bodies) <= self.leaf_size or depth >= MAX_DEPTH:
+            self._order.extend(bodies.tolist())
+        else:
+            half = size / 2
+            octant = (
+                (self.positions[bodies] >= corner + half).astype(int) * (1, 2, 4)
+            ).sum(axis=1)
+            for k in range(8):
+                sub = bodies[octant == k]
+                if len(sub):
+                    self._children[node][k] = self._build(
+                        sub, corner + _OCTANTS[k] * half, half, depth + 1
+                    )
+        start = self._start[node]
+        self._count[node] = len(self._order) - start
+        members = np.array(self._order[start:], dtype=int)
+        mass = self.masses[members]
+        total = mass.sum()
+        if total:
+            center = (self.positions[members] * mass[:, None]).sum(axis=0) / total
+        else:
+            center = self.positions[members].mean(axis=0)
+        self._centers[node] = center
+        self._mass[node] = total
+        return node
+
+    def displacement(self, vertices, evaluate, scaling, theta=0.5):
+        """Return the summed ``value * scaling * r_unit`` for each vertex.
+
+        Subtracting the result from ``vertices`` matches the exact
+        displacement in :func:`displacement.displace_vertices` as ``theta``
+        approaches 0.
+        """
+        vertices = np.asarray(vertices, dtype=float).reshape(-1, 3)
+        total = np.zeros_like(vertices)
+        if not len(self) or not scaling:
+            return total
+        for start in range(0, len(vertices), VERTEX_CHUNK):
+            chunk = vertices[start : start + VERTEX_CHUNK]
+            total[start : start + VERTEX_CHUNK] = self._chunk_displacement(
+                chunk, evaluate, scaling, theta
+            )
+        return total
+
+    def _chunk_displacement(self, vertices, evaluate, scaling, theta):
+        total = np.zeros_like(vertices)
+        vertex = np.arange(len(vertices))
+        node = np.zeros(len(vertices), dtype=int)
+        while len(vertex):
+            r_vec = vertices[vertex] - self.center_of_mass[node]
+            r = np.sqrt(np.einsum("nk,nk->n", r_vec, r_vec))
+            single = self.is_leaf[node] & (self.body_count[node] == 1)
+            far = self.node_size[node] < theta * r
+            accept = single | far
+            accumulate_pairs(
+                total,
+                vertex[accept],
+                r_vec[accept],
+                r[accept],
+                self.node_mass[node[accept]],
+                evaluate,
+                scaling,
+            )
+
+            # Leaves holding several objects are summed exactly
+            split = self.is_leaf[node] & ~accept
+            if split.any():
+                counts = self.body_count[node[split]]
+                pair_vertex = np.repeat(vertex[split], counts)
+                offsets = np.arange(counts.sum()) - np.repeat(
+                    np.cumsum(counts) - counts, counts
+                )
+                first = np.repeat(self.body_start[node[split]], counts)
+                bodies = self.order[first + offsets]
+                body_vec = vertices[pair_vertex] - self.positions[bodies]
+                accumulate_pairs(
+                    total,
+                    pair_vertex,
+                    body_vec,
+                    np.sqrt(np.einsum("nk,nk->n", body_vec, body_vec)),
+                    self.masses[bodies],
+                    evaluate,
+                    scaling,
+                )
+
+            opened = ~self.is_leaf[node] & ~accept
+            children = self.children[node[opened]]
+            keep = children >= 0
+            vertex = np.repeat(vertex[opened], keep.sum(axis=1))
+            node = children[keep]
+        return total
+
+
+def benchmark(object_counts=(10, 100, 1000, 10000), vertices=2000, theta=0.5, seed=0):
+    """Time exact summation against the octree for growing object counts.
+
+    Returns a list of dicts with microseconds per vertex for each method.
+    """
+    from displacement import displace_vertices
+
+    rng = np.random.default_rng(seed)
+    points = rng.random((vertices, 3))
+    gravity = lambda r, m: m / (r * r)
+    results = []
+    for count in object_counts:
+        positions = rng.random((count, 3))
+        masses = rng.random(count)
+        t0 = time.perf_counter()
+        exact = displace_vertices(points, positions, masses, [(gravity, 1e-6)], clamp=False)
+        t1 = time.perf_counter()
+        tree = Octree(positions, masses)
+        t2 = time.perf_counter()
+        approx = points - tree.displacement(points, gravity, 1e-6, theta)
+        t3 = time.perf_counter()
+        error = np.abs(exact - approx).max()
+        results.append(
+            {
+                "objects": count,
+                "exact_us_per_vertex": (t1 - t0) / vertices * 1e6,
+                "tree_us_per_vertex": (t3 - t2) / vertices * 1e6,
+                "tree_build_ms": (t2 - t1) * 1e3,
+                "max_error": float(error),
+            }
+        )
+    return results
+
+
+if __name__ == "__main__":
+    for row in benchmark():
+        print(
+            f"{row['objects']:>6} objects: exact {row['exact_us_per_vertex']:9.2f} us/vertex, "
+            f"tree {row['tree_us_per_vertex']:7.2f} us/vertex "
+            f"(build {row['tree_build_ms']:.1f} ms, max error {row['max_error']:.2e})"
+        )
@@ -0,0 +1,187 @@
+"""Per-frame timing and counters for the render loop.
+
+A :class:`FrameProfiler` records how long each named stage of a frame took
+and how much work it did (vertices, formula evaluations, objects). Stages
+nest and are timed exclusively: a stage's time excludes any stages opened
+inside it, so the breakdown of a frame adds up to its total. The last
+``window`` frames are kept for rolling statistics.
+
+Stages may be recorded from several threads (such as a background
+simulation worker); each thread nests its own stages. While disabled every
+method returns immediately, so instrumented code costs a few attribute
+lookups per call.
+"""
+
+import collections
+import contextlib
+import threading
+import time
+
+import numpy as np
+
+_NULL_STAGE = contextlib.nullcontext()
+
+
+class _Stage:
+    """Context manager timing one stage of the current frame."""
+
+    __slots__ = ("profiler", "name", "start", "children")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.children = 0.0
+        self.profiler._stack().append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stack = self.profiler._stack()
+        stack.pop()
+        if stack:
+            stack[-1].children += elapsed
+        self.profiler._add(self.profiler._stages, self.name, elapsed - self.children)
+        return False
+
+
+class FrameProfiler:
+    """Rolling per-frame stage timings and work counters."""
+
+    def __init__(self, window=240, enabled=False):
+        self.enabled = enabled
+        self.frames = collections.deque(maxlen=window)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+        self._frame_start = None
+
+    def reset(self):
+        """Forget every recorded frame."""
+        self.frames.clear()
+        self._local = threading.local()
+        self._stages = {}
+        self._counters = {}
+        self._frame_start = None
+
+    def _stack(self):
+        """Return the open stages of the calling thread."""
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _add(self, table, name, amount):
+        with self._lock:
+            table[name] = table.get(name, 0) + amount
+
+    def begin_frame(self):
+        if self.enabled:
+            self._frame_start = time.perf_counter()
+
+    def end_frame(self):
+        """Close the current frame and add it to the rolling window.
+
+        Stages and counters recorded since the previous frame ended (such
+        as a simulation step run from a timer) belong to this frame.
+        """
+        if not self.enabled or self._frame_start is None:
+            return
+        end = time.perf_counter()
+        with self._lock:
+            self.frames.append(
+                {
+                    "start": self._frame_start,
+                    "seconds": end - self._frame_start,
+                    "stages": self._stages,
+                    "counters": self._counters,
+                }
+            )
+            self._stages = {}
+            self._counters = {}
+        self._frame_start = None
+
+    def stage(self, name):
+        """Return a context manager timing the stage ``name``."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def count(self, name, amount=1):
+        """Add ``amount`` to the counter ``name`` of the current frame."""
+        if self.enabled:
+            self._add(self._counters, name, amount)
+
+    def stats(self):
+        """Return statistics over the frames in the window.
+
+        Times are in milliseconds: ``frame_ms`` has the mean, p50, p99 and
+        max paint time, ``fps`` is measured from frame start times,
+        ``stages`` holds the mean time of each stage per frame and
+        ``counters`` the mean of each counter per frame.
+        """
+        with self._lock:
+            frames = list(self.frames)
+        if not frames:
+            return {"frames": 0, "frame_ms": {}, "fps": 0.0, "stages": {}, "counters": {}}
+        times = np.array([frame["seconds"] for frame in frames]) * 1e3
+        span = frames[-1]["start"] - frames[0]["start"]
+        stages, counters = collections.Counter(), collections.Counter()
+        for frame in frames:
+            stages.update(frame["stages"])
+            counters.update(frame["counters"])
+        return {
+            "frames": len(frames),
+            "frame_ms": {
+                "mean": float(times.mean()),
+                "p50": float(np.percentile(times, 50)),
+                "p99": float(np.percentile(times, 99)),
+                "max": float(times.max()),
+            },
+            "fps": (len(frames) - 1) / span if span > 0 else 0.0,
+            "stages": {
+                name: total * 1e3 / len(frames) for name, total in sorted(stages.items())
+            },
+            "counters": {
+                name: total / len(frames) for name, total in sorted(counters.items())
+            },
+        }
+
+    def summary_lines(self):
+        """Return the statistics as short text lines for an overlay."""
+        stats = self.stats()
+        if not stats["frames"]:
+            return ["collecting frame stats..."]
+        frame = stats["frame_ms"]
+        lines = [
+            f"frame {frame['mean']:.2f} ms  p50 {frame['p50']:.2f}  "
+            f"p99 {frame['p99']:.2f}  {stats['fps']:.0f} fps"
+        ]
+        for name, ms in sorted(stats["stages"].items(), key=lambda item: -item[1]):
+            lines.append(f"  {name:<14}{ms:8.2f} ms")
+        for name, value in stats["counters"].items():
+            lines.append(f"  {name:<20}{value:10.0f}")
+        return lines
+
+
+class ProfiledFormula:
+    """Wrap a force evaluator to time and count its evaluations.
+
+    Attributes such as ``constant`` and ``linear_in_mass`` are forwarded so
+    the displacement engine treats the wrapper like the original.
+    """
+
+    def __init__(self, evaluate, profiler):
+        self._evaluate = evaluate
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._evaluate, name)
+
+    def __call__(self, r, m):
+        with self._profiler.stage("formula"):
+            self._profiler.count("formula_evaluations", np.broadcast(r, m).size)
+            return self._evaluate(r, m)
@@ -0,0 +1,182 @@
+"""The 3D grid as one lattice of shared vertices drawn through an index buffer.
+
+Sampling the x, y and z line families separately puts a vertex on every
+line at each crossing, displacing it up to three times. :func:`lattice_lines`
+instead samples every line at the crossings (shared by all lines through
+them) plus evenly spaced points in between (owned by one line), and
+returns ``GL_LINES`` indices joining each line's vertices in order.
+:func:`lattice_samples` returns the same lattice as samples along each
+line, the starting point of adaptive refinement (see
+:func:`adaptive_lines.subdivide_lines`).
+
+The 3D force grid marks the crossings on the lattice planes through index
+0. These come first among the vertices, so force layers can be displaced
+on them alone (see :func:`crossing_segments`).
+"""
+
+import numpy as np
+
+
+def lattice_lines(density, translation, pieces=1):
+    """Return ``(vertices, indices)`` of the 3D grid lines.
+
+    See :func:`lattice_samples` for the lattice. ``vertices`` is a
+    ``(V, 3)`` array with every crossing once, and ``indices`` a
+    ``uint32`` array of ``GL_LINES`` pairs into it.
+    """
+    vertices, _, _, line, _, vertex = lattice_samples(density, translation, pieces)
+    left = np.flatnonzero(line[:-1] == line[1:])
+    indices = np.stack([vertex[left], vertex[left + 1]], axis=1).reshape(-1)
+    return vertices, indices.astype(np.uint32)
+
+
+def lattice_crossings(density, translation):
+    """Return the ``((density - 1)³, 3)`` crossings of the 3D lattice.
+
+    They are ordered like the first vertices of :func:`lattice_samples`:
+    the :func:`plane_crossings` on a lattice plane through index 0 first,
+    then the others.
+    """
+    cells = density - 1
+    translation = np.asarray(translation, dtype=float).reshape(3)
+    lattice = (np.arange(cells)[None, :] * (1.0 / cells) + translation[:, None]) % 1.0
+    x, y, z = np.meshgrid(*lattice, indexing="ij")
+    crossings = np.stack([x.ravel(), y.ravel(), z.ravel()], axis=1)
+    return crossings[_crossing_order(cells)]
+
+
+def plane_crossings(density):
+    """Return how many crossings lie on a lattice plane through index 0."""
+    cells = density - 1
+    return cells**3 - (cells - 1) ** 3
+
+
+def crossing_segments(density):
+    """Return ``GL_LINES`` indices of the 3D force grid into the crossings.
+
+    The force grid has a segment per axis and pair of transverse lattice
+    indices ``0 … density - 1``, running once around the box along its
+    axis. Its ends wrap onto the same crossing, index 0 along the axis
+    and the duplicate index ``density - 1`` wrapping onto 0 across it, so
+    only the :func:`plane_crossings` are used.
+    """
+    cells = density - 1
+    crossing_ids = _crossing_ids(cells)
+    a, b = (
+        grid.ravel() % cells
+        for grid in np.meshgrid(np.arange(density), np.arange(density), indexing="ij")
+    )
+    ids = []
+    for axis in range(3):
+        u, v = [k for k in range(3) if k != axis]
+        index = np.empty((3, len(a)), dtype=np.int64)
+        index[axis] = 0
+        index[u] = a
+        index[v] = b
+        ids.append(crossing_ids[tuple(index)])
+    return np.repeat(np.concatenate(ids), 2).astype(np.uint32)
+
+
+def _crossing_order(cells):
+    """Return the lattice indices (raveled) of the crossings in vertex order."""
+    i, j, k = np.meshgrid(*[np.arange(cells)] * 3, indexing="ij")
+    off_plane = ((i > 0) & (j > 0) & (k > 0)).ravel()
+    return np.argsort(off_plane, kind="stable")
+
+
+def _crossing_ids(cells):
+    """Return the vertex index of each crossing by lattice index."""
+    ids = np.empty(cells**3, dtype=np.int64)
+    ids[_crossing_order(cells)] = np.arange(cells**3)
+    return ids.reshape(cells, cells, cells)
+
+
+def lattice_samples(density, translation, pieces=1):
+    """Return the 3D grid lines as samples sharing the lattice crossings.
+
+    The lattice has ``density`` lines per axis, spaced ``1 / (density - 1)``
+    apart and shifted by ``translation`` (wrapping around the unit box). A
+    line runs from face to face of the box along its own axis and is split
+    into ``pieces`` segments between consecutive crossings. Lines whose
+    transverse lattice index is 0 on both axes lie on the box edges when
+    the grid is at rest and are left out, like the duplicate lattice
+    index ``density - 1``, which wraps onto index 0.
+
+    Returns ``(vertices, starts, ends, line, t, vertex)``. ``vertices`` is
+    a ``(V, 3)`` array starting with the :func:`lattice_crossings`, and
+    ``starts``/``ends`` hold the face-to-face endpoints of every line. Per
+    sample, sorted by line and then along it, ``line`` is the line index,
+    ``t`` the line parameter and ``vertex`` the index into ``vertices``.
+    """
+    cells = density - 1
+    step = 1.0 / cells
+    translation = np.asarray(translation, dtype=float).reshape(3)
+    # Lattice coordinates along each axis; crossings sit on these
+    lattice = (np.arange(cells)[None, :] * step + translation[:, None]) % 1.0
+    crossing_ids = _crossing_ids(cells)
+    vertices = [lattice_crossings(density, translation)]
+    starts, ends, samples, params, lengths = [], [], [], [], []
+    count = cells**3
+    a, b = (grid.ravel()[1:] for grid in np.meshgrid(np.arange(cells), np.arange(cells), indexing="ij"))
+    for axis in range(3):
+        u, v = [k for k in range(3) if k != axis]
+        along, crossing = _axis_samples(cells, step, pieces, translation[axis])
+        own = crossing < 0
+        lines = len(a)
+        # Vertex ids of each line's samples in order along the axis
+        ids = np.empty((lines, len(along)), dtype=np.int64)
+        lattice_index = np.empty((3, lines, int((~own).sum())), dtype=np.int64)
+        lattice_index[axis] = crossing[~own][None, :]
+        lattice_index[u] = a[:, None]
+        lattice_index[v] = b[:, None]
+        ids[:, ~own] = crossing_ids[tuple(lattice_index)]
+        owned = int(own.sum())
+        ids[:, own] = count + np.arange(lines * owned).reshape(lines, owned)
+        count += lines * owned
+        points = np.empty((lines, owned, 3))
+        points[:, :, axis] = along[own][None, :]
+        points[:, :, u] = lattice[u][a][:, None]
+        points[:, :, v] = lattice[v][b][:, None]
+        vertices.append(points.reshape(-1, 3))
+        start = np.zeros((lines, 3))
+        start[:, u] = lattice[u][a]
+        start[:, v] = lattice[v][b]
+        end = start.copy()
+        end[:, axis] = 1.0
+        starts.append(start)
+        ends.append(end)
+        samples.append(ids.reshape(-1))
+        params.append(np.tile(along, lines))
+        lengths.append(np.full(lines, len(along)))
+    line = np.repeat(np.arange(3 * len(a)), np.concatenate(lengths))
+    return (
+        np.concatenate(vertices),
+        np.concatenate(starts),
+        np.concatenate(ends),
+        line,
+        np.concatenate(params),
+        np.concatenate(samples),
+    )
+
+
+def _axis_samples(cells, step, pieces, shift):
+    """Return sorted sample coordinates along one axis and their crossings.
+
+    Samples are the box faces 0 and 1 plus ``pieces`` evenly spaced points
+    per lattice cell, shifted by ``shift``. ``crossing`` holds the lattice
+    index of samples that lie on a crossing and -1 elsewhere.
+    """
+    j = np.arange(cells * pieces)
+    # Computed like the lattice coordinates so crossings match exactly
+    shifted = ((j // pieces) * step + (j % pieces) * (step / pieces) + shift) % 1.0
+    crossing = np.where(j % pieces == 0, j // pieces, -1)
+    faces = np.array([0.0, 1.0])
+    faces = faces[~np.isin(faces, shifted[crossing >= 0])]
+    along = np.concatenate([shifted, faces])
+    crossing = np.concatenate([crossing, np.full(len(faces), -1)])
+    order = np.argsort(along, kind="stable")
+    along, crossing = along[order], crossing[order]
+    # A face coinciding with an owned sample is dropped as well
+    keep = np.ones(len(along), dtype=bool)
+    keep[1:] = along[1:] != along[:-1]
+    return along[keep], crossing[keep]
@@ -0,0 +1,247 @@
+"""Fixed-timestep simulation and geometry building off the GUI thread.
+
+:class:`SimulationWorker` advances the visualizer's simulation in steps of
+exactly ``dt`` seconds, catching up on real elapsed time with an
+accumulator, and rebuilds the grid layers whose inputs changed. Finished
+vertex arrays are published through :class:`LayerFrames`, a pair of
+buffers: the worker fills the back buffer while ``paintGL`` uploads from
+the front one, and the two are swapped once a frame is complete. The GUI
+thread then only uploads and draws, so dragging the view or opening a
+dialog never waits for a slow geometry build.
+
+The worker holds the visualizer's ``state_lock`` only for one simulation
+step at a time and to snapshot the inputs of dirty layers (see
+:class:`PreparedBuild`); the geometry is built without the lock, so edits
+from the GUI thread never wait for a build either. A frame whose inputs
+changed while it was being built is dropped and built again.
+"""
+
+import contextlib
+import threading
+import time
+
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from geometry_cache import GeometryCache
+
+# Longest stretch of real time simulated after a stall; the rest is dropped
+# rather than replayed as a burst of steps
+MAX_CATCH_UP_SECONDS = 0.25
+# Wall-clock time, in frames of dt, spent catching up per pass; steps still
+# due after it are dropped, so slow steps cannot pile up a backlog
+CATCH_UP_FRAMES = 1
+
+
+class PreparedBuild:
+    """A layer build split into a snapshot and a computation.
+
+    ``prepare()`` reads the visualizer's state and returns a callable that
+    computes ``(vertices, indices, colors)`` from that snapshot alone.
+    Calling the build does both at once.
+    """
+
+    def __init__(self, prepare):
+        self.prepare = prepare
+
+    def __call__(self):
+        return self.prepare()()
+
+
+class LayerData:
+    """Vertex arrays of one layer, reused across frames when shapes match."""
+
+    def __init__(self):
+        self.mode = None
+        self.version = -1
+        self.vertices = None
+        self.indices = None
+        self.colors = None
+
+    def assign(self, mode, version, vertices, indices=None, colors=None):
+        self.mode = mode
+        self.version = version
+        self.vertices = self._copy(self.vertices, vertices, np.float32)
+        self.indices = self._copy(self.indices, indices, np.uint32)
+        self.colors = self._copy(self.colors, colors, np.float32)
+
+    @staticmethod
+    def _copy(target, source, dtype):
+        if source is None:
+            return None
+        source = np.asarray(source)
+        if target is not None and target.shape == source.shape:
+            np.copyto(target, source, casting="unsafe")
+            return target
+        return np.array(source, dtype=dtype)
+
+
+class LayerFrames:
+    """Double-buffered layer geometry shared by the worker and ``paintGL``.
+
+    Each buffer maps layer names, in drawing order, to :class:`LayerData`.
+    """
+
+    def __init__(self):
+        self._front = {}
+        self._back = {}
+        self._lock = threading.Lock()
+        # Number of frames published so far
+        self.generation = 0
+
+    @contextlib.contextmanager
+    def reading(self):
+        """Hold the front buffer so it is not swapped while being uploaded."""
+        with self._lock:
+            yield self._front
+
+    def back(self):
+        """Return the back buffer; only the worker may write to it."""
+        return self._back
+
+    def front(self):
+        """Return the front buffer for reading outside :meth:`reading`."""
+        return self._front
+
+    def publish(self, layers):
+        """Make ``layers`` (the filled back buffer) the front buffer."""
+        with self._lock:
+            self._back, self._front = self._front, layers
+            self.generation += 1
+
+
+class SimulationWorker(QThread):
+    """Steps the simulation at a fixed rate and builds layer geometry.
+
+    While the worker runs, the visualizer draws from ``frames`` instead of
+    building layers itself. ``frame_ready`` is emitted after every publish
+    and whenever a step moved objects or the grid; connect it to the
+    visualizer's ``update``.
+    """
+
+    frame_ready = pyqtSignal()
+
+    def __init__(self, visualizer, dt=1 / 60, parent=None):
+        super().__init__(parent)
+        self.visualizer = visualizer
+        self.dt = dt
+        self.paused = False
+        self.frames = LayerFrames()
+        self.cache = GeometryCache()
+        self._versions = {}
+        self._stop = threading.Event()
+        # Simulation steps taken, for diagnostics
+        self.steps = 0
+
+    def start(self, *args):
+        self.visualizer.frame_buffers = self.frames
+        super().start(*args)
+
+    def stop(self):
+        """Stop the thread, wait for it and return drawing to the GUI thread."""
+        self._stop.set()
+        self.wait()
+        self.visualizer.frame_buffers = None
+        self.visualizer.geometry_cache.invalidate()
+
+    def run(self):
+        last = time.perf_counter()
+        accumulator = 0.0
+        while not self._stop.is_set():
+            now = time.perf_counter()
+            if self.paused:
+                accumulator = 0.0
+            else:
+                accumulator += min(now - last, MAX_CATCH_UP_SECONDS)
+            last = now
+            with self.visualizer.state_lock:
+                before = self._simulation_state()
+            deadline = now + CATCH_UP_FRAMES * self.dt
+            while accumulator >= self.dt:
+                if time.perf_counter() > deadline:
+                    # Steps are slower than real time; drop the backlog
+                    accumulator = 0.0
+                    break
+                # Released between steps so GUI edits and paints get in
+                with self.visualizer.state_lock:
+                    self.visualizer.advance_simulation(self.dt)
+                accumulator -= self.dt
+                self.steps += 1
+            with self.visualizer.state_lock:
+                # Layers drawn on the GPU are not built here but still move
+                moved = self._simulation_state() != before
+                plan = self._plan_layers()
+            layers = self._build_layers(plan) if plan is not None else None
+            if layers is not None:
+                self.frames.publish(layers)
+            if layers is not None or moved:
+                self.frame_ready.emit()
+            self._stop.wait(max(0.0, self.dt - accumulator))
+
+    def _simulation_state(self):
+        visualizer = self.visualizer
+        return visualizer.objects.key(), visualizer.grid_translation
+
+    def _plan_layers(self):
+        """Snapshot the layers to rebuild; return ``(specs, builds)`` or None.
+
+        Called with ``state_lock`` held. ``builds`` maps every changed
+        layer to a callable computing its geometry without the lock; None
+        means no layer changed.
+        """
+        specs = self.visualizer._layer_specs()
+        front = self.frames.front()
+        names = [spec[0] for spec in specs]
+        for name in set(front) - set(names):
+            self.cache.invalidate(name)
+        dirty = [
+            name for name, _, key, _ in specs if not self.cache.is_current(name, key)
+        ]
+        if not dirty and names == list(front):
+            return None
+        builds = {}
+        for name, _, _, build in specs:
+            if name not in dirty:
+                continue
+            if isinstance(build, PreparedBuild):
+                builds[name] = build.prepare()
+            else:
+                # Cheap layers are built right away
+                geometry = build()
+                builds[name] = lambda geometry=geometry: geometry
+        return specs, builds
+
+    def _build_layers(self, plan):
+        """Build the planned layers and fill the back buffer.
+
+        Returns the back buffer, or None if the layers' keys changed
+        during the build; the result is then dropped and the changed
+        layers are planned again.
+        """
+        specs, builds = plan
+        geometry = {name: build() for name, build in builds.items()}
+        with self.visualizer.state_lock:
+            current = [(spec[0], spec[2]) for spec in self.visualizer._layer_specs()]
+        if current != [(spec[0], spec[2]) for spec in specs]:
+            return None
+        front = self.frames.front()
+        back = self.frames.back()
+        layers = {}
+        for name, mode, key, _ in specs:
+            layer = back.get(name) or LayerData()
+            if name in geometry:
+                version = self._versions.get(name, 0) + 1
+                self._versions[name] = version
+                layer.assign(mode, version, *geometry[name])
+                self.cache.store(name, key)
+            elif layer.version != front[name].version:
+                source = front[name]
+                layer.assign(
+                    source.mode,
+                    source.version,
+                    source.vertices,
+                    source.indices,
+                    source.colors,
+                )
+            layers[name] = layer
+        return layers
@@ -1,11 +1,119 @@
 # space_object.py
 from PyQt5.QtGui import QVector3D
 
+from object_store import ObjectStore
+
+
+class _StoredVector(QVector3D):
+    """Copy of a position or velocity whose ``setX/Y/Z`` write back to the store.
+
+    Keeps code like ``obj.position.setX(0.5)`` working on store views.
+    Other in-place ``QVector3D`` methods only change the copy.
+    """
+
+    def __init__(self, obj, column, values):
+        super().__init__(*values)
+        self._object = obj
+        self._column = column
+
+    def _write_back(self):
+        self._object.store.update_many(
+            [self._object.id], **{self._column: (self.x(), self.y(), self.z())}
+        )
+
+    def setX(self, x):
+        super().setX(x)
+        self._write_back()
+
+    def setY(self, y):
+        super().setY(y)
+        self._write_back()
+
+    def setZ(self, z):
+        super().setZ(z)
+        self._write_back()
+
+
 class SpaceObject:
+    """View of one object in an :class:`ObjectStore`.
+
+    Reading an attribute copies the value out of the store and assigning
+    one writes it back. ``obj.position.setX(...)`` (and ``setY``/``setZ``,
+    also on ``velocity``) write through as well; other in-place vector
+    methods only change the copy. Constructing a ``SpaceObject`` directly
+    creates a standalone object backed by its own one-row store.
+    """
+
+    __slots__ = ("store", "id")
+
     def __init__(self, position, radius, color, mass=1.0, velocity=None):
-        self.position = position
-        self.radius = radius
-        self.color = color
-        self.mass = mass
-        # Store velocity as a QVector3D. Defaults to zero velocity.
-        self.velocity = velocity if velocity is not None else QVector3D(0.0, 0.0, 0.0)
+        # Defaults to zero velocity
+        velocity = velocity if velocity is not None else QVector3D(0.0, 0.0, 0.0)
+        self.store = ObjectStore(capacity=1)
+        self.id = self.store.add(
+            (position.x(), position.y(), position.z()),
+            radius,
+            color,
+            mass,
+            (velocity.x(), velocity.y(), velocity.z()),
+        )
+
+    @classmethod
+    def view(cls, store, object_id):
+        obj = cls.__new__(cls)
+        obj.store = store
+        obj.id = object_id
+        return obj
+
+    def _row(self):
+        return self.store.row(self.id)
+
+    @property
+    def position(self):
+        return _StoredVector(self, "positions", self.store.positions[self._row()])
+
+    @position.setter
+    def position(self, value):
+        self.store.update_many([self.id], positions=(value.x(), value.y(), value.z()))
+
+    @property
+    def velocity(self):
+        return _StoredVector(self, "velocities", self.store.velocities[self._row()])
+
+    @velocity.setter
+    def velocity(self, value):
+        self.store.update_many([self.id], velocities=(value.x(), value.y(), value.z()))
+
+    @property
+    def mass(self):
+        return float(self.store.masses[self._row()])
+
+    @mass.setter
+    def mass(self, value):
+        self.store.update_many([self.id], masses=value)
+
+    @property
+    def radius(self):
+        return float(self.store.radii[self._row()])
+
+    @radius.setter
+    def radius(self, value):
+        self.store.update_many([self.id], radii=value)
+
+    @property
+    def color(self):
+        return tuple(self.store.colors[self._row()].tolist())
+
+    @color.setter
+    def color(self, value):
+        self.store.update_many([self.id], colors=value)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, SpaceObject)
+            and self.store is other.store
+            and self.id == other.id
+        )
+
+    def __hash__(self):
+        return hash((id(self.store), self.id))
@@ -1,46 +1,242 @@
-"""Simple multidimensional grid container without external dependencies."""
+"""Multidimensional grid container backed by contiguous NumPy arrays.
+
+Grids can live in memory (dense, or block-sparse with ``sparse=True``) or,
+when created with ``path``, in memory-mapped ``.npy`` files on disk. Disk-backed files are stored with the ``w`` and
+``t`` axes outermost so every (w, t) slice is one contiguous run of pages;
+the files are created sparse and pages are only allocated and read when a
+slice is touched.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from sparse_grid import BlockSparseArray
+
+_META_FILE = "meta.json"
+_GRID_FILE = "grid.npy"
+_CURVATURE_FILE = "curvature.npy"
+# Axis order of the on-disk arrays relative to (x, y, z, w, t) / (x, y, z, t)
+_GRID_DISK_AXES = (3, 4, 0, 1, 2)
+_CURVATURE_DISK_AXES = (3, 0, 1, 2)
+
+
+def _resident_bytes(filename):
+    """Return bytes of ``filename`` currently mapped into RAM, if known.
+
+    Reads ``/proc/self/smaps`` so it is only available on Linux; returns
+    ``None`` elsewhere.
+    """
+    filename = os.path.realpath(filename)
+    try:
+        with open("/proc/self/smaps") as smaps:
+            lines = smaps.read().splitlines()
+    except OSError:
+        return None
+    total = 0
+    current = None
+    for line in lines:
+        fields = line.split()
+        if fields and "-" in fields[0] and not fields[0].endswith(":"):
+            # The path is everything after the inode and may hold spaces
+            current = line.split(None, 5)[5] if len(fields) >= 6 else None
+        elif fields and fields[0] == "Rss:" and current == filename:
+            total += int(fields[1]) * 1024
+    return total
 
 
 class SpaceTimeGrid:
-    def __init__(self, x_size, y_size, z_size, w_size, t_size, resolution):
+    def __init__(
+        self,
+        x_size,
+        y_size,
+        z_size,
+        w_size,
+        t_size,
+        resolution,
+        compact=False,
+        path=None,
+        sparse=False,
+        block=8,
+    ):
         self.resolution = resolution
         self.x_size = x_size
         self.y_size = y_size
         self.z_size = z_size
         self.w_size = w_size
         self.t_size = t_size
-        # Five‑dimensional grid storing complex numbers
-        self.grid = [
-            [
-                [
-                    [[0j for _ in range(t_size)] for _ in range(w_size)]
-                    for _ in range(z_size)
-                ]
-                for _ in range(y_size)
-            ]
-            for _ in range(x_size)
-        ]
-        # Four‑dimensional curvature tensor storing floats
-        self.curvature = [
-            [
-                [[0.0 for _ in range(t_size)] for _ in range(z_size)]
-                for _ in range(y_size)
-            ]
-            for _ in range(x_size)
-        ]
-    
+        # Compact mode halves memory by using single precision storage
+        self.compact = compact
+        grid_dtype = np.complex64 if compact else np.complex128
+        curvature_dtype = np.float32 if compact else np.float64
+        # Directory holding the memory-mapped files, None when in memory
+        self.path = path
+        self.sparse = sparse
+        grid_shape = (x_size, y_size, z_size, w_size, t_size)
+        curvature_shape = (x_size, y_size, z_size, t_size)
+        if sparse:
+            if path is not None:
+                raise ValueError("sparse grids cannot be memory-mapped")
+            # Only blocks holding non-zero cells are stored
+            self.grid = BlockSparseArray(grid_shape, grid_dtype, block)
+            self.curvature = BlockSparseArray(curvature_shape, curvature_dtype, block)
+            return
+        if path is None:
+            # Five‑dimensional grid storing complex numbers
+            self.grid = np.zeros(grid_shape, dtype=grid_dtype)
+            # Four‑dimensional curvature tensor storing floats
+            self.curvature = np.zeros(curvature_shape, dtype=curvature_dtype)
+            return
+
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, _META_FILE), "w") as meta:
+            json.dump(
+                {"shape": grid_shape, "resolution": resolution, "compact": compact},
+                meta,
+            )
+        grid_file = np.lib.format.open_memmap(
+            os.path.join(path, _GRID_FILE),
+            mode="w+",
+            dtype=grid_dtype,
+            shape=tuple(grid_shape[axis] for axis in _GRID_DISK_AXES),
+        )
+        curvature_file = np.lib.format.open_memmap(
+            os.path.join(path, _CURVATURE_FILE),
+            mode="w+",
+            dtype=curvature_dtype,
+            shape=tuple(curvature_shape[axis] for axis in _CURVATURE_DISK_AXES),
+        )
+        self._map_files(grid_file, curvature_file)
+
+    @classmethod
+    def open(cls, path, mode="r+"):
+        """Open a disk-backed grid previously created with ``path``.
+
+        Only the small metadata file and the ``.npy`` headers are read; the
+        data itself is mapped and paged in on access.
+        """
+        with open(os.path.join(path, _META_FILE)) as meta:
+            info = json.load(meta)
+        grid = cls.__new__(cls)
+        grid.x_size, grid.y_size, grid.z_size, grid.w_size, grid.t_size = info["shape"]
+        grid.resolution = info["resolution"]
+        grid.compact = info["compact"]
+        grid.path = path
+        grid.sparse = False
+        grid._map_files(
+            np.load(os.path.join(path, _GRID_FILE), mmap_mode=mode),
+            np.load(os.path.join(path, _CURVATURE_FILE), mmap_mode=mode),
+        )
+        return grid
+
+    def _map_files(self, grid_file, curvature_file):
+        """Expose on-disk arrays with the usual (x, y, z, w, t) axis order."""
+        self._grid_file = grid_file
+        self._curvature_file = curvature_file
+        self.grid = grid_file.transpose(np.argsort(_GRID_DISK_AXES))
+        self.curvature = curvature_file.transpose(np.argsort(_CURVATURE_DISK_AXES))
+
+    def flush(self):
+        """Write pending changes of a disk-backed grid to its files."""
+        if self.path is not None:
+            self._grid_file.flush()
+            self._curvature_file.flush()
+
     def set_point(self, x, y, z, w, t, value):
         self.grid[x, y, z, w, t] = value
-    
+
     def get_point(self, x, y, z, w, t):
         return self.grid[x, y, z, w, t]
-    
+
     def set_curvature(self, x, y, z, t, value):
         self.curvature[x, y, z, t] = value
-    
+
     def get_curvature(self, x, y, z, t):
         return self.curvature[x, y, z, t]
 
+    def get_points(self, x=slice(None), y=slice(None), z=slice(None), w=slice(None), t=slice(None)):
+        """Return the grid values selected by integer or slice indices.
+
+        For dense grids slices return views, so modifying the result writes
+        through to the grid; sparse grids return a copy.
+        """
+        return self.grid[x, y, z, w, t]
+
+    def set_points(self, value, x=slice(None), y=slice(None), z=slice(None), w=slice(None), t=slice(None)):
+        """Assign ``value`` (scalar or broadcastable array) to a region."""
+        self.grid[x, y, z, w, t] = value
+
+    def get_curvatures(self, x=slice(None), y=slice(None), z=slice(None), t=slice(None)):
+        """Return the curvature values selected by integer or slice indices."""
+        return self.curvature[x, y, z, t]
+
+    def set_curvatures(self, value, x=slice(None), y=slice(None), z=slice(None), t=slice(None)):
+        """Assign ``value`` (scalar or broadcastable array) to a region."""
+        self.curvature[x, y, z, t] = value
+
+    def populated_points(self):
+        """Yield ``((x, y, z, w, t), value)`` for every non-zero grid cell."""
+        if self.sparse:
+            yield from self.grid.items()
+            return
+        for index in zip(*np.nonzero(self.grid)):
+            index = tuple(int(i) for i in index)
+            yield index, self.grid[index]
+
+    def _copy_layout(self, sparse, block=8):
+        return SpaceTimeGrid(
+            self.x_size,
+            self.y_size,
+            self.z_size,
+            self.w_size,
+            self.t_size,
+            self.resolution,
+            compact=self.compact,
+            sparse=sparse,
+            block=block,
+        )
+
+    def to_dense(self):
+        """Return an in-memory dense copy of this grid."""
+        dense = self._copy_layout(sparse=False)
+        dense.grid[...] = np.asarray(self.grid)
+        dense.curvature[...] = np.asarray(self.curvature)
+        return dense
+
+    def to_sparse(self, block=8):
+        """Return a block-sparse copy of this grid."""
+        sparse = self._copy_layout(sparse=True, block=block)
+        sparse.grid = BlockSparseArray.from_dense(np.asarray(self.grid), block)
+        sparse.curvature = BlockSparseArray.from_dense(np.asarray(self.curvature), block)
+        return sparse
+
+    @property
+    def nbytes(self):
+        """Total bytes used by the grid and curvature storage."""
+        return self.grid.nbytes + self.curvature.nbytes
+
+    def disk_usage(self):
+        """Return ``(apparent, allocated, resident)`` byte counts on disk.
+
+        ``apparent`` is the logical file size, ``allocated`` the blocks the
+        filesystem actually holds and ``resident`` the mapped bytes currently
+        in RAM (``None`` when the platform cannot report it). Returns
+        ``None`` for in-memory grids.
+        """
+        if self.path is None:
+            return None
+        apparent = allocated = 0
+        resident = 0
+        for name in (_GRID_FILE, _CURVATURE_FILE):
+            filename = os.path.join(self.path, name)
+            stat = os.stat(filename)
+            apparent += stat.st_size
+            allocated += getattr(stat, "st_blocks", stat.st_size // 512) * 512
+            mapped = _resident_bytes(filename)
+            resident = None if resident is None or mapped is None else resident + mapped
+        return apparent, allocated, resident
+
     def print_grid_info(self):
         print(
             f"Grid dimensions: ({self.x_size}, {self.y_size}, {self.z_size}, {self.w_size}, {self.t_size})"
@@ -49,4 +245,20 @@ class SpaceTimeGrid:
             f"Curvature dimensions: ({self.x_size}, {self.y_size}, {self.z_size}, {self.t_size})"
         )
         print(f"Resolution: {self.resolution}")
-        
+        print(
+            f"Storage: {self.grid.dtype} grid, {self.curvature.dtype} curvature, "
+            f"{self.nbytes / 2**20:.1f} MiB total"
+        )
+        if self.sparse:
+            print(
+                f"Sparse blocks: {len(self.grid.blocks)} grid, "
+                f"{len(self.curvature.blocks)} curvature ({self.nbytes} bytes)"
+            )
+        usage = self.disk_usage()
+        if usage is not None:
+            apparent, allocated, resident = usage
+            resident = "unknown" if resident is None else f"{resident / 2**20:.1f} MiB"
+            print(
+                f"On disk: {self.path} ({apparent / 2**20:.1f} MiB apparent, "
+                f"{allocated / 2**20:.1f} MiB allocated), resident: {resident}"
+            )
@@ -0,0 +1,202 @@
+"""Block-sparse array used for mostly-empty ``SpaceTimeGrid`` storage.
+
+The first three (spatial) axes are split into cubic blocks; every block is
+keyed by its block coordinates plus the full index along the remaining
+axes, e.g. ``(bx, by, bz, w, t)`` for the grid. Only blocks that hold a
+non-default value are stored, so memory scales with populated cells.
+"""
+
+import itertools
+
+import numpy as np
+
+_SPATIAL_AXES = 3
+
+
+class BlockSparseArray:
+    """Dictionary of dense ``block³`` chunks addressed like an ndarray.
+
+    Integer indexing reads or writes a single cell with one dictionary
+    lookup. Slices are supported for reads and writes; reads return a new
+    dense array rather than a view.
+    """
+
+    def __init__(self, shape, dtype, block=8):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.block = block
+        self.blocks = {}
+        self._zero = self.dtype.type(0)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        """Bytes held by populated blocks."""
+        return len(self.blocks) * self.block**_SPATIAL_AXES * self.dtype.itemsize
+
+    def _split(self, index):
+        """Return ``(key, local)`` for a full integer index."""
+        b = self.block
+        index = tuple(i + n if i < 0 else i for i, n in zip(index, self.shape))
+        for i, n in zip(index, self.shape):
+            if not 0 <= i < n:
+                raise IndexError(f"index {index} out of bounds for shape {self.shape}")
+        spatial = index[:_SPATIAL_AXES]
+        key = tuple(i // b for i in spatial) + index[_SPATIAL_AXES:]
+        local = tuple(i % b for i in spatial)
+        return key, local
+
+    def _is_point(self, index):
+        return (
+            isinstance(index, tuple)
+            and len(index) == self.ndim
+            and all(isinstance(i, (int, np.integer)) for i in index)
+        )
+
+    def _selection(self, index):
+        """Normalize ``index`` to a list of selected positions per axis.
+
+        Returns ``(selections, keep)`` where ``keep`` flags axes indexed by a
+        slice (and so kept in the result).
+        """
+        if not isinstance(index, tuple):
+            index = (index,)
+        index = index + (slice(None),) * (self.ndim - len(index))
+        selections, keep = [], []
+        for i, n in zip(index, self.shape):
+            if isinstance(i, slice):
+                selections.append(np.arange(*i.indices(n)))
+                keep.append(True)
+            else:
+                i = int(i)
+                if not -n <= i < n:
+                    raise IndexError(f"index {i} out of bounds for axis of size {n}")
+                selections.append(np.array([i % n]))
+                keep.append(False)
+        return selections, keep
+
+    def _block_slots(self, key, selections):
+        """Map the cells of block ``key`` onto positions in a selection.
+
+        Returns ``(local, out)`` index tuples suitable for ``np.ix_`` or
+        ``None`` if the block does not intersect the selection.
+        """
+        b = self.block
+        local, out = [], []
+        for axis, selected in enumerate(selections):
+            if axis < _SPATIAL_AXES:
+                lo = key[axis] * b
+                hit = np.nonzero((selected >= lo) & (selected < lo + b))[0]
+                if not len(hit):
+                    return None
+                local.append(selected[hit] - lo)
+                out.append(hit)
+            else:
+                hit = np.nonzero(selected == key[axis])[0]
+                if not len(hit):
+                    return None
+                out.append(hit)
+        return tuple(local), tuple(out)
+
+    def __getitem__(self, index):
+        if self._is_point(index):
+            key, local = self._split(index)
+            chunk = self.blocks.get(key)
+            return self._zero if chunk is None else chunk[local]
+        selections, keep = self._selection(index)
+        result = np.zeros([len(s) for s in selections], dtype=self.dtype)
+        for key, chunk in self.blocks.items():
+            slots = self._block_slots(key, selections)
+            if slots is None:
+                continue
+            local, out = slots
+            result[np.ix_(*out)] = chunk[np.ix_(*local)].reshape(
+                [len(o) for o in out[:_SPATIAL_AXES]] + [1] * (self.ndim - _SPATIAL_AXES)
+            )
+        squeeze = tuple(axis for axis, k in enumerate(keep) if not k)
+        result = result.squeeze(axis=squeeze)
+        return result[()] if result.ndim == 0 else result
+
+    def __setitem__(self, index, value):
+        if self._is_point(index):
+            key, local = self._split(index)
+            chunk = self.blocks.get(key)
+            if chunk is None:
+                if value == 0:
+                    return
+                chunk = self.blocks[key] = np.zeros((self.block,) * _SPATIAL_AXES, self.dtype)
+            chunk[local] = value
+            return
+        selections, keep = self._selection(index)
+        shape = [len(s) for s in selections]
+        value = np.asarray(value, dtype=self.dtype)
+        kept_shape = [n for n, k in zip(shape, keep) if k]
+        value = np.broadcast_to(value, kept_shape).reshape(shape)
+        b = self.block
+        spatial_blocks = [np.unique(s // b) for s in selections[:_SPATIAL_AXES]]
+        for start in itertools.product(*spatial_blocks):
+            for rest in itertools.product(*selections[_SPATIAL_AXES:]):
+                key = tuple(int(i) for i in start + rest)
+                local, out = self._block_slots(key, selections)
+                part = value[np.ix_(*out)].reshape([len(i) for i in local])
+                chunk = self.blocks.get(key)
+                if chunk is None:
+                    if not part.any():
+                        continue
+                    chunk = np.zeros((b,) * _SPATIAL_AXES, self.dtype)
+                    self.blocks[key] = chunk
+                chunk[np.ix_(*local)] = part
+                if not chunk.any():
+                    del self.blocks[key]
+
+    def items(self):
+        """Yield ``(index, value)`` for every non-default cell."""
+        b = self.block
+        for key, chunk in self.blocks.items():
+            for local in zip(*np.nonzero(chunk)):
+                spatial = tuple(int(k * b + i) for k, i in zip(key, local))
+                yield spatial + key[_SPATIAL_AXES:], chunk[local]
+
+    def to_dense(self):
+        """Return the full contents as a dense ndarray."""
+        b = self.block
+        dense = np.zeros(self.shape, dtype=self.dtype)
+        for key, chunk in self.blocks.items():
+            spatial = tuple(
+                slice(k * b, min((k + 1) * b, n))
+                for k, n in zip(key[:_SPATIAL_AXES], self.shape)
+            )
+            trimmed = chunk[tuple(slice(0, s.stop - s.start) for s in spatial)]
+            dense[spatial + key[_SPATIAL_AXES:]] = trimmed
+        return dense
+
+    def __array__(self, dtype=None, copy=None):
+        dense = self.to_dense()
+        return dense if dtype is None else dense.astype(dtype)
+
+    @classmethod
+    def from_dense(cls, array, block=8):
+        """Build a sparse array holding the non-zero blocks of ``array``."""
+        array = np.asarray(array)
+        sparse = cls(array.shape, array.dtype, block)
+        spatial_shape = array.shape[:_SPATIAL_AXES]
+        for start in np.ndindex(*[-(-n // block) for n in spatial_shape]):
+            spatial = tuple(
+                slice(k * block, min((k + 1) * block, n))
+                for k, n in zip(start, spatial_shape)
+            )
+            region = array[spatial]
+            populated = np.any(region != 0, axis=tuple(range(_SPATIAL_AXES)))
+            for rest in zip(*np.nonzero(populated)):
+                chunk = np.zeros((block,) * _SPATIAL_AXES, array.dtype)
+                values = region[(slice(None),) * _SPATIAL_AXES + rest]
+                chunk[tuple(slice(0, n) for n in values.shape)] = values
+                sparse.blocks[start + tuple(int(i) for i in rest)] = chunk
+        return sparse
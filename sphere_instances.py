@@ -0,0 +1,304 @@
+"""Instanced drawing of object spheres at several levels of detail.
+
+A unit sphere mesh per level of detail is uploaded once. Object centers,
+radii and colors go into a float texture that is only re-uploaded when
+objects change; a small vertex shader fetches them to scale and move the
+unit mesh. Each frame every object picks the coarsest level that still
+looks round at its projected size, and objects smaller than
+:data:`POINT_SPRITE_RADIUS` become round point sprites. A buffer of object
+indices ordered by level, four bytes per object, is all that changes
+with the levels. Drawing any number of objects takes one
+``glDrawElementsInstanced`` call per mesh level and a single
+``glDrawArrays(GL_POINTS)`` for the sprites.
+"""
+
+import ctypes
+
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.GL import shaders
+
+from gl_buffers import sphere_mesh
+
+# Objects with a smaller projected radius, in pixels, are drawn as sprites
+POINT_SPRITE_RADIUS = 1.5
+# (slices, stacks, smallest projected radius in pixels) of each mesh
+# level, finest first; the finest matches the non-instanced sphere batch
+LEVELS = ((16, 16, 12.0), (10, 8, 4.0), (6, 4, POINT_SPRITE_RADIUS))
+
+# Two texels per object: xyz center and w radius, then RGBA
+_INSTANCE_FETCH = """
+uniform sampler2D instances;
+uniform int width;  // texels per row of the instance texture
+
+in int index;  // object row in the instance texture
+
+vec4 instance_texel(int texel) {
+    return texelFetch(instances, ivec2(texel % width, texel / width), 0);
+}
+"""
+
+_VERTEX_SHADER = (
+    """
+#version 130
+"""
+    + _INSTANCE_FETCH
+    + """
+void main() {
+    vec4 sphere = instance_texel(2 * index);
+    gl_Position = gl_ModelViewProjectionMatrix * vec4(gl_Vertex.xyz * sphere.w + sphere.xyz, 1.0);
+    gl_FrontColor = instance_texel(2 * index + 1);
+}
+"""
+)
+
+_FRAGMENT_SHADER = """
+#version 130
+
+void main() {
+    gl_FragColor = gl_Color;
+}
+"""
+
+# Sprites read the object indices as their only vertex attribute
+_SPRITE_VERTEX_SHADER = (
+    """
+#version 130
+"""
+    + _INSTANCE_FETCH
+    + """
+uniform float pixel_scale;  // pixels per unit radius at unit depth
+
+void main() {
+    vec4 sphere = instance_texel(2 * index);
+    vec4 eye = gl_ModelViewMatrix * vec4(sphere.xyz, 1.0);
+    gl_Position = gl_ProjectionMatrix * eye;
+    gl_PointSize = max(1.0, 2.0 * sphere.w * pixel_scale / max(-eye.z, 1e-6));
+    gl_FrontColor = instance_texel(2 * index + 1);
+}
+"""
+)
+
+_SPRITE_FRAGMENT_SHADER = """
+#version 130
+
+void main() {
+    vec2 offset = 2.0 * gl_PointCoord - 1.0;
+    if (dot(offset, offset) > 1.0) {
+        discard;
+    }
+    gl_FragColor = gl_Color;
+}
+"""
+
+# Bytes per object index
+_INDEX_SIZE = 4
+
+
+def pixel_scale(projection, viewport_height):
+    """Return the projected size in pixels of one unit at unit depth."""
+    projection = np.asarray(projection, dtype=float).reshape(4, 4)
+    return projection[1, 1] * viewport_height / 2
+
+
+def projected_radii(positions, radii, modelview, scale):
+    """Return the on-screen radius of each sphere in pixels.
+
+    ``modelview`` is the 4×4 matrix as returned by ``glGetDoublev``
+    (column-major) and ``scale`` comes from :func:`pixel_scale`. Spheres
+    behind the eye get 0.
+    """
+    modelview = np.asarray(modelview, dtype=float).reshape(4, 4)
+    depth = -(np.asarray(positions, dtype=float) @ modelview[:3, 2] + modelview[3, 2])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(depth > 0, np.asarray(radii) * scale / depth, 0.0)
+
+
+def detail_levels(pixels):
+    """Return the index into :data:`LEVELS` for each projected radius.
+
+    Radii below every threshold get ``len(LEVELS)``, the sprite level.
+    """
+    thresholds = np.array([level[2] for level in LEVELS])
+    return np.count_nonzero(np.asarray(pixels)[:, None] < thresholds[None, :], axis=1)
+
+
+def _link_program(vertex_source, fragment_source, index_location=None):
+    """Compile and link a program, optionally binding ``index`` to a location.
+
+    Sprites bind it to 0, since compatibility contexts only draw vertex
+    arrays that use attribute 0.
+    """
+    program = glCreateProgram()
+    glAttachShader(program, shaders.compileShader(vertex_source, GL_VERTEX_SHADER))
+    glAttachShader(program, shaders.compileShader(fragment_source, GL_FRAGMENT_SHADER))
+    if index_location is not None:
+        glBindAttribLocation(program, index_location, "index")
+    glLinkProgram(program)
+    if glGetProgramiv(program, GL_LINK_STATUS) != GL_TRUE:
+        raise RuntimeError(glGetProgramInfoLog(program))
+    return program
+
+
+class SphereInstances:
+    """Shader, LOD meshes and instance textures drawing object spheres.
+
+    Must be created and used with the drawing GL context current.
+    """
+
+    def __init__(self):
+        self.program = _link_program(_VERTEX_SHADER, _FRAGMENT_SHADER)
+        self._index = glGetAttribLocation(self.program, "index")
+        self.sprite_program = _link_program(
+            _SPRITE_VERTEX_SHADER, _SPRITE_FRAGMENT_SHADER, index_location=0
+        )
+        self._pixel_scale = glGetUniformLocation(self.sprite_program, "pixel_scale")
+        self.max_texture_size = int(glGetIntegerv(GL_MAX_TEXTURE_SIZE))
+        self._meshes = []
+        for slices, stacks, _ in LEVELS:
+            vertices, indices = sphere_mesh(slices, stacks)
+            buffers = glGenBuffers(2)
+            glBindBuffer(GL_ARRAY_BUFFER, buffers[0])
+            glBufferData(GL_ARRAY_BUFFER, vertices.astype(np.float32), GL_STATIC_DRAW)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, buffers[1])
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices, GL_STATIC_DRAW)
+            self._meshes.append((buffers[0], buffers[1], len(indices)))
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        # Per layer: instance texture, its width and objects key, then the
+        # index buffer, levels and level ranges
+        self._layers = {}
+
+    @staticmethod
+    def supported():
+        """Return True if the current context can draw instanced spheres."""
+        from gpu_displacement import GPUDisplacement
+
+        return (
+            bool(glDrawElementsInstanced)
+            and bool(glVertexAttribDivisor)
+            and bool(glVertexAttribIPointer)
+            and GPUDisplacement.supported()
+        )
+
+    def _upload_instances(self, layer, key, positions, radii, colors):
+        """Refill a layer's instance texture, in object order."""
+        entry = self._layers.get(layer)
+        if entry is None:
+            texture, index_buffer = glGenTextures(1), glGenBuffers(1)
+            glBindTexture(GL_TEXTURE_2D, texture)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        else:
+            texture, index_buffer = entry[0], entry[3]
+            glBindTexture(GL_TEXTURE_2D, texture)
+        count = len(positions)
+        width = max(1, min(2 * count, self.max_texture_size))
+        rows = -(-2 * count // width)
+        if rows > self.max_texture_size:
+            raise ValueError(
+                f"{count} objects exceed the instance texture limit of "
+                f"{self.max_texture_size**2 // 2}"
+            )
+        data = np.zeros((rows * width, 4), dtype=np.float32)
+        data[0 : 2 * count : 2, :3] = positions
+        data[0 : 2 * count : 2, 3] = radii
+        data[1 : 2 * count : 2] = colors
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA32F, width, rows, 0, GL_RGBA, GL_FLOAT, data)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        # Levels are chosen afresh for the new objects
+        self._layers[layer] = (texture, width, key, index_buffer, None, None)
+
+    def _upload_order(self, layer, levels):
+        """Refill a layer's index buffer with its objects ordered by level."""
+        texture, width, key, index_buffer, _, _ = self._layers[layer]
+        # Levels fit in a byte, which NumPy sorts stably by radix
+        order = np.argsort(levels.astype(np.int8), kind="stable").astype(np.int32)
+        glBindBuffer(GL_ARRAY_BUFFER, index_buffer)
+        glBufferData(GL_ARRAY_BUFFER, order, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        bounds = np.searchsorted(levels[order], np.arange(len(LEVELS) + 2))
+        self._layers[layer] = (texture, width, key, index_buffer, levels, bounds)
+
+    def draw(self, layer, key, positions, radii, colors):
+        """Draw one sphere per object, picking levels from the current view.
+
+        ``layer`` names an instance texture and ``key`` the state of the
+        objects in it; the texture is only refilled when ``key`` changes,
+        and the index buffer when the chosen levels change.
+        """
+        viewport = glGetIntegerv(GL_VIEWPORT)
+        scale = pixel_scale(glGetDoublev(GL_PROJECTION_MATRIX), viewport[3])
+        pixels = projected_radii(positions, radii, glGetDoublev(GL_MODELVIEW_MATRIX), scale)
+        levels = detail_levels(pixels)
+        entry = self._layers.get(layer)
+        if entry is None or entry[2] != key:
+            self._upload_instances(layer, key, positions, radii, colors)
+            entry = self._layers[layer]
+        if entry[4] is None or not np.array_equal(entry[4], levels):
+            self._upload_order(layer, levels)
+        texture, width, _, index_buffer, _, bounds = self._layers[layer]
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(GL_TEXTURE_2D, texture)
+        glUseProgram(self.program)
+        self._set_instance_uniforms(self.program, width)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableVertexAttribArray(self._index)
+        glVertexAttribDivisor(self._index, 1)
+        for (vertices, indices, count), first, last in zip(self._meshes, bounds[:-1], bounds[1:]):
+            if last == first:
+                continue
+            glBindBuffer(GL_ARRAY_BUFFER, vertices)
+            glVertexPointer(3, GL_FLOAT, 0, None)
+            # Point the index attribute at this level's range
+            glBindBuffer(GL_ARRAY_BUFFER, index_buffer)
+            glVertexAttribIPointer(
+                self._index, 1, GL_INT, 0, ctypes.c_void_p(int(first) * _INDEX_SIZE)
+            )
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, indices)
+            glDrawElementsInstanced(GL_TRIANGLES, count, GL_UNSIGNED_INT, None, int(last - first))
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glVertexAttribDivisor(self._index, 0)
+        glDisableVertexAttribArray(self._index)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glUseProgram(0)
+        first, last = bounds[-2:]
+        if last > first:
+            self._draw_sprites(index_buffer, width, int(first), int(last - first), scale)
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+    @staticmethod
+    def _set_instance_uniforms(program, width):
+        glUniform1i(glGetUniformLocation(program, "instances"), 0)
+        glUniform1i(glGetUniformLocation(program, "width"), width)
+
+    def _draw_sprites(self, index_buffer, width, first, count, scale):
+        """Draw ``count`` objects from index ``first`` on as point sprites."""
+        glUseProgram(self.sprite_program)
+        self._set_instance_uniforms(self.sprite_program, width)
+        glUniform1f(self._pixel_scale, scale)
+        glEnable(GL_PROGRAM_POINT_SIZE)
+        glEnable(GL_POINT_SPRITE)
+        glBindBuffer(GL_ARRAY_BUFFER, index_buffer)
+        glEnableVertexAttribArray(0)
+        glVertexAttribIPointer(0, 1, GL_INT, 0, ctypes.c_void_p(first * _INDEX_SIZE))
+        glDrawArrays(GL_POINTS, 0, count)
+        glDisableVertexAttribArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDisable(GL_POINT_SPRITE)
+        glDisable(GL_PROGRAM_POINT_SIZE)
+        glUseProgram(0)
+
+    def delete(self):
+        """Free the programs, buffers and textures; requires the context current."""
+        buffers = [b for mesh in self._meshes for b in mesh[:2]]
+        buffers += [entry[3] for entry in self._layers.values()]
+        glDeleteBuffers(len(buffers), buffers)
+        textures = [entry[0] for entry in self._layers.values()]
+        if textures:
+            glDeleteTextures(textures)
+        glDeleteProgram(self.program)
+        glDeleteProgram(self.sprite_program)
+        self._meshes = []
+        self._layers = {}